@@ -0,0 +1,189 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# words, and codes joined by '-', '.' or '/' such as 'AB-1234' or 'v2.1' kept as one token
+TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+class BM25Index:
+    """
+    BM25 inverted index of the texts of a Chroma collection, for exact terms vector search misses
+    - Postings are kept in SQLite, in `path` on disk or in memory without one
+    - `add` replaces the postings of existing ids, `delete` removes them, so the index follows upserts
+    - `search` scores with Okapi BM25 (`k1`, `b`) and returns the ids of the best `k` texts
+    - The document count and total length are kept in the file too, so every process sharing it
+      scores with the same corpus statistics
+
+    Settings in the `chromadb` section:
+    ```yaml
+    chromadb:
+      bm25:
+        path: './.cache/chroma-bm25.sqlite'
+        k1: 1.5
+        b: 0.75
+    ```
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = float(k1)
+        self.b = float(b)
+
+        self._lock = threading.Lock()
+        self._connection = self._connect(path)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return TOKEN.findall(text.lower())
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        rows = []
+        # the last text of a repeated id wins, as in an upsert
+        for id, text in dict(zip(ids, texts)).items():
+            terms = Counter(self.tokenize(text or ""))
+            rows.append((id, sum(terms.values()), terms))
+
+        with self._lock, self._writing():
+            self._delete([id for id, _, _ in rows])
+            for id, length, terms in rows:
+                doc = self._connection.execute(
+                    "INSERT INTO documents (id, length) VALUES (?, ?)", (id, length)
+                ).lastrowid
+                self._connection.executemany(
+                    "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                    [(term, doc, tf) for term, tf in terms.items()],
+                )
+            self._connection.execute(
+                "UPDATE corpus SET documents = documents + ?, total_length = total_length + ?",
+                (len(rows), sum(length for _, length, _ in rows)),
+            )
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock, self._writing():
+            self._delete(list(ids))
+
+    def clear(self) -> None:
+        with self._lock, self._writing():
+            self._connection.execute("DELETE FROM postings")
+            self._connection.execute("DELETE FROM documents")
+            self._connection.execute("UPDATE corpus SET documents = 0, total_length = 0")
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Ids and BM25 scores of the best `k` texts, best first
+        """
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms:
+            return []
+        marks = ",".join("?" * len(terms))
+
+        with self._lock:
+            documents, total_length = self._corpus()
+            if not documents:
+                return []
+            average = total_length / documents
+            frequencies = dict(
+                self._connection.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms
+                ).fetchall()
+            )
+            postings = self._connection.execute(
+                f"SELECT p.term, d.id, p.tf, d.length FROM postings p JOIN documents d ON d.doc = p.doc "
+                f"WHERE p.term IN ({marks})",
+                terms,
+            ).fetchall()
+
+        idf = {
+            term: math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in frequencies.items()
+        }
+        scores: Dict[str, float] = {}
+        for term, id, tf, length in postings:
+            norm = tf + self.k1 * (1 - self.b + self.b * length / average)
+            scores[id] = scores.get(id, 0.0) + idf[term] * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._corpus()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            terms = self._connection.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+            documents, total_length = self._corpus()
+            return {
+                "documents": documents,
+                "terms": terms,
+                "average_length": total_length / documents if documents else 0.0,
+            }
+
+    @contextmanager
+    def _writing(self):
+        """
+        One write transaction, taken up front so the corpus counts of concurrent writers stay exact
+        """
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            yield
+
+    def _corpus(self) -> Tuple[int, int]:
+        return self._connection.execute("SELECT documents, total_length FROM corpus").fetchone()
+
+    def _delete(self, ids: List[str]) -> None:
+        for start in range(0, len(ids), 500):
+            batch = ids[start : start + 500]
+            marks = ",".join("?" * len(batch))
+            removed = self._connection.execute(
+                f"SELECT doc, length FROM documents WHERE id IN ({marks})", batch
+            ).fetchall()
+            if not removed:
+                continue
+            docs = [doc for doc, _ in removed]
+            doc_marks = ",".join("?" * len(docs))
+            self._connection.execute(f"DELETE FROM postings WHERE doc IN ({doc_marks})", docs)
+            self._connection.execute(f"DELETE FROM documents WHERE doc IN ({doc_marks})", docs)
+            self._connection.execute(
+                "UPDATE corpus SET documents = documents - ?, total_length = total_length - ?",
+                (len(removed), sum(length for _, length in removed)),
+            )
+
+    def _connect(self, path: Optional[str]) -> sqlite3.Connection:
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        if path:
+            connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, length INTEGER)"
+        )
+        # clustered by term, the postings of a term are read in one range scan
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT, doc INTEGER, tf INTEGER, PRIMARY KEY (term, doc)) "
+            "WITHOUT ROWID"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc)")
+        # one row with the document count and total length, counted once for files written before it existed
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS corpus (id INTEGER PRIMARY KEY CHECK (id = 0), documents INTEGER, total_length INTEGER)"
+        )
+        connection.execute(
+            "INSERT OR IGNORE INTO corpus SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM documents"
+        )
+        connection.commit()
+        if path:
+            logger.info(f"BM25 index is stored in '{path}'")
+        return connection
+
+    def __repr__(self) -> str:
+        return f"BM25Index(path={self.path!r}, k1={self.k1}, b={self.b})"
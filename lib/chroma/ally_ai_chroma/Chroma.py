@@ -1,10 +1,28 @@
+import asyncio
+import heapq
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
 import chromadb
-from chromadb.api.types import OneOrMany
+import numpy as np
+from chromadb.api.types import ID, GetResult, OneOrMany, QueryResult, Where, WhereDocument
 from chromadb.config import Settings as ChromaSettings
 from langchain_chroma import Chroma as LangChainChroma
+from langchain_chroma.vectorstores import DEFAULT_K, _results_to_docs_and_scores
+from langchain_core.documents import Document
 from ally_ai_core import Settings
+from ally_ai_core.limits import Deduplicator
+from ally_ai_core.limits.RateLimiter import _percentile
+from ally_ai_core.settings import Subscription
 from ally_ai_langchain import EmbeddingModel
-from typing import Optional
+from ally_ai_chroma.BM25Index import BM25Index
+from ally_ai_chroma.IngestionPipeline import IngestionPipeline
+from ally_ai_chroma.MMRReranker import MMRReranker
+from ally_ai_chroma.QueryCache import QueryCache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ally_ai_core.decorators import logged
 
@@ -29,6 +47,17 @@ class Chroma(LangChainChroma):
             embeddingModel = EmbeddingModel()
 
         self.ally_settings = settings
+        self.ally_kwargs = kwargs
+        self.ally_dedup = Deduplicator(copy=list)
+        # embeddings and distances as float32 arrays instead of nested lists
+        self.ally_arrays = bool(settings.pop("arrays")) if "arrays" in settings else False
+        query_cache = settings.pop("query_cache") if "query_cache" in settings else None
+        self.ally_query_cache = (
+            (QueryCache(**query_cache) if isinstance(query_cache, dict) else QueryCache()) if query_cache else None
+        )
+        bm25 = settings.pop("bm25") if "bm25" in settings else None
+        self.ally_bm25 = (BM25Index(**bm25) if isinstance(bm25, dict) else BM25Index()) if bm25 else None
+        self.ally_hybrid_latencies = {stage: deque(maxlen=1000) for stage in ("lexical", "vector", "fusion", "total")}
         persist_directory = (
             settings.pop("persist_directory")
             if "persist_directory" in settings
@@ -37,8 +66,12 @@ class Chroma(LangChainChroma):
 
         if persist_directory is not None and persist_directory:
             self._init_persist_directory(embeddingModel, persist_directory, **kwargs)
+            location = os.path.abspath(persist_directory)
         else:
             self._init_http_client(settings, embeddingModel, **kwargs)
+            location = f"{settings.get('host', 'localhost')}:{settings.get('port', 8000)}"
+        # names the collection in the query caches, writes of any instance on it invalidate them all
+        self.ally_cache_collection = f"{location}/{self._collection_name}"
 
     @logged(message="Chroma-Init-PersistDir", show_data=False)
     def _init_persist_directory(self, embeddingModel, persist_directory, **kwargs):
@@ -61,18 +94,576 @@ class Chroma(LangChainChroma):
             **kwargs,
         )
 
+    def reload(self, settings: Settings) -> None:
+        """
+        Swaps the chroma client and collection with the ones built from new settings
+        - In-flight queries finish on the collection they started with
+        - The BM25 index and query cache are kept when their settings did not change,
+          cached results are dropped since they may come from the previous collection
+        """
+        fresh = type(self)(
+            settings=settings,
+            embeddingModel=self._embedding_function,
+            **self.ally_kwargs,
+        )
+        if repr(fresh.ally_bm25) == repr(self.ally_bm25):
+            fresh.ally_bm25 = self.ally_bm25
+            fresh.ally_hybrid_latencies = self.ally_hybrid_latencies
+        if repr(fresh.ally_query_cache) == repr(self.ally_query_cache):
+            fresh.ally_query_cache = self.ally_query_cache
+            if self.ally_query_cache is not None:
+                self.ally_query_cache.clear()
+        self.__dict__.update(fresh.__dict__)
+
+    def watch(self) -> Subscription:
+        """
+        Reloads the client whenever its section changes in the settings file
+        """
+        return self.ally_settings.subscribe(self.reload)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """
+        Embeds each distinct text once, copies of a text get the same vector
+        - Upserts in batches the chroma client accepts
+        - `ally_dedup.stats()` has the dedup ratio
+        """
+        texts = list(texts)
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+
+        embeddings = None
+        if self._embedding_function is not None:
+            unique, inverse = self.ally_dedup.unique(texts)
+            embeddings = self.ally_dedup.scatter(self._embedding_function.embed_documents(unique), inverse)
+
+        self._upsert_texts(texts, ids, embeddings, metadatas)
+        return ids
+
+    def _upsert_texts(self, texts, ids, embeddings, metadatas) -> None:
+        metadatas = list(metadatas or [])
+        metadatas += [{}] * (len(texts) - len(metadatas))
+        # chroma rejects empty metadata, texts without any are upserted apart
+        with_metadata = [index for index, metadata in enumerate(metadatas) if metadata]
+        without_metadata = [index for index, metadata in enumerate(metadatas) if not metadata]
+        self._upsert(with_metadata, texts, ids, embeddings, metadatas)
+        self._upsert(without_metadata, texts, ids, embeddings, None)
+        if self.ally_bm25 is not None:
+            self.ally_bm25.add(ids, texts)
+        self._written()
+
+    def _upsert(self, indexes, texts, ids, embeddings, metadatas) -> None:
+        size = self._client.get_max_batch_size()
+        for start in range(0, len(indexes), size):
+            batch = indexes[start : start + size]
+            self._collection.upsert(
+                ids=[ids[index] for index in batch],
+                documents=[texts[index] for index in batch],
+                embeddings=[embeddings[index] for index in batch] if embeddings else None,
+                metadatas=[metadatas[index] for index in batch] if metadatas else None,
+            )
+
+    def add_images(self, *args: Any, **kwargs: Any) -> List[str]:
+        ids = super().add_images(*args, **kwargs)
+        self._written()
+        return ids
+
+    def update_documents(self, ids: List[str], documents: List[Document]) -> None:
+        super().update_documents(ids, documents)
+        if self.ally_bm25 is not None:
+            self.ally_bm25.add(ids, [document.page_content for document in documents])
+        self._written()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        """
+        Deletes by ids, or by the `where` and `where_document` filters of chroma
+        - Filters are resolved to ids first, so the BM25 index drops the same texts
+        """
+        where, where_document = kwargs.pop("where", None), kwargs.pop("where_document", None)
+        if where or where_document:
+            ids = self._collection.get(ids=ids, where=where, where_document=where_document, include=[])["ids"]
+            if not ids:
+                return
+        super().delete(ids=ids, **kwargs)
+        if self.ally_bm25 is not None and ids:
+            self.ally_bm25.delete(ids)
+        self._written()
+
+    def delete_collection(self) -> None:
+        super().delete_collection()
+        if self.ally_bm25 is not None:
+            self.ally_bm25.clear()
+        self._written()
+
+    def _written(self) -> None:
+        """
+        Drops the cached queries of the collection after a write
+        """
+        if self.ally_query_cache is not None:
+            self.ally_query_cache.invalidate(self.ally_cache_collection)
+
+    def ingest(self, documents: Iterable, **options: Any) -> dict:
+        """
+        Streams documents or texts into the collection with an `IngestionPipeline`, returns its stats
+        - `options` are passed to the pipeline, e.g. `batch_size`, `embed_workers`, `checkpoint`
+        - `incremental=True` only embeds new and changed documents and deletes the removed ones
+        """
+        return IngestionPipeline(self, documents, **options).run()
+
+    def get(
+        self,
+        ids: Optional[OneOrMany[ID]] = None,
+        where: Optional[Where] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Optional[List[str]] = None,
+        arrays: Optional[bool] = None,
+    ) -> GetResult:
+        """
+        With `arrays` (default: the `arrays` setting), embeddings are one float32 array of shape (rows, dimensions)
+        """
+        result = super().get(
+            ids=ids, where=where, limit=limit, offset=offset, where_document=where_document, include=include
+        )
+        if self._arrays(arrays) and result.get("embeddings") is not None:
+            result["embeddings"] = _as_array(result["embeddings"])
+        return result
+
     def query(
         self,
         query_texts: Optional[OneOrMany[str]] = None,
         n_results: int = 10,
         include: chromadb.Include = ["metadatas", "documents", "distances"],
-    ):
+        arrays: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> QueryResult:
+        """
+        Embeds every query text in one `embed_documents` call, then runs a single collection query
+        - `kwargs` (`where`, `where_document`) go to the collection query
+        - With `arrays` (default: the `arrays` setting), each query's distances and embeddings are float32 arrays
+        - With a `query_cache`, only the texts without a cached result are embedded and queried
+        """
+        query_texts = _as_list(query_texts)
+        keys, rows, version = self._lookup(query_texts, n_results, include, kwargs)
+        missing = [index for index, row in enumerate(rows) if row is None]
+        result = None
+        if missing or not rows:
+            query_embeddings = self._embedding_function.embed_documents([query_texts[index] for index in missing])
+            result = self._collection.query(
+                query_embeddings=query_embeddings, n_results=n_results, include=include, **kwargs
+            )
+        result = self._store(keys, rows, missing, result, include, version)
+        return _with_arrays(result) if self._arrays(arrays) else result
+
+    async def aquery(
+        self,
+        query_texts: Optional[OneOrMany[str]] = None,
+        n_results: int = 10,
+        include: chromadb.Include = ["metadatas", "documents", "distances"],
+        arrays: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> QueryResult:
+        """
+        Async version of `query`, the chroma client is called on a worker thread
+        """
+        query_texts = _as_list(query_texts)
+        keys, rows, version = self._lookup(query_texts, n_results, include, kwargs)
+        missing = [index for index, row in enumerate(rows) if row is None]
+        result = None
+        if missing or not rows:
+            query_embeddings = await self._embedding_function.aembed_documents(
+                [query_texts[index] for index in missing]
+            )
+            result = await asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(
+                    self._collection.query,
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    include=include,
+                    **kwargs,
+                ),
+            )
+        result = self._store(keys, rows, missing, result, include, version)
+        return _with_arrays(result) if self._arrays(arrays) else result
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Goes through `query`, so repeated searches are answered from the `query_cache`
+        """
+        if self.ally_query_cache is None or self._embedding_function is None:
+            return super().similarity_search_with_score(
+                query, k=k, filter=filter, where_document=where_document, **kwargs
+            )
+        results = self.query(
+            query,
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+            arrays=False,
+            where=filter,
+            where_document=where_document,
+            **kwargs,
+        )
+        return _results_to_docs_and_scores(results)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        Answered from the `query_cache` when the same embedding was searched before
+        """
+        if self.ally_query_cache is None:
+            return super().similarity_search_by_vector(
+                embedding, k=k, filter=filter, where_document=where_document, **kwargs
+            )
+        include = ["documents", "metadatas", "distances"]
+        kwargs = dict(where=filter, where_document=where_document, **kwargs)
+        keys, rows, version = self._lookup([embedding], k, include, kwargs)
+        result = None
+        if rows[0] is None:
+            result = self._collection.query(query_embeddings=[embedding], n_results=k, include=include, **kwargs)
+        result = self._store(keys, rows, [0] if rows[0] is None else [], result, include, version)
+        return [document for document, _ in _results_to_docs_and_scores(result)]
+
+    def mmr_query(
+        self,
+        query_texts: Optional[OneOrMany[str]] = None,
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        include: chromadb.Include = ["metadatas", "documents", "distances"],
+        arrays: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> QueryResult:
+        """
+        Fetches `fetch_k` candidates per query and keeps `k` of them with maximal marginal relevance
+        - Query texts are embedded in one call, candidates are reranked with the embeddings the query returned
+        - Rows are in the order the candidates were picked, `query_embeddings` has the embedded queries
+        """
+        query_texts = _as_list(query_texts)
+        query_embeddings = self._embedding_function.embed_documents(query_texts)
+        fetched = list(dict.fromkeys([*include, "embeddings"]))
+        result = self._collection.query(
+            query_embeddings=query_embeddings, n_results=fetch_k, include=fetched, **kwargs
+        )
+        picked = MMRReranker(lambda_mult).select_batch(query_embeddings, result["embeddings"], k)
 
-        query_embeddings = [
-            self._embedding_function.embed_query(query_text)
-            for query_text in query_texts
+        rows = [
+            {key: [result[key][query][index] for index in indexes] for key in ["ids", *include]}
+            for query, indexes in enumerate(picked)
         ]
+        result = _from_rows(rows, include)
+        result["query_embeddings"] = query_embeddings
+        if self._arrays(arrays):
+            result = _with_arrays(result)
+            result["query_embeddings"] = _as_array(query_embeddings)
+        return result
 
-        return self._collection.query(
-            query_embeddings=query_embeddings, n_results=n_results, include=include
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        Same selection and order as LangChain's, with the vectorised `MMRReranker`
+        - Documents keep the rank order of the candidates, `mmr_query` has them in pick order
+        """
+        results = self._collection.query(
+            query_embeddings=[embedding],
+            n_results=fetch_k,
+            where=filter,
+            where_document=where_document,
+            include=["metadatas", "documents", "distances", "embeddings"],
+            **kwargs,
         )
+        picked = set(MMRReranker(lambda_mult).select(embedding, results["embeddings"][0], k))
+        candidates = [document for document, _ in _results_to_docs_and_scores(results)]
+        return [candidate for index, candidate in enumerate(candidates) if index in picked]
+
+    def build_bm25_index(self, batch_size: int = 1000) -> None:
+        """
+        Indexes the texts already in the collection, e.g. ones added before `bm25` was set
+        """
+        self.ally_bm25.clear()
+        for page in self.iter_pages(batch_size=batch_size, include=["documents"]):
+            self.ally_bm25.add(page["ids"], page["documents"])
+
+    def hybrid_search(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        rrf_k: int = 60,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Runs BM25 and vector search at the same time and fuses their top `fetch_k` with reciprocal rank fusion
+        - A document scores 1 / (`rrf_k` + rank) in each ranking it is in, the best `k` sums are returned
+        - `filter` and `where_document` apply to both rankings
+        - `hybrid_stats()` has the latency of the lexical, vector and fusion stages
+        """
+        if self.ally_bm25 is None:
+            raise ValueError("hybrid_search needs the 'bm25' setting in the chromadb section")
+        start = perf_counter()
+
+        def timed(stage, func):
+            def run():
+                begin = perf_counter()
+                try:
+                    return func()
+                finally:
+                    self.ally_hybrid_latencies[stage].append(perf_counter() - begin)
+
+            return run
+
+        def lexical():
+            ids = [id for id, _ in self.ally_bm25.search(query, fetch_k)]
+            if not ids:
+                return []
+            found = self._collection.get(
+                ids=ids, where=filter, where_document=where_document, include=["documents", "metadatas"]
+            )
+            rows = {id: (document, metadata) for id, document, metadata in zip(*map(found.get, _ROW))}
+            return [(id, *rows[id]) for id in ids if id in rows]
+
+        def vector():
+            found = self.query(
+                query,
+                n_results=fetch_k,
+                include=["documents", "metadatas"],
+                arrays=False,
+                where=filter,
+                where_document=where_document,
+            )
+            return list(zip(*(found[key][0] for key in _ROW)))
+
+        with ThreadPoolExecutor(2) as pool:
+            rankings = [pool.submit(timed("lexical", lexical)), pool.submit(timed("vector", vector))]
+            rankings = [ranking.result() for ranking in rankings]
+
+        fused = timed("fusion", lambda: _fuse(rankings, k, rrf_k))()
+        self.ally_hybrid_latencies["total"].append(perf_counter() - start)
+        return fused
+
+    def hybrid_stats(self) -> dict:
+        stats = {}
+        for stage, latencies in self.ally_hybrid_latencies.items():
+            latencies = sorted(latencies)
+            stats[stage] = {
+                "count": len(latencies),
+                "p50": _percentile(latencies, 50),
+                "p90": _percentile(latencies, 90),
+                "p99": _percentile(latencies, 99),
+                "max": latencies[-1] if latencies else 0.0,
+            }
+        return stats
+
+    def _lookup(
+        self, queries: List[Any], n_results: int, include: chromadb.Include, kwargs: dict
+    ) -> Tuple[Optional[List[str]], List[Optional[dict]], Optional[tuple]]:
+        """
+        Cache keys, cached rows (None when missing) and the collection version of query texts or embeddings
+        """
+        cache = self.ally_query_cache
+        if cache is None:
+            return None, [None] * len(queries), None
+        version = cache.version(self.ally_cache_collection)
+        keys = [
+            cache.key(self.ally_cache_collection, query, n_results=n_results, include=list(include), **kwargs)
+            for query in queries
+        ]
+        return keys, [cache.get(key) for key in keys], version
+
+    def _store(
+        self,
+        keys: Optional[List[str]],
+        rows: List[Optional[dict]],
+        missing: List[int],
+        result: Optional[QueryResult],
+        include: chromadb.Include,
+        version: Optional[tuple],
+    ) -> QueryResult:
+        """
+        Caches the rows of `result`, the queries at `missing`, and assembles the result of every query
+        """
+        if keys is None:
+            return result
+        for row, index in enumerate(missing):
+            rows[index] = {key: result[key][row] for key in ["ids", *include]}
+            self.ally_query_cache.put(keys[index], rows[index], version)
+        return _from_rows(rows, include)
+
+    def query_bulk(
+        self,
+        query_texts: List[str],
+        n_results: int = 10,
+        include: chromadb.Include = ["metadatas", "documents", "distances"],
+        batch_size: int = 100,
+        concurrency: int = 4,
+        arrays: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> QueryResult:
+        """
+        Runs many queries in batches of `batch_size`, `concurrency` batches at a time
+        - Rows of the result are in the order of `query_texts`
+        """
+        batches = [query_texts[start : start + batch_size] for start in range(0, len(query_texts), batch_size)]
+        if len(batches) <= 1:
+            return self.query(query_texts, n_results=n_results, include=include, arrays=arrays, **kwargs)
+
+        with ThreadPoolExecutor(min(concurrency, len(batches))) as pool:
+            results = list(
+                pool.map(
+                    lambda batch: self.query(batch, n_results=n_results, include=include, arrays=arrays, **kwargs),
+                    batches,
+                )
+            )
+        return _merge(results, include)
+
+    async def aquery_bulk(
+        self,
+        query_texts: List[str],
+        n_results: int = 10,
+        include: chromadb.Include = ["metadatas", "documents", "distances"],
+        batch_size: int = 100,
+        concurrency: int = 4,
+        arrays: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> QueryResult:
+        batches = [query_texts[start : start + batch_size] for start in range(0, len(query_texts), batch_size)]
+        if len(batches) <= 1:
+            return await self.aquery(query_texts, n_results=n_results, include=include, arrays=arrays, **kwargs)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                return await self.aquery(batch, n_results=n_results, include=include, arrays=arrays, **kwargs)
+
+        return _merge(await asyncio.gather(*[run(batch) for batch in batches]), include)
+
+
+    def iter_pages(
+        self,
+        batch_size: int = 1000,
+        include: chromadb.Include = ["embeddings", "documents", "metadatas"],
+        where: Optional[Where] = None,
+        prefetch: bool = True,
+    ) -> Iterator[GetResult]:
+        """
+        Pages through the collection `batch_size` records at a time, holding one or two pages in memory
+        - `embeddings` of a page are a contiguous float32 array of shape (rows, dimensions)
+        - With `prefetch`, the next page is fetched on a worker thread while the current one is consumed
+        """
+
+        def fetch(offset: int) -> GetResult:
+            page = self._collection.get(where=where, limit=batch_size, offset=offset, include=include)
+            if "embeddings" in include:
+                page["embeddings"] = _as_array(page["embeddings"])
+            return page
+
+        with ThreadPoolExecutor(1) as pool:
+            offset = 0
+            pending = pool.submit(fetch, offset) if prefetch else None
+            while True:
+                page = pending.result() if prefetch else fetch(offset)
+                offset += batch_size
+                last = len(page["ids"]) < batch_size
+                if prefetch and not last:
+                    pending = pool.submit(fetch, offset)
+                if page["ids"]:
+                    yield page
+                if last:
+                    return
+
+    def _arrays(self, arrays: Optional[bool]) -> bool:
+        return self.ally_arrays if arrays is None else arrays
+
+
+def _as_list(query_texts: Optional[OneOrMany[str]]) -> List[str]:
+    """
+    A single query is a list of one, not a list of its characters
+    """
+    if query_texts is None:
+        return []
+    if isinstance(query_texts, str):
+        return [query_texts]
+    return list(query_texts)
+
+
+def _merge(results: List[QueryResult], include: chromadb.Include) -> QueryResult:
+    """
+    Concatenates the per-query rows of batch results, in batch order
+    """
+    merged = dict(results[0])
+    for key in ["ids", *include]:
+        merged[key] = [row for result in results for row in result[key]]
+    return merged
+
+
+def _as_array(embeddings) -> np.ndarray:
+    if embeddings is None or len(embeddings) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+
+
+_ROW = ("ids", "documents", "metadatas")
+
+
+def _fuse(rankings: List[List[tuple]], k: int, rrf_k: int) -> List[Tuple[Document, float]]:
+    """
+    Reciprocal rank fusion of rankings of (id, document, metadata) rows
+    """
+    scores: Dict[str, float] = {}
+    rows: Dict[str, tuple] = {}
+    for ranking in rankings:
+        for rank, (id, document, metadata) in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (rrf_k + rank)
+            rows.setdefault(id, (document, metadata))
+    return [
+        (Document(page_content=rows[id][0] or "", metadata=rows[id][1] or {}), score)
+        for id, score in heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    ]
+
+
+def _from_rows(rows: List[dict], include: chromadb.Include) -> QueryResult:
+    result = {key: None for key in ["embeddings", "documents", "uris", "data", "metadatas", "distances"]}
+    result["ids"] = [row["ids"] for row in rows]
+    for key in include:
+        result[key] = [row[key] for row in rows]
+    result["included"] = list(include)
+    return result
+
+
+def _with_arrays(result: QueryResult) -> QueryResult:
+    """
+    Per-query rows of distances and embeddings as float32 arrays
+    """
+    for key in ("distances", "embeddings"):
+        if result.get(key) is not None:
+            result[key] = [np.asarray(row, dtype=np.float32) for row in result[key]]
+    return result
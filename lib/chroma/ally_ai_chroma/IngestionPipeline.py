@@ -0,0 +1,429 @@
+import hashlib
+import json
+import queue
+import threading
+import uuid
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from ally_ai_core.checkpoints import MISSING, Checkpoint
+from ally_ai_core.routing.DeploymentRouter import retry_after
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+HASH_KEY = "ally_hash"
+
+
+class IngestionPipeline:
+    """
+    Streams documents into a Chroma collection, embedding the next batches while earlier ones are upserted
+    - Documents are read lazily in batches of `batch_size`, the queues between the stages hold at most
+      `queue_size` batches so a slow stage holds back the ones before it
+    - `embed_workers` threads embed batches, `upsert_workers` threads merge waiting batches up to
+      the client's max batch size and upsert them
+    - A failing batch is retried `retries` times, then the pipeline stops and raises the error
+    - With `checkpoint`, upserted batches are recorded and skipped when the same documents are ingested again
+    - `stats` has docs/sec and utilization per stage, the busiest stage is the bottleneck
+    - With `incremental`, ids and content hashes are compared with the stored ones, only new and changed
+      documents are embedded and upserted, and stored documents missing from `documents` are deleted
+
+    ```python
+    stats = chroma.ingest(documents, checkpoint='./.cache/ingest.jsonl')
+    ```
+    """
+
+    def __init__(
+        self,
+        chroma,
+        documents: Iterable,
+        batch_size: int = 256,
+        embed_workers: int = 4,
+        upsert_workers: int = 2,
+        queue_size: int = 8,
+        retries: int = 3,
+        checkpoint: Optional[str] = None,
+        report_interval: float = 30.0,
+        incremental: bool = False,
+        page_size: int = 1000,
+    ) -> None:
+        self.chroma = chroma
+        self.documents = documents
+        self.batch_size = int(batch_size)
+        self.embed_workers = int(embed_workers)
+        self.upsert_workers = int(upsert_workers)
+        self.retries = int(retries)
+        self.report_interval = report_interval
+        self.checkpoint = _Checkpoint(checkpoint) if checkpoint else None
+        self.incremental = incremental
+        self.page_size = int(page_size)
+
+        self._embed_queue = queue.Queue(maxsize=queue_size)
+        self._upsert_queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._embedding = self.embed_workers
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+        self.stages = {
+            "read": _Stage(1),
+            "embed": _Stage(self.embed_workers),
+            "upsert": _Stage(self.upsert_workers),
+        }
+        self.skipped = 0
+        self.retried = 0
+        self.added = 0
+        self.updated = 0
+        self.deleted = 0
+        self._stored: Dict[str, Optional[str]] = {}
+        self._seen: set = set()
+
+    def run(self) -> dict:
+        """
+        Ingests every document, returns the stats
+        """
+        self._started = perf_counter()
+        if self.incremental:
+            self._stored = self._stored_hashes()
+        threads = [threading.Thread(target=self._read, name="ally-ingest-read", daemon=True)]
+        threads += [
+            threading.Thread(target=self._embed, name=f"ally-ingest-embed-{index}", daemon=True)
+            for index in range(self.embed_workers)
+        ]
+        threads += [
+            threading.Thread(target=self._upsert, name=f"ally-ingest-upsert-{index}", daemon=True)
+            for index in range(self.upsert_workers)
+        ]
+        with self.checkpoint or nullcontext():
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(self.report_interval)
+                        self._report()
+            except BaseException as ex:
+                # interrupted, the workers stop after their current batch
+                self._fail(ex)
+                raise
+            finally:
+                self._finished = perf_counter()
+                self._report()
+
+        if self._error is not None:
+            raise self._error
+        if self.incremental:
+            self._delete_removed()
+        return self.stats()
+
+    def stats(self) -> dict:
+        end = self._finished or perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        with self._lock:
+            upserted = self.stages["upsert"].docs
+            return {
+                "documents": upserted,
+                "skipped": self.skipped,
+                "retried": self.retried,
+                "added": self.added,
+                "updated": self.updated,
+                "deleted": self.deleted,
+                "elapsed": elapsed,
+                "throughput": upserted / elapsed if elapsed else 0.0,
+                "stages": {name: stage.stats(elapsed) for name, stage in self.stages.items()},
+                "queues": {"embed": self._embed_queue.qsize(), "upsert": self._upsert_queue.qsize()},
+                "bottleneck": max(self.stages, key=lambda name: self.stages[name].utilization(elapsed)),
+            }
+
+    def _read(self) -> None:
+        stage = self.stages["read"]
+        try:
+            batches = self._batches()
+            while not self._stop.is_set():
+                start = perf_counter()
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                number, ids, texts, metadatas = batch
+                self._count(stage, len(texts), perf_counter() - start)
+
+                if self.checkpoint and self.checkpoint.done(number, ids):
+                    with self._lock:
+                        self.skipped += len(ids)
+                    continue
+                if not self._put(stage, self._embed_queue, batch):
+                    break
+        except BaseException as ex:
+            self._fail(ex)
+        finally:
+            for _ in range(self.embed_workers):
+                self._put(stage, self._embed_queue, _DONE)
+
+    def _embed(self) -> None:
+        stage = self.stages["embed"]
+        try:
+            while True:
+                item = self._get(self._embed_queue)
+                if item is _DONE:
+                    break
+                number, ids, texts, metadatas = item
+                start = perf_counter()
+                vectors = self._retry(lambda: self._embed_texts(texts))
+                self._count(stage, len(texts), perf_counter() - start)
+                if not self._put(stage, self._upsert_queue, (number, ids, texts, metadatas, vectors)):
+                    break
+        except BaseException as ex:
+            self._fail(ex)
+        finally:
+            with self._lock:
+                self._embedding -= 1
+                last = self._embedding == 0
+            if last:
+                for _ in range(self.upsert_workers):
+                    self._put(stage, self._upsert_queue, _DONE)
+
+    def _upsert(self) -> None:
+        stage = self.stages["upsert"]
+        size = self.chroma._client.get_max_batch_size()
+        try:
+            while True:
+                item = self._get(self._upsert_queue)
+                if item is _DONE:
+                    break
+                items = [item]
+                # batches waiting meanwhile go in the same upsert, up to the client's limit
+                while sum(len(item[1]) for item in items) < size:
+                    try:
+                        item = self._upsert_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        self._upsert_queue.put(_DONE)
+                        break
+                    items.append(item)
+
+                ids, texts, metadatas, vectors = [], [], [], []
+                for _, batch_ids, batch_texts, batch_metadatas, batch_vectors in items:
+                    ids += batch_ids
+                    texts += batch_texts
+                    metadatas += batch_metadatas
+                    vectors += batch_vectors
+
+                start = perf_counter()
+                self._retry(lambda: self.chroma._upsert_texts(texts, ids, vectors, metadatas))
+                self._count(stage, len(ids), perf_counter() - start)
+                if self.checkpoint:
+                    for number, batch_ids, *_ in items:
+                        self.checkpoint.add(number, batch_ids)
+        except BaseException as ex:
+            self._fail(ex)
+
+    def _batches(self) -> Iterator[Tuple[int, List[str], List[str], List[dict]]]:
+        ids, texts, metadatas = [], [], []
+        number = 0
+        ordinals: Dict[str, int] = {}
+        for position, document in enumerate(self.documents):
+            if self.incremental:
+                id, text, metadata = _parse_stable(position, document, ordinals)
+                if not self._changed(id, text, metadata):
+                    continue
+            else:
+                id, text, metadata = _parse(position, document)
+            ids.append(id)
+            texts.append(text)
+            metadatas.append(metadata)
+            if len(ids) == self.batch_size:
+                yield number, ids, texts, metadatas
+                ids, texts, metadatas = [], [], []
+                number += 1
+        if ids:
+            yield number, ids, texts, metadatas
+
+    def _changed(self, id: str, text: str, metadata: dict) -> bool:
+        """
+        Stamps the content hash on `metadata`, False when the stored document has the same one
+        """
+        metadata[HASH_KEY] = _content_hash(text, metadata)
+        # MISSING when the document is not stored yet, None when it is stored without a hash
+        stored = self._stored.get(id, MISSING)
+        with self._lock:
+            self._seen.add(id)
+            if stored == metadata[HASH_KEY]:
+                self.skipped += 1
+                return False
+            if stored is MISSING:
+                self.added += 1
+            else:
+                self.updated += 1
+        return True
+
+    def _stored_hashes(self) -> Dict[str, Optional[str]]:
+        """
+        Content hash of every stored document, fetched `page_size` at a time
+        """
+        hashes = {}
+        for page in self.chroma.iter_pages(self.page_size, include=["metadatas"]):
+            for id, metadata in zip(page["ids"], page["metadatas"]):
+                hashes[id] = (metadata or {}).get(HASH_KEY)
+        return hashes
+
+    def _delete_removed(self) -> None:
+        removed = [id for id in self._stored if id not in self._seen]
+        size = self.chroma._client.get_max_batch_size()
+        for start in range(0, len(removed), size):
+            self.chroma.delete(ids=removed[start : start + size])
+        self.deleted = len(removed)
+        if removed:
+            logger.info(f"Ingest: {len(removed)} removed documents deleted")
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        # repeated texts are embedded once by the model itself with `dedup: true` in the embeddings section
+        return self.chroma._embedding_function.embed_documents(texts)
+
+    def _retry(self, func: Callable[[], Any]) -> Any:
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except Exception as ex:
+                if attempt >= self.retries or self._stop.is_set():
+                    raise
+                delay = retry_after(ex) or min(2.0**attempt, 60.0)
+                logger.warning(f"Ingest batch failed, retrying in {delay:.1f}s. {type(ex).__name__}: {ex}")
+                with self._lock:
+                    self.retried += 1
+                self._stop.wait(delay)
+
+    def _put(self, stage: "_Stage", target: queue.Queue, item) -> bool:
+        """
+        Waits for room in `target`, returns False when the pipeline is stopping
+        """
+        start = perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            with self._lock:
+                stage.blocked += perf_counter() - start
+
+    def _get(self, source: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _count(self, stage: "_Stage", docs: int, busy: float) -> None:
+        with self._lock:
+            stage.docs += docs
+            stage.busy += busy
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _report(self) -> None:
+        stats = self.stats()
+        rates = ", ".join(f"{name} {stage['docs_per_second']:.1f}/s" for name, stage in stats["stages"].items())
+        logger.info(
+            f"Ingest: {stats['documents']} upserted, {stats['skipped']} skipped, {rates}, "
+            f"bottleneck: {stats['bottleneck']}"
+        )
+
+
+class _Stage:
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.docs = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+
+    def utilization(self, elapsed: float) -> float:
+        return self.busy / (elapsed * self.workers) if elapsed else 0.0
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            "docs": self.docs,
+            "workers": self.workers,
+            "busy": self.busy,
+            "blocked": self.blocked,
+            "docs_per_second": self.docs / elapsed if elapsed else 0.0,
+            "utilization": self.utilization(elapsed),
+        }
+
+
+def _parse(position: int, document) -> Tuple[str, str, dict]:
+    """
+    Id, text and metadata of a Document or a plain text
+    - Without an id, it is derived from the position and the text, the same input gets the same ids
+    """
+    text, metadata = _text(document)
+    id = getattr(document, "id", None)
+    if id is None:
+        id = str(uuid.uuid5(uuid.NAMESPACE_OID, f"{position}:{text}"))
+    return id, text, metadata
+
+
+def _parse_stable(position: int, document, ordinals: Dict[str, int]) -> Tuple[str, str, dict]:
+    """
+    Like `_parse`, but ids stay the same when the text changes
+    - Without an id, it is derived from the `source` metadata and the chunk's ordinal within the source,
+      or from the position when there is no source
+    """
+    text, metadata = _text(document)
+    id = getattr(document, "id", None)
+    if id is None:
+        source = metadata.get("source")
+        if source is None:
+            key = f"{position}"
+        else:
+            ordinal = ordinals.get(str(source), 0)
+            ordinals[str(source)] = ordinal + 1
+            key = f"{source}#{ordinal}"
+        id = str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+    return id, text, metadata
+
+
+def _text(document) -> Tuple[str, dict]:
+    if isinstance(document, Document):
+        return document.page_content, dict(document.metadata or {})
+    return str(document), {}
+
+
+def _content_hash(text: str, metadata: dict) -> str:
+    metadata = {key: value for key, value in metadata.items() if key != HASH_KEY}
+    content = text + "\x00" + json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class _Checkpoint(Checkpoint):
+    """
+    Upserted batches, keyed by batch number and a hash of the batch ids
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path, key="batch", name="ingest")
+
+    def done(self, number: int, ids: List[str]) -> bool:
+        entry = self.entry(number)
+        return entry is not None and entry["ids"] == _fingerprint(ids)
+
+    def add(self, number: int, ids: List[str]) -> None:
+        self.append({"batch": number, "ids": _fingerprint(ids)})
+
+
+def _fingerprint(ids: List[str]) -> str:
+    return hashlib.sha256("\x00".join(ids).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,79 @@
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+Embeddings = Union[np.ndarray, Sequence[Sequence[float]]]
+
+
+class MMRReranker:
+    """
+    Maximal marginal relevance over the embeddings a query returned, without embedding the candidates again
+    - Each step picks the candidate with the best `lambda_mult` * similarity to the query
+      - (1 - `lambda_mult`) * highest similarity to the ones already picked, with cosine similarity
+    - The similarity to the picked candidates is kept per candidate and updated with one matrix product per step,
+      there is no loop over candidates
+    - `select_batch` reranks the candidates of many queries at once, padding queries with fewer candidates
+
+    ```python
+    reranker = MMRReranker(lambda_mult=0.5)
+    indexes = reranker.select(query_embedding, candidate_embeddings, k=4)
+    ```
+    """
+
+    def __init__(self, lambda_mult: float = 0.5) -> None:
+        self.lambda_mult = float(lambda_mult)
+
+    def select(self, query_embedding: Embeddings, embeddings: Embeddings, k: int = 4) -> List[int]:
+        """
+        Indexes of the `k` picked candidates, in the order they were picked
+        """
+        return self.select_batch([query_embedding], [embeddings], k)[0]
+
+    def select_batch(
+        self, query_embeddings: Embeddings, embeddings: Sequence[Embeddings], k: int = 4
+    ) -> List[List[int]]:
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        counts = [len(candidates) for candidates in embeddings]
+        size = max(counts, default=0)
+        if size == 0 or k <= 0:
+            return [[] for _ in counts]
+
+        # candidates of every query in one (queries, size, dimensions) array, `valid` marks the padding
+        if all(count == size for count in counts):
+            candidates = np.array(embeddings, dtype=np.float32)
+        else:
+            candidates = np.zeros((len(counts), size, queries.shape[1]), dtype=np.float32)
+            for row, vectors in enumerate(embeddings):
+                if counts[row]:
+                    candidates[row, : counts[row]] = vectors
+        candidates = _normalize(candidates, out=candidates)
+        valid = np.arange(size)[None, :] < np.asarray(counts)[:, None]
+
+        relevance = _similarity(candidates, queries)
+        redundancy = np.full(relevance.shape, -np.inf, dtype=np.float32)
+        available = valid.copy()
+        rows = np.arange(len(counts))
+        picked = []
+        for step in range(min(k, size)):
+            # the first pick is the most relevant candidate
+            scores = relevance if step == 0 else self.lambda_mult * relevance - (1 - self.lambda_mult) * redundancy
+            scores = np.where(available, scores, -np.inf)
+            best = scores.argmax(axis=1)
+            picked.append(np.where(available[rows, best], best, -1))
+            available[rows, best] = False
+            redundancy = np.maximum(redundancy, _similarity(candidates, candidates[rows, best]))
+
+        picked = np.stack(picked, axis=1)
+        return [[int(index) for index in row if index >= 0] for row in picked]
+
+
+def _normalize(vectors: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    norms = np.sqrt(np.einsum("...d,...d->...", vectors, vectors))[..., None]
+    return np.divide(vectors, np.where(norms == 0, 1, norms), out=out)
+
+
+def _similarity(candidates: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    (queries, candidates) similarities of each query's candidates to its vector, as one batched matmul
+    """
+    return np.matmul(candidates, vectors[:, :, None])[:, :, 0]
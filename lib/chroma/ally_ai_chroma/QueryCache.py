@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from time import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from ally_ai_core.utils import file_lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+# write counters per collection, shared by every cache in the process
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+class QueryCache:
+    """
+    In-memory LRU cache of Chroma query results, one entry per query text or embedding
+    - Keyed by the collection, the query, `n_results`, the `where` filters and `include`
+    - Entries expire after `ttl` seconds and the least recently used are evicted over `max_size`
+    - `invalidate(collection)` drops the entries of a collection, Chroma calls it after each of its writes,
+      caches of other Chroma instances in the process drop theirs too since the write counters are shared
+    - Chroma names a collection by its client location and collection name
+    - With `generation`, a counter file shared by processes is bumped on every write,
+      and entries cached before the last bump of any process are dropped
+
+    Settings in the `chromadb` section:
+    ```yaml
+    chromadb:
+      query_cache:
+        max_size: 1024
+        ttl: 300
+        generation: './.cache/chroma-generation'  # optional
+    ```
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, generation: Optional[str] = None) -> None:
+        self.max_size = int(max_size)
+        self.ttl = float(ttl) if ttl else None
+        self.generation = generation
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        if generation:
+            os.makedirs(os.path.dirname(os.path.abspath(generation)), exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(collection: str, query: Any, **options: Any) -> str:
+        """
+        `query` is a text or an embedding, `options` are `n_results`, `include` and the filters
+        """
+        if isinstance(query, str):
+            query = ("text", query)
+        else:
+            query = ("embedding", hashlib.sha256(np.asarray(query, dtype=np.float32).tobytes()).hexdigest())
+        content = json.dumps([collection, query, options], sort_keys=True, default=str)
+        return f"{collection}\x00{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+
+    def version(self, collection: str) -> Tuple[int, int]:
+        """
+        Taken before a query and passed to `put`, so a result that raced a write is not cached
+        """
+        with _versions_lock:
+            local = _versions.get(collection, 0)
+        return local, self._shared()
+
+    def get(self, key: str) -> Optional[Any]:
+        collection = key.split("\x00", 1)[0]
+        version = self.version(collection)
+        now = time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] == version and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[2])
+            self._memory.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any, version: Tuple[int, int]) -> None:
+        collection = key.split("\x00", 1)[0]
+        if self.version(collection) != version:
+            return
+        with self._lock:
+            self._memory[key] = (time(), version, copy.deepcopy(value))
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def invalidate(self, collection: str) -> None:
+        with _versions_lock:
+            _versions[collection] = _versions.get(collection, 0) + 1
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(f"{collection}\x00")]:
+                del self._memory[key]
+            self.invalidations += 1
+        if self.generation:
+            self._bump()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "size": len(self._memory),
+                "invalidations": self.invalidations,
+                "generation": self._shared(),
+            }
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _shared(self) -> int:
+        if not self.generation:
+            return 0
+        try:
+            with open(self.generation, "r", encoding="utf-8") as file:
+                return int(file.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump(self) -> None:
+        # the counter is replaced, not rewritten in place, so readers never see a half written file
+        with open(f"{self.generation}.lock", "a") as lock, file_lock(lock):
+            temporary = f"{self.generation}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(str(self._shared() + 1))
+            os.replace(temporary, self.generation)
+
+    def __repr__(self) -> str:
+        return f"QueryCache(max_size={self.max_size}, ttl={self.ttl}, generation={self.generation!r})"
+
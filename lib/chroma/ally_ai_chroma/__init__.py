@@ -1,4 +1,8 @@
+from ally_ai_chroma.BM25Index import BM25Index
 from ally_ai_chroma.Chroma import Chroma
+from ally_ai_chroma.IngestionPipeline import IngestionPipeline
+from ally_ai_chroma.MMRReranker import MMRReranker
+from ally_ai_chroma.QueryCache import QueryCache
 from ally_ai_core import Settings
 
-__all__ = ["Chroma", "Settings"]
+__all__ = ["BM25Index", "Chroma", "IngestionPipeline", "MMRReranker", "QueryCache", "Settings"]
@@ -1,5 +1,8 @@
 from typing import Literal, Optional
 
+import numpy as np
+from langchain_core.documents import Document
+
 from ally_ai_chroma import Chroma
 from .EmbeddingsVisualisor import EmbeddingsVisualisor
 import logging
@@ -20,13 +23,30 @@ class ChromaEmbeddingsVisualisor:
             self.document_embeddings
         )
 
-    def get_documents_and_embeddings(self, limit: Optional[int] = None):
+    def get_documents_and_embeddings(self, limit: Optional[int] = None, batch_size: int = 1000):
+        """
+        Pages through the collection, embeddings are filled into one float32 array
+        """
         include = ["embeddings", "documents"]
         logger.info(f"getting data '{include}' from chroma client")
 
-        collection = self.chroma_client.get(limit=limit, include=include)
-        document_embeddings = collection["embeddings"]
-        documents = collection["documents"]
+        total = self.chroma_client._collection.count()
+        if limit is not None:
+            total = min(total, limit)
+        document_embeddings = None
+        documents = []
+        for page in self.chroma_client.iter_pages(batch_size=min(batch_size, max(total, 1)), include=include):
+            rows = min(len(page["ids"]), total - len(documents))
+            if document_embeddings is None:
+                document_embeddings = np.empty((total, page["embeddings"].shape[1]), dtype=np.float32)
+            document_embeddings[len(documents) : len(documents) + rows] = page["embeddings"][:rows]
+            documents += page["documents"][:rows]
+            if len(documents) >= total:
+                break
+        if document_embeddings is None:
+            document_embeddings = np.empty((0, 0), dtype=np.float32)
+        # the collection may have shrunk while paging, rows past the last page were never filled
+        document_embeddings = document_embeddings[: len(documents)]
 
         logger.info(f"total documents: {len(documents)}")
         return (document_embeddings, documents)
@@ -47,20 +67,24 @@ class ChromaEmbeddingsVisualisor:
             'retrieved_documents_embeddings': Any
         }
         ```
-
+        - `mmr` reranks with the embeddings the query returned, nothing is embedded again
         """
+        if search_type == "mmr":
+            return self._search_mmr(query, **kwargs)
+
         logger.info(f"retrieving documents. Query: '{query}'")
         retrieved_documents = self.chroma_client.search(
             query=query, search_type=search_type, **kwargs
         )
 
         logger.info(f"embedding retrieved documents. Len:{len(retrieved_documents)}")
-        retrieved_documents_embeddings = self.chroma_client.embeddings.embed_documents(
-            [doc.page_content for doc in retrieved_documents]
+        retrieved_documents_embeddings = np.asarray(
+            self.chroma_client.embeddings.embed_documents([doc.page_content for doc in retrieved_documents]),
+            dtype=np.float32,
         )
 
         logger.info(f"embedding the query. Query: '{query}'")
-        query_embeddings = self.chroma_client.embeddings.embed_query(query)
+        query_embeddings = np.asarray(self.chroma_client.embeddings.embed_query(query), dtype=np.float32)
 
         return {
             "query": query,
@@ -69,6 +93,38 @@ class ChromaEmbeddingsVisualisor:
             "retrieved_documents_embeddings": retrieved_documents_embeddings,
         }
 
+    def _search_mmr(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs,
+    ) -> dict:
+        logger.info(f"retrieving documents with mmr. Query: '{query}'")
+        results = self.chroma_client.mmr_query(
+            query,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            include=["documents", "metadatas", "embeddings"],
+            arrays=True,
+            where=filter,
+            **kwargs,
+        )
+        retrieved_documents = [
+            Document(page_content=document, metadata=metadata or {})
+            for document, metadata in zip(results["documents"][0], results["metadatas"][0])
+        ]
+
+        return {
+            "query": query,
+            "query_embeddings": results["query_embeddings"][0],
+            "retrieved_documents": retrieved_documents,
+            "retrieved_documents_embeddings": results["embeddings"][0],
+        }
+
     def visualise(
         self,
         query: str,
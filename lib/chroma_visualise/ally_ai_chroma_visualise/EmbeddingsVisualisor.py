@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 from matplotlib.figure import Figure
 import umap
 import numpy as np
@@ -9,12 +9,14 @@ import logging
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+Embeddings = Union[np.ndarray, List[List[float]]]
+
 
 class EmbeddingsVisualisor:
-    def __init__(self, all_embeddings) -> None:
+    def __init__(self, all_embeddings: Embeddings) -> None:
         logger.info("init is called")
 
-        self.all_embeddings = all_embeddings
+        self.all_embeddings = _as_array(all_embeddings)
         self._all_embeddings_2d = None
         self.umap_transform = self.get_umap_transform()
 
@@ -24,17 +26,23 @@ class EmbeddingsVisualisor:
         ).fit(self.all_embeddings)
         return umap_transform
 
-    def convert_embeddings_to_2D(self, embeddings):
-        umap_embeddings = np.empty((len(embeddings), 2))
-        for i, embedding in enumerate(tqdm(embeddings)):
-            umap_embeddings[i] = self.umap_transform.transform([embedding])
+    def convert_embeddings_to_2D(self, embeddings: Embeddings, batch_size: int = 1024) -> np.ndarray:
+        """
+        Projects float32 embeddings of shape (rows, dimensions) in slices of `batch_size` rows
+        """
+        embeddings = _as_array(embeddings, dimensions=self.all_embeddings.shape[1])
+        umap_embeddings = np.empty((len(embeddings), 2), dtype=np.float32)
+        for start in tqdm(range(0, len(embeddings), batch_size)):
+            umap_embeddings[start : start + batch_size] = self.umap_transform.transform(
+                embeddings[start : start + batch_size]
+            )
         return umap_embeddings
 
     def visualise(
         self,
         title: str,
-        query_embeddings: List[float],
-        document_embeddings: List[List[float]],
+        query_embeddings: Union[np.ndarray, List[float]],
+        document_embeddings: Embeddings,
         figure: Optional[Figure] = None,
     ) -> Figure:
         """
@@ -65,7 +73,7 @@ class EmbeddingsVisualisor:
             self._all_embeddings_2d = self.convert_embeddings_to_2D(self.all_embeddings)
 
         logger.info("converting query embeddings to 2D")
-        query_embeddings_2d = self.convert_embeddings_to_2D([query_embeddings])
+        query_embeddings_2d = self.convert_embeddings_to_2D(query_embeddings)
 
         logger.info("converting retrieved document embeddings to 2D.")
         document_embeddings_2d = self.convert_embeddings_to_2D(document_embeddings)
@@ -99,3 +107,13 @@ class EmbeddingsVisualisor:
         plt.axis("off")
 
         return figure
+
+
+def _as_array(embeddings: Embeddings, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Embeddings as a contiguous float32 array of shape (rows, dimensions), arrays that already are one are not copied
+    """
+    array = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if array.ndim == 1:
+        array = array.reshape(1, -1) if array.size else array.reshape(0, dimensions or 0)
+    return array
@@ -3,5 +3,9 @@ from .settings.Settings import Settings
 from . import errors
 from . import decorators
 from . import context_managers
+from . import routing
+from . import limits
+from . import connections
+from . import checkpoints
 
-__all__ = ["utils", "Settings", "errors", "decorators", "context_managers"]
+__all__ = ["utils", "Settings", "errors", "decorators", "context_managers", "routing", "limits", "connections", "checkpoints"]
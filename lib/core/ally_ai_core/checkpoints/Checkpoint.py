@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the value of a key that is not there, where None is a valid value
+MISSING = object()
+
+
+class Checkpoint:
+    """
+    Append-only jsonl of finished work, so an interrupted run resumes where it stopped
+    - Entries are dicts, the `key` field of each one identifies it, a later entry of the same key wins
+    - The file is read on creation and open for appending only inside a `with` block
+    - A cut off last line of an interrupted run is skipped
+    """
+
+    def __init__(self, path: str, key: str, name: str = "run") -> None:
+        self.path = path
+        self.key = key
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, dict] = {}
+        self._file = None
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._entries[entry[key]] = entry
+            logger.info(f"Resuming {name} from '{path}'. Done: {len(self._entries)}")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __enter__(self) -> "Checkpoint":
+        self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def entry(self, key: Any) -> Optional[dict]:
+        """
+        The entry of `key` read from the file or appended since, None when there is none
+        """
+        return self._entries.get(key)
+
+    def append(self, entry: dict) -> None:
+        """
+        Writes `entry` as one line, raises TypeError or ValueError when it is not JSON or the file is not open
+        """
+        line = json.dumps(entry)
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"Checkpoint '{self.path}' is not open")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._entries[entry[self.key]] = entry
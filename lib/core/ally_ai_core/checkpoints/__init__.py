@@ -0,0 +1,3 @@
+from .Checkpoint import MISSING, Checkpoint
+
+__all__ = ["MISSING", "Checkpoint"]
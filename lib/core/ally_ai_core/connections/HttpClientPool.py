@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientPool:
+    """
+    Process-wide pooled http clients, one sync and one async client per endpoint and options
+    - Models of the same endpoint reuse open connections instead of new TCP and TLS handshakes
+    - The pool size caps the connections per endpoint across every model
+    - The async client keeps one connection pool per event loop, a new `asyncio.run` gets fresh connections
+    - httpx is imported on first use, it comes with the openai packages
+
+    Settings in the `llm` and `embeddings` sections:
+    ```yaml
+    llm:
+      http:
+        max_connections: 100
+        max_keepalive_connections: 20
+        keepalive_expiry: 30
+        http2: false  # needs `pip install httpx[http2]`
+        timeout: 600
+    ```
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, "_Entry"] = {}
+
+    def clients(self, endpoint: str, **options: Any) -> Tuple[Any, Any]:
+        """
+        Returns the shared (httpx.Client, httpx.AsyncClient) of `endpoint` with `options`
+        """
+        key = (endpoint.rstrip("/"), tuple(sorted(options.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(endpoint, **options)
+                logger.debug(f"Created pooled http clients for '{endpoint}'")
+            return entry.client, entry.async_client
+
+    def for_settings(self, settings: dict, kwargs: dict, async_name: str = "http_async_client") -> dict:
+        """
+        Client keyword arguments of a model built from `settings`, configured by their `http` key
+        - The `http` key is popped from `settings`
+        - `http: false` or a `http_client` passed in keep the clients of openai, nothing is returned
+        - `async_name` is the keyword of the async client, `async_http_client` for llamaindex
+        """
+        options = settings.pop("http", None)
+        if options is False or "http_client" in settings or "http_client" in kwargs:
+            return {}
+        client, async_client = self.clients(settings["azure_endpoint"], **(options or {}))
+        return {"http_client": client, async_name: async_client}
+
+    def stats(self) -> dict:
+        """
+        Requests, in-flight requests and open/idle connections per endpoint
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        stats = {}
+        for entry in entries:
+            name = entry.endpoint if entry.endpoint not in stats else f"{entry.endpoint} {entry.options}"
+            stats[name] = entry.stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Closes the sync clients and forgets every client, async clients are closed by `aclose`
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.client.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.client.close()
+            await entry.async_client.aclose()
+
+
+class _Entry:
+    def __init__(
+        self,
+        endpoint: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: Optional[float] = 30.0,
+        http2: bool = False,
+        timeout: Optional[float] = 600.0,
+        connect_timeout: float = 5.0,
+    ) -> None:
+        import httpx
+        from .MeteredTransport import AsyncMeteredTransport, ConnectionMeter, MeteredTransport
+
+        self.endpoint = endpoint
+        self.options = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "http2": http2,
+        }
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        timeout = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self.meter = ConnectionMeter()
+        self.async_meter = ConnectionMeter()
+        self._transport = httpx.HTTPTransport(limits=limits, http2=http2)
+        self._async_transport = _LoopTransport(lambda: httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+        self.client = httpx.Client(
+            transport=MeteredTransport(self._transport, self.meter),
+            timeout=timeout,
+            follow_redirects=True,
+        )
+        self.async_client = httpx.AsyncClient(
+            transport=AsyncMeteredTransport(self._async_transport, self.async_meter),
+            timeout=timeout,
+            follow_redirects=True,
+        )
+
+    def stats(self) -> dict:
+        return {
+            **self.options,
+            "sync": _stats(self.meter, self._transport),
+            "async": _stats(self.async_meter, *self._async_transport.transports()),
+        }
+
+
+def _stats(meter, *transports) -> dict:
+    # httpcore connection pools behind the httpx transports
+    connections = [
+        connection
+        for transport in transports
+        for connection in list(getattr(getattr(transport, "_pool", None), "connections", []))
+    ]
+    return {
+        "requests": meter.requests,
+        "active": meter.active,
+        "max_active": meter.max_active,
+        "errors": meter.errors,
+        "connections": len(connections),
+        "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+class _LoopTransport:
+    """
+    One async transport per running event loop
+    - Connections of an async transport belong to the loop that opened them, they fail once it is closed
+    - Transports are dropped with their loop
+    """
+
+    def __init__(self, create) -> None:
+        self._create = create
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def current(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self._create()
+            return transport
+
+    def transports(self) -> list:
+        with self._lock:
+            return list(self._transports.values())
+
+    async def handle_async_request(self, request):
+        return await self.current().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+            self._transports.clear()
+        if transport is not None:
+            await transport.aclose()
+
+
+http_clients = HttpClientPool()
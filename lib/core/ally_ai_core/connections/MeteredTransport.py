@@ -0,0 +1,111 @@
+import threading
+
+import httpx
+
+
+class ConnectionMeter:
+    """
+    Request counters of one pooled client, in-flight until the response body is closed
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.errors = 0
+
+    def started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def finished(self, error: bool = False) -> None:
+        with self._lock:
+            self.active -= 1
+            if error:
+                self.errors += 1
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """
+    Counts the requests going through a sync transport
+    """
+
+    def __init__(self, transport: httpx.HTTPTransport, meter: ConnectionMeter) -> None:
+        self.transport = transport
+        self.meter = meter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.meter.started()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.meter.finished(error=True)
+            raise
+        response.stream = _MeteredStream(response.stream, self.meter)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    """
+    Counts the requests going through an async transport
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, meter: ConnectionMeter) -> None:
+        self.transport = transport
+        self.meter = meter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.meter.started()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            self.meter.finished(error=True)
+            raise
+        response.stream = _AsyncMeteredStream(response.stream, self.meter)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream, meter: ConnectionMeter) -> None:
+        self.stream = stream
+        self.meter = meter
+        self.closed = False
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.meter.finished()
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream, meter: ConnectionMeter) -> None:
+        self.stream = stream
+        self.meter = meter
+        self.closed = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.meter.finished()
@@ -0,0 +1,3 @@
+from .HttpClientPool import HttpClientPool, http_clients
+
+__all__ = ["HttpClientPool", "http_clients"]
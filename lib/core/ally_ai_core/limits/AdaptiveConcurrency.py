@@ -0,0 +1,79 @@
+import threading
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that ramps up while the endpoint keeps up and backs off when it does not
+    - Grows by one after `limit` successes in a row, like TCP congestion avoidance
+    - Shrinks by one when recent latency exceeds `latency_tolerance` times the long-term latency
+    - Halves on throttling (429)
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_tolerance: float = 1.5,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.minimum = int(minimum)
+        self.maximum = int(maximum)
+        self.limit = max(self.minimum, min(int(initial), self.maximum))
+        self.latency_tolerance = float(latency_tolerance)
+        self.smoothing = float(smoothing)
+
+        self._lock = threading.Lock()
+        self._streak = 0
+        self.baseline: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+
+    def succeeded(self, latency: float) -> None:
+        with self._lock:
+            if self.latency is None:
+                self.baseline = self.latency = latency
+            else:
+                # the baseline follows slowly, so a lasting slowdown becomes the new normal
+                self.baseline += 0.01 * (latency - self.baseline)
+                self.latency += self.smoothing * (latency - self.latency)
+
+            self._streak += 1
+            if self._streak < self.limit:
+                return
+            self._streak = 0
+
+            if self.latency > self.baseline * self.latency_tolerance:
+                self._set(self.limit - 1)
+            else:
+                self._set(self.limit + 1)
+
+    def throttled(self) -> None:
+        with self._lock:
+            self._streak = 0
+            self._set(self.limit // 2)
+
+    def _set(self, limit: int) -> None:
+        limit = max(self.minimum, min(limit, self.maximum))
+        if limit > self.limit:
+            self.increases += 1
+        elif limit < self.limit:
+            self.decreases += 1
+            logger.info(f"Concurrency is lowered to {limit}. Latency: {self.latency}")
+        self.limit = limit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "latency": self.latency,
+                "baseline": self.baseline,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+
+class Deduplicator:
+    """
+    Finds the distinct items of a batch, so each is processed once and the results are scattered back
+    - `unique` returns the distinct items in first-seen order and, per position, the index of its distinct item
+    - `scatter` gives repeated positions a `copy` of the result, the first position the result itself
+    """
+
+    def __init__(self, copy: Optional[Callable[[Any], Any]] = None) -> None:
+        self.copy = copy or (lambda value: value)
+        self._lock = threading.Lock()
+        self.items = 0
+        self.duplicates = 0
+
+    def unique(self, items: Sequence[Hashable]) -> Tuple[List[Hashable], List[int]]:
+        positions = {}
+        unique = []
+        inverse = []
+        for item in items:
+            index = positions.setdefault(item, len(unique))
+            if index == len(unique):
+                unique.append(item)
+            inverse.append(index)
+
+        with self._lock:
+            self.items += len(inverse)
+            self.duplicates += len(inverse) - len(unique)
+        return unique, inverse
+
+    def scatter(self, results: Sequence[Any], inverse: List[int]) -> List[Any]:
+        if len(results) == len(inverse):
+            return list(results)
+        seen = set()
+        scattered = []
+        for index in inverse:
+            scattered.append(self.copy(results[index]) if index in seen else results[index])
+            seen.add(index)
+        return scattered
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.duplicates / self.items if self.items else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": self.items,
+                "duplicates": self.duplicates,
+                "dedup_ratio": self.dedup_ratio,
+            }
@@ -0,0 +1,222 @@
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .RateLimiter import estimate_tokens, _percentile
+
+# upper bounds in seconds of the latency histogram, the last bucket takes the rest
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+class MicroBatcher:
+    """
+    Collects single calls arriving close together into one batch call, and fans the results back out
+    - A batch is sent `max_wait` seconds after its first item arrived, or as soon as it holds
+      `max_batch_size` items or `max_tokens` estimated tokens
+    - `func` and `afunc` take the list of items and return a result per item, in order,
+      an error is raised to every caller of the batch
+    - Sync callers are batched across threads, async callers within their event loop
+    - `stats` has batch size and latency histograms to tune `max_wait`
+    """
+
+    def __init__(
+        self,
+        func: Optional[Callable[[List[Any]], List[Any]]] = None,
+        afunc: Optional[Callable[[List[Any]], Awaitable[List[Any]]]] = None,
+        max_wait: float = 0.005,
+        max_batch_size: int = 16,
+        max_tokens: Optional[int] = None,
+        tokens: Callable[[Any], int] = estimate_tokens,
+        samples: int = 10000,
+    ) -> None:
+        self.func = func
+        self.afunc = afunc
+        self.max_wait = float(max_wait)
+        self.max_batch_size = int(max_batch_size)
+        self.max_tokens = max_tokens
+        self.tokens = tokens
+
+        self._condition = threading.Condition()
+        self._batch: Optional[_Batch] = None
+        self._abatches: Dict[int, _Batch] = {}
+
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.sizes = Counter()
+        self.latencies = deque(maxlen=samples)
+
+    def submit(self, item: Any) -> Any:
+        """
+        Adds `item` to the open batch and blocks until the batch is answered
+        """
+        start = monotonic()
+        tokens = self.tokens(item) if self.max_tokens else 0
+        with self._condition:
+            batch = self._batch
+            if batch is None or not batch.fits(tokens, self.max_batch_size, self.max_tokens):
+                self._close(batch)
+                batch = self._batch = _Batch()
+                leader = True
+            else:
+                leader = False
+            index = batch.add(item, tokens)
+            if batch.full(self.max_batch_size, self.max_tokens):
+                self._close(batch)
+
+        if leader:
+            with self._condition:
+                deadline = start + self.max_wait
+                while self._batch is batch:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self._close(batch)
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        self._observe(start)
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    async def asubmit(self, item: Any) -> Any:
+        """
+        Async version of `submit`, a cancelled caller does not cancel the batch of the others
+        """
+        start = monotonic()
+        loop = asyncio.get_running_loop()
+        key = id(loop)
+        tokens = self.tokens(item) if self.max_tokens else 0
+
+        batch = self._abatches.get(key)
+        if batch is None or not batch.fits(tokens, self.max_batch_size, self.max_tokens):
+            self._aflush(key, batch)
+            batch = self._abatches[key] = _Batch()
+            batch.timer = loop.call_later(self.max_wait, self._aflush, key, batch)
+        future = loop.create_future()
+        batch.add(item, tokens, future)
+        if batch.full(self.max_batch_size, self.max_tokens):
+            self._aflush(key, batch)
+
+        try:
+            return await future
+        finally:
+            self._observe(start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            for latency in latencies:
+                histogram[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "batch_size": {
+                    "mean": self.items / self.batches if self.batches else 0.0,
+                    "max": max(self.sizes) if self.sizes else 0,
+                    "histogram": dict(sorted(self.sizes.items())),
+                },
+                "latency": {
+                    "p50": _percentile(latencies, 50),
+                    "p90": _percentile(latencies, 90),
+                    "p99": _percentile(latencies, 99),
+                    "max": latencies[-1] if latencies else 0.0,
+                    "histogram": dict(zip([*LATENCY_BUCKETS, float("inf")], histogram)),
+                },
+            }
+
+    def _close(self, batch: Optional["_Batch"]) -> None:
+        """
+        Stops `batch` from taking more items, wakes its leader up
+        """
+        if batch is not None and self._batch is batch:
+            self._batch = None
+            self._condition.notify_all()
+
+    def _run(self, batch: "_Batch") -> None:
+        self._count(batch)
+        try:
+            batch.results = self.func(batch.items)
+        except BaseException as ex:
+            batch.error = ex
+            self._failed()
+        finally:
+            batch.done.set()
+
+    def _aflush(self, key: int, batch: Optional["_Batch"]) -> None:
+        if batch is None or self._abatches.get(key) is not batch:
+            return
+        del self._abatches[key]
+        batch.timer.cancel()
+        asyncio.get_running_loop().create_task(self._arun(batch))
+
+    async def _arun(self, batch: "_Batch") -> None:
+        self._count(batch)
+        try:
+            if self.afunc is not None:
+                results = await self.afunc(batch.items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.func, batch.items)
+        except BaseException as ex:
+            self._failed()
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(ex)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _count(self, batch: "_Batch") -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch.items)
+            self.sizes[len(batch.items)] += 1
+
+    def _failed(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def _observe(self, start: float) -> None:
+        with self._lock:
+            self.latencies.append(monotonic() - start)
+
+    def __repr__(self) -> str:
+        return (
+            f"MicroBatcher(max_wait={self.max_wait}, max_batch_size={self.max_batch_size}, "
+            f"max_tokens={self.max_tokens})"
+        )
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.tokens = 0
+        self.done = threading.Event()
+        self.results: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, item: Any, tokens: int, future: Optional[asyncio.Future] = None) -> int:
+        self.items.append(item)
+        self.tokens += tokens
+        if future is not None:
+            self.futures.append(future)
+        return len(self.items) - 1
+
+    def fits(self, tokens: int, max_batch_size: int, max_tokens: Optional[int]) -> bool:
+        # an item larger than `max_tokens` still gets a batch of its own
+        return len(self.items) < max_batch_size and not (max_tokens and self.tokens + tokens > max_tokens)
+
+    def full(self, max_batch_size: int, max_tokens: Optional[int]) -> bool:
+        return len(self.items) >= max_batch_size or bool(max_tokens and self.tokens >= max_tokens)
@@ -0,0 +1,192 @@
+import asyncio
+import math
+import threading
+from collections import deque
+from time import monotonic, sleep
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets as token buckets, for sync and async callers
+    - Callers reserve capacity in arrival order and sleep until their reservation is due,
+      so they are served first come first served instead of retrying on 429s
+    - Buckets hold `burst_seconds` worth of budget and may go into debt,
+      a large request delays the callers behind it but is never starved
+    - `adjust` corrects the token bucket once the actual usage is known
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst_seconds: float = 10.0,
+        samples: int = 10000,
+    ) -> None:
+        self._lock = threading.Lock()
+        self.requests = _Bucket()
+        self.tokens = _Bucket()
+        self.configure(requests_per_minute, tokens_per_minute, burst_seconds)
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_time = 0.0
+        self.waits = deque(maxlen=samples)
+
+    def configure(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst_seconds: float = 10.0,
+    ) -> None:
+        """
+        Changes the budgets, reservations already made are kept
+        """
+        with self._lock:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self.burst_seconds = float(burst_seconds)
+            now = monotonic()
+            self.requests.configure(requests_per_minute, self.burst_seconds, now)
+            self.tokens.configure(tokens_per_minute, self.burst_seconds, now)
+
+    def acquire(self, tokens: int = 0, requests: int = 1) -> float:
+        """
+        Blocks until `requests` requests using `tokens` tokens fit the budgets, returns the wait in seconds
+        """
+        wait = self._reserve(tokens, requests)
+        if wait > 0:
+            self._enter()
+            try:
+                sleep(wait)
+            finally:
+                self._leave()
+        return wait
+
+    async def aacquire(self, tokens: int = 0, requests: int = 1) -> float:
+        """
+        Async version of `acquire`, a cancelled caller gives its reservation back
+        """
+        wait = self._reserve(tokens, requests)
+        if wait > 0:
+            self._enter()
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.adjust(tokens=-tokens, requests=-requests)
+                raise
+            finally:
+                self._leave()
+        return wait
+
+    def adjust(self, tokens: int = 0, requests: int = 0) -> None:
+        """
+        Takes extra usage from the buckets, or gives it back when negative
+        """
+        with self._lock:
+            now = monotonic()
+            self.requests.take(requests, now)
+            self.tokens.take(tokens, now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self.waits)
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "wait_time": self.wait_time,
+                "wait": {
+                    "mean": self.wait_time / self.acquired if self.acquired else 0.0,
+                    "p50": _percentile(waits, 50),
+                    "p90": _percentile(waits, 90),
+                    "p99": _percentile(waits, 99),
+                    "max": waits[-1] if waits else 0.0,
+                },
+            }
+
+    def _reserve(self, tokens: int, requests: int) -> float:
+        with self._lock:
+            now = monotonic()
+            wait = max(self.requests.take(requests, now), self.tokens.take(tokens, now))
+            self.acquired += 1
+            self.wait_time += wait
+            self.waits.append(wait)
+            if wait > 0:
+                self.delayed += 1
+                logger.debug(f"Rate limited for {wait:.2f}s. Tokens: {tokens}")
+            return wait
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+
+    def __repr__(self) -> str:
+        return (
+            f"RateLimiter(requests_per_minute={self.requests_per_minute}, "
+            f"tokens_per_minute={self.tokens_per_minute}, burst_seconds={self.burst_seconds})"
+        )
+
+
+class _Bucket:
+    """
+    Token bucket whose level may go negative, the debt is the wait of the last reservation
+    """
+
+    def __init__(self) -> None:
+        self.rate: Optional[float] = None
+        self.capacity = 0.0
+        self.level = 0.0
+        self.updated = 0.0
+
+    def configure(self, per_minute: Optional[float], burst_seconds: float, now: float) -> None:
+        self._refill(now)
+        self.rate = float(per_minute) / 60 if per_minute else None
+        if self.rate is None:
+            return
+        capacity = max(self.rate * burst_seconds, 1.0)
+        # a new bucket starts full, a reconfigured one keeps its debt
+        self.level = capacity if self.capacity == 0 else min(self.level, capacity)
+        self.capacity = capacity
+
+    def take(self, amount: float, now: float) -> float:
+        """
+        Takes `amount` from the bucket, returns the seconds until the level is back to zero
+        """
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        self.level = min(self.level - amount, self.capacity)
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a text, about 4 characters per token for English
+    """
+    return math.ceil(len(text) / 4)
+
+
+def _percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
@@ -0,0 +1,59 @@
+import threading
+from typing import Dict, Optional
+
+from .RateLimiter import RateLimiter
+
+
+class RateLimiterRegistry:
+    """
+    Process-wide rate limiters, one per endpoint and deployment
+    - Every model calling the same deployment shares its quota
+    - Registering again with other budgets reconfigures the shared limiter
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    @staticmethod
+    def key(endpoint: Optional[str], deployment: Optional[str]) -> str:
+        return f"{endpoint}/{deployment}"
+
+    def register(self, key: str, **options) -> RateLimiter:
+        """
+        Returns the limiter of `key`, created or reconfigured with `options`
+        - options: requests_per_minute, tokens_per_minute, burst_seconds
+        """
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = RateLimiter(**options)
+                return limiter
+        limiter.configure(**options)
+        return limiter
+
+    def get(self, key: str) -> Optional[RateLimiter]:
+        with self._lock:
+            return self._limiters.get(key)
+
+    def register_deployment(self, endpoint: Optional[str], deployment: Optional[str], **options) -> RateLimiter:
+        return self.register(self.key(endpoint, deployment), **options)
+
+    def for_deployment(self, endpoint: Optional[str], deployment: Optional[str]) -> Optional[RateLimiter]:
+        return self.get(self.key(endpoint, deployment))
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._limiters.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._limiters.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {key: limiter.stats() for key, limiter in limiters.items()}
+
+
+rate_limiters = RateLimiterRegistry()
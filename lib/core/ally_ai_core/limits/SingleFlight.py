@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time
+    - The first caller of a key (leader) runs the call, callers arriving meanwhile (followers) wait for it
+    - Followers get the leader's result through `copy`, or the leader's error is raised to them too
+    - Async calls run as a task, a cancelled caller does not cancel the call of the others
+    """
+
+    def __init__(self, copy: Optional[Callable[[Any], Any]] = None) -> None:
+        self.copy = copy or (lambda value: value)
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "_Call"] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+        self.leaders = 0
+        self.followers = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self.copy(call.result)
+
+        try:
+            call.result = func()
+        except BaseException as ex:
+            call.error = ex
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            # callers arriving from now on start a new call
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of `do`, calls are coalesced within the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self._tasks[key] = loop.create_task(func())
+                task.add_done_callback(lambda done: self._finished(key, done))
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        result = await asyncio.shield(task)
+        return result if leader else self.copy(result)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._tasks)
+
+    @property
+    def dedup_ratio(self) -> float:
+        total = self.leaders + self.followers
+        return self.followers / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.leaders,
+                "deduplicated": self.followers,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "dedup_ratio": self.dedup_ratio,
+            }
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+            # retrieving the exception also keeps asyncio from warning when every caller was cancelled
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
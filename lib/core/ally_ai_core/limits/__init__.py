@@ -0,0 +1,17 @@
+from .RateLimiter import RateLimiter, estimate_tokens
+from .RateLimiterRegistry import RateLimiterRegistry, rate_limiters
+from .AdaptiveConcurrency import AdaptiveConcurrency
+from .SingleFlight import SingleFlight
+from .MicroBatcher import MicroBatcher
+from .Deduplicator import Deduplicator
+
+__all__ = [
+    "RateLimiter",
+    "estimate_tokens",
+    "RateLimiterRegistry",
+    "rate_limiters",
+    "AdaptiveConcurrency",
+    "SingleFlight",
+    "MicroBatcher",
+    "Deduplicator",
+]
@@ -0,0 +1,323 @@
+import logging
+import random
+import threading
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from ..connections import http_clients
+from ..limits import rate_limiters
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Deployment:
+    """
+    One endpoint/deployment the router can send requests to
+    - `target` is whatever does the call, e.g. a model bound to this deployment
+    - `settings` are the merged settings the target was built from
+    """
+
+    name: str
+    target: Any
+    weight: float = 1.0
+    settings: dict = field(default_factory=dict)
+
+    requests: int = 0
+    failures: int = 0
+    throttled: int = 0
+    consecutive_failures: int = 0
+    latency: Optional[float] = None
+    ejected_until: float = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "latency": self.latency,
+            "healthy": self.is_healthy(monotonic()),
+            "weight": self.weight,
+        }
+
+
+class DeploymentRouter:
+    """
+    Spreads requests across deployments by weight and observed latency
+    - Throttled (429) deployments are ejected for their Retry-After, or `eject_seconds`
+    - Deployments failing (5xx, connection) `max_failures` times in a row are ejected too
+    - Retriable failures fail over to the next deployment, other errors are raised as is
+
+    Settings:
+    ```yaml
+    llm:
+      api_key: '<private-key>'
+      deployments:
+        - endpoint: "<endpoint-1>"
+          deployment_name: '<deployment-1>'
+          weight: 2
+        - endpoint: "<endpoint-2>"
+          deployment_name: '<deployment-2>'
+          api_key: '<other-key>'
+      routing:
+        eject_seconds: 30
+        max_failures: 3
+    ```
+    """
+
+    def __init__(
+        self,
+        deployments: List[Deployment],
+        eject_seconds: float = 30.0,
+        max_failures: int = 3,
+        latency_smoothing: float = 0.2,
+    ) -> None:
+        if not deployments:
+            raise ValueError("DeploymentRouter needs at least one deployment.")
+
+        self.deployments = deployments
+        self.eject_seconds = float(eject_seconds)
+        self.max_failures = int(max_failures)
+        self.latency_smoothing = float(latency_smoothing)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(
+        cls, settings: dict, create: Callable[[dict], Any]
+    ) -> Optional["DeploymentRouter"]:
+        """
+        Pops `deployments` and `routing` from settings, returns None if there are no deployments
+        - `create` builds a target from the section settings merged with one deployment
+        """
+        entries = settings.pop("deployments", None)
+        options = settings.pop("routing", None) or {}
+        if not entries:
+            return None
+
+        deployments = []
+        for index, entry in enumerate(entries):
+            entry = dict(entry)
+            weight = float(entry.pop("weight", 1))
+            name = str(entry.pop("name", entry.get("deployment_name", index)))
+            merged = {**settings, **entry}
+            deployments.append(
+                Deployment(name=name, target=create(dict(merged)), weight=weight, settings=merged)
+            )
+
+        return cls(deployments, **options)
+
+    @classmethod
+    def for_model(
+        cls, settings: dict, kwargs: dict, create: Callable[[dict], Any]
+    ) -> Tuple[Optional["DeploymentRouter"], dict]:
+        """
+        Router and pooled http clients of a model built from `settings`, as LLM and EmbeddingModel use them
+        - `create` builds the model of one deployment with `max_retries: 0`, the router retries on other deployments
+        - A deployment's own `rate_limit` wins over the one of the section
+        - Without deployments the limiter of the section's own deployment is registered
+        - `settings` become model arguments in place, see `model_settings`
+        """
+        rate_limit = settings.pop("rate_limit", None)
+
+        def build(deployment: dict) -> Any:
+            clients = model_settings(deployment, kwargs, deployment.pop("rate_limit", None) or rate_limit)
+            return create({"max_retries": 0, **deployment, **kwargs, **clients})
+
+        router = cls.from_settings(settings, build)
+        if router is not None:
+            settings.setdefault("endpoint", router.deployments[0].settings["endpoint"])
+            settings.setdefault("deployment_name", router.deployments[0].settings["deployment_name"])
+
+        clients = model_settings(settings, kwargs, rate_limit if router is None else None)
+        return router, clients
+
+    def choose(self, exclude: tuple = ()) -> Deployment:
+        """
+        Picks a healthy deployment, weighted by `weight / latency`
+        - Falls back to the deployment whose ejection ends first if none is healthy
+        """
+        now = monotonic()
+        with self._lock:
+            candidates = [d for d in self.deployments if d not in exclude]
+            if not candidates:
+                raise ValueError("No deployment left to try.")
+
+            healthy = [d for d in candidates if d.is_healthy(now)]
+            if not healthy:
+                return min(candidates, key=lambda d: d.ejected_until)
+
+            latencies = [d.latency for d in healthy if d.latency]
+            reference = sum(latencies) / len(latencies) if latencies else 1.0
+            weights = [d.weight * reference / (d.latency or reference) for d in healthy]
+            return random.choices(healthy, weights=weights)[0]
+
+    def call(self, func: Callable[[Any], Any]) -> Any:
+        """
+        Calls `func(target)` on a chosen deployment, failing over on retriable errors
+        """
+        tried = ()
+        while True:
+            deployment = self.choose(exclude=tried)
+            start = perf_counter()
+            try:
+                result = func(deployment.target)
+            except Exception as ex:
+                tried += (deployment,)
+                if not self._failed(deployment, ex) or len(tried) == len(self.deployments):
+                    raise
+                continue
+            self._succeeded(deployment, perf_counter() - start)
+            return result
+
+    async def acall(self, func: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Async version of `call`
+        """
+        tried = ()
+        while True:
+            deployment = self.choose(exclude=tried)
+            start = perf_counter()
+            try:
+                result = await func(deployment.target)
+            except Exception as ex:
+                tried += (deployment,)
+                if not self._failed(deployment, ex) or len(tried) == len(self.deployments):
+                    raise
+                continue
+            self._succeeded(deployment, perf_counter() - start)
+            return result
+
+    def stream(self, func: Callable[[Any], Iterator]) -> Iterator:
+        """
+        Streams `func(target)`, failing over only until the first item is yielded
+        """
+        tried = ()
+        while True:
+            deployment = self.choose(exclude=tried)
+            start = perf_counter()
+            started = False
+            try:
+                for item in func(deployment.target):
+                    if not started:
+                        started = True
+                        self._succeeded(deployment, perf_counter() - start)
+                    yield item
+                if not started:
+                    self._succeeded(deployment, perf_counter() - start)
+                return
+            except Exception as ex:
+                tried += (deployment,)
+                retriable = self._failed(deployment, ex)
+                if started or not retriable or len(tried) == len(self.deployments):
+                    raise
+
+    async def astream(self, func: Callable[[Any], AsyncIterator]) -> AsyncIterator:
+        """
+        Async version of `stream`
+        """
+        tried = ()
+        while True:
+            deployment = self.choose(exclude=tried)
+            start = perf_counter()
+            started = False
+            try:
+                async for item in func(deployment.target):
+                    if not started:
+                        started = True
+                        self._succeeded(deployment, perf_counter() - start)
+                    yield item
+                if not started:
+                    self._succeeded(deployment, perf_counter() - start)
+                return
+            except Exception as ex:
+                tried += (deployment,)
+                retriable = self._failed(deployment, ex)
+                if started or not retriable or len(tried) == len(self.deployments):
+                    raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {d.name: d.stats() for d in self.deployments}
+
+    def _succeeded(self, deployment: Deployment, elapsed: float) -> None:
+        with self._lock:
+            deployment.requests += 1
+            deployment.consecutive_failures = 0
+            if deployment.latency is None:
+                deployment.latency = elapsed
+            else:
+                deployment.latency += self.latency_smoothing * (elapsed - deployment.latency)
+
+    def _failed(self, deployment: Deployment, error: Exception) -> bool:
+        """
+        Records the failure, returns whether another deployment should be tried
+        """
+        status = status_code(error)
+        throttled = status == 429
+        retriable = throttled or (status is not None and status >= 500) or is_connection_error(error)
+
+        with self._lock:
+            deployment.requests += 1
+            if not retriable:
+                return False
+
+            deployment.failures += 1
+            deployment.consecutive_failures += 1
+            if throttled:
+                deployment.throttled += 1
+                eject = retry_after(error) or self.eject_seconds
+            elif deployment.consecutive_failures >= self.max_failures:
+                eject = self.eject_seconds
+            else:
+                eject = 0
+
+            if eject:
+                deployment.ejected_until = monotonic() + eject
+                logger.warning(
+                    f"Deployment '{deployment.name}' is ejected for {eject:.1f}s. Reason: {error}"
+                )
+        return True
+
+
+def model_settings(settings: dict, kwargs: dict, rate_limit: Optional[dict] = None) -> dict:
+    """
+    Turns the settings of one deployment into Azure OpenAI model arguments in place, returns its pooled http clients
+    - `endpoint` and `deployment_name` become `azure_endpoint` and `azure_deployment`
+    - With `rate_limit`, the shared limiter of the deployment is registered
+    """
+    settings["azure_endpoint"] = settings.pop("endpoint")
+    settings["azure_deployment"] = settings.pop("deployment_name")
+    clients = http_clients.for_settings(settings, kwargs)
+    if rate_limit:
+        rate_limiters.register_deployment(settings["azure_endpoint"], settings["azure_deployment"], **rate_limit)
+    return clients
+
+
+def status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # openai.APIConnectionError and APITimeoutError, without depending on openai
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
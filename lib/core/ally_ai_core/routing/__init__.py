@@ -0,0 +1,3 @@
+from .DeploymentRouter import Deployment, DeploymentRouter, model_settings
+
+__all__ = ["Deployment", "DeploymentRouter", "model_settings"]
@@ -0,0 +1,92 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Pattern to match environment variables with double underscores
+pattern = re.compile(r"(?i)^[a-z][a-z0-9_]*(?:__[a-z][a-z0-9_]*)+$")
+
+
+class EnvironmentOverlay:
+    """
+    Index of `SECTION__KEY__SUBKEY=value` environment variables
+    - Built once per set of `SECTION__KEY` variables, rebuilt when one of them changes
+    - A lookup reads the number of environment variables and the values of the indexed ones,
+      the whole environment is scanned again only when the number changed
+    - A variable swapped for another one, leaving the number unchanged, is seen after `refresh()`
+    - Applied only to the requested section
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._variables: Optional[frozenset] = None
+        self._size = -1
+        self._index: Dict[str, List[Tuple[List[str], str]]] = {}
+        self.builds = 0
+
+    def apply(self, section: str, yaml_section: Optional[dict]) -> dict:
+        """
+        Overrides values of `yaml_section` in place with the indexed environment variables
+        - Raises KeyError if the section is neither in yaml nor in the environment
+        """
+        overrides = self.index().get(section, [])
+
+        if yaml_section is None:
+            if not overrides:
+                raise KeyError(section)
+            yaml_section = {}
+
+        for keys, value in overrides:
+            data = yaml_section
+            for key in keys[:-1]:
+                data = data.setdefault(key, {})
+            data[keys[-1]] = value
+
+        return yaml_section
+
+    def index(self) -> Dict[str, List[Tuple[List[str], str]]]:
+        """
+        Returns section -> [(nested keys, value)] for the current environment
+        """
+        with self._lock:
+            if self._unchanged():
+                return self._index
+
+        size = len(os.environ)
+        variables = self._overlay_variables()
+
+        with self._lock:
+            if variables != self._variables:
+                self._index = self._build(variables)
+                self._variables = variables
+                self.builds += 1
+            self._size = size
+            return self._index
+
+    def refresh(self) -> None:
+        """
+        Forces the environment to be scanned and the index rebuilt on next use
+        """
+        with self._lock:
+            self._variables = None
+
+    def _unchanged(self) -> bool:
+        if self._variables is None or len(os.environ) != self._size:
+            return False
+        return all(os.environ.get(key) == value for key, value in self._variables)
+
+    @staticmethod
+    def _overlay_variables() -> frozenset:
+        # scans every variable name, the values of the `SECTION__KEY` ones only
+        return frozenset((key, os.environ.get(key)) for key in list(os.environ) if "__" in key)
+
+    def _build(self, variables: frozenset) -> Dict[str, List[Tuple[List[str], str]]]:
+        index = {}
+        for key, value in sorted(variables):
+            if value and pattern.match(key):
+                section, *keys = key.lower().split("__")
+                index.setdefault(section, []).append((keys, value))
+        return index
+
+
+environment_overlay = EnvironmentOverlay()
@@ -1,17 +1,21 @@
 import yaml
-from typing import List, Literal
+from typing import Callable, Literal
 from ..errors import YamlParseError
+from .SettingsCache import SettingsCache, settings_cache
+from .EnvironmentOverlay import EnvironmentOverlay, environment_overlay
+from .SettingsWatcher import SettingsWatcher, Subscription, settings_watcher
 import logging
 
-import re
-import os
-
 
 class Settings(dict):
     """
     Represents app settings yaml file
     """
 
+    cache: SettingsCache = settings_cache
+    overlay: EnvironmentOverlay = environment_overlay
+    watcher: SettingsWatcher = settings_watcher
+
     def __init__(
         self,
         section: Literal["llm", "embeddings", "vectordb"],
@@ -24,15 +28,16 @@ class Settings(dict):
         """
         self.path = path
         self.section = section
+        self.overrides = kwargs
 
         try:
-            # read yaml file
-            yaml_content = self._read_yaml(path)
+            # read yaml file, parsed once per file change
+            yaml_section = self.cache.get_section(path, section, self._read_yaml)
 
-            self._replace_with_environment_variables(yaml_content)
+            # override with environment variables, indexed once per environment change
+            yaml_section = self.overlay.apply(section, yaml_section)
 
             # add values
-            yaml_section = yaml_content[section]
             for key, value in yaml_section.items():
                 self[key] = value
 
@@ -45,6 +50,18 @@ class Settings(dict):
             )
             raise
 
+    def reload(self) -> "Settings":
+        """
+        Returns a fresh copy of the same section, path and overrides
+        """
+        return type(self)(section=self.section, path=self.path, **self.overrides)
+
+    def subscribe(self, callback: Callable[["Settings"], None]) -> Subscription:
+        """
+        Watches the yaml file and calls `callback(new_settings)` when this section changes
+        """
+        return self.watcher.subscribe(self, callback)
+
     def _read_yaml(self, path):
         try:
             with open(path, "r") as file:
@@ -57,24 +74,6 @@ class Settings(dict):
                 f"File '{self.path}' could not be parsed correcty to yaml! Original: {ex}"
             )
 
-    def _set_nested_value(self, yaml_data: dict, keys: List[str], value):
-        for key in keys[:-1]:
-            yaml_data = yaml_data.setdefault(key, {})
-        if value is not None and value:
-            yaml_data[keys[-1]] = value
-
-    def _replace_with_environment_variables(self, yaml_content):
-        # Pattern to match environment variables with double underscores
-        pattern = re.compile(r"(?i)^[a-z][a-z0-9_]*(?:__[a-z][a-z0-9_]*)+$")
-
-        # Process each environment variable
-        for key, value in os.environ.items():
-            if pattern.match(key):
-                # Split the key into parts
-                keys = key.lower().split("__")
-                # Update the YAML configuration
-                self._set_nested_value(yaml_content, keys, value)
-
     def __repr__(self) -> str:
         return self._hide_keys().__repr__()
 
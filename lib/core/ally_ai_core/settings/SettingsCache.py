@@ -0,0 +1,70 @@
+import copy
+import os
+import threading
+from typing import Callable, Dict, Tuple
+
+
+class SettingsCache:
+    """
+    Process-wide cache of parsed app settings yaml files
+    - One document per absolute path, keyed by (path, mtime, size)
+    - Hands out deep copies of the requested section, the cached document is never exposed
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._documents: Dict[str, Tuple[tuple, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_section(self, path: str, section: str, load: Callable[[str], dict]):
+        """
+        Returns a copy of `section` from the document at `path`, None if it is missing
+        - `load` is called only when the file changed
+        """
+        key = self._key(path)
+
+        with self._lock:
+            entry = self._documents.get(key[0])
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                document = entry[1]
+            else:
+                self.misses += 1
+                document = load(path)
+                self._documents[key[0]] = (key, document)
+
+            if document is None or section not in document:
+                return None
+            return copy.deepcopy(document[section])
+
+    def invalidate(self, path: str = None) -> None:
+        """
+        Drops the cached document of `path`, or every document if no path is given
+        """
+        with self._lock:
+            if path is None:
+                self._documents.clear()
+            else:
+                self._documents.pop(os.path.abspath(path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "documents": len(self._documents),
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _key(self, path: str) -> tuple:
+        absolute_path = os.path.abspath(path)
+        stat = os.stat(absolute_path)
+        return (absolute_path, stat.st_mtime_ns, stat.st_size)
+
+
+settings_cache = SettingsCache()
@@ -0,0 +1,157 @@
+import inspect
+import logging
+import os
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional
+
+from .SettingsCache import settings_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A settings object and the callback to notify with its reloaded copy
+    - Bound methods are held weakly so subscribing does not keep the owner alive
+    """
+
+    def __init__(self, settings, callback: Callable) -> None:
+        self.settings = settings
+        self.last = dict(settings.reload())
+        if inspect.ismethod(callback):
+            self._callback = weakref.WeakMethod(callback)
+        else:
+            self._callback = lambda: callback
+
+    @property
+    def callback(self) -> Optional[Callable]:
+        return self._callback()
+
+
+class SettingsWatcher:
+    """
+    Polls app settings yaml files and notifies subscribers when their section changed
+    - A changed file is parsed once, subscribers of unchanged sections are not notified
+    - Runs on a daemon thread, started by the first subscription
+    """
+
+    def __init__(self, interval: float = 2.0) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, List[Subscription]] = {}
+        self._stamps: Dict[str, tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, settings, callback: Callable, start: bool = True) -> Subscription:
+        """
+        Calls `callback(new_settings)` whenever `settings.section` changes in `settings.path`
+        """
+        path = os.path.abspath(settings.path)
+        subscription = Subscription(settings, callback)
+
+        with self._lock:
+            self._subscriptions.setdefault(path, []).append(subscription)
+            self._stamps.setdefault(path, self._stamp(path))
+
+        if start:
+            self.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for path, subscriptions in list(self._subscriptions.items()):
+                if subscription in subscriptions:
+                    subscriptions.remove(subscription)
+                if not subscriptions:
+                    del self._subscriptions[path]
+                    self._stamps.pop(path, None)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="ally-settings-watcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+
+    def check(self) -> int:
+        """
+        Checks every watched file once, returns the number of notified subscribers
+        """
+        with self._lock:
+            changed = []
+            for path in self._subscriptions:
+                stamp = self._stamp(path)
+                if stamp != self._stamps.get(path):
+                    self._stamps[path] = stamp
+                    changed.append((path, list(self._subscriptions[path])))
+
+        notified = 0
+        for path, subscriptions in changed:
+            logger.info(f"settings file '{path}' changed, reloading.")
+            settings_cache.invalidate(path)
+            for subscription in subscriptions:
+                notified += self._notify(subscription)
+
+        self._drop_dead_subscriptions()
+        return notified
+
+    def _notify(self, subscription: Subscription) -> int:
+        callback = subscription.callback
+        if callback is None:
+            return 0
+
+        try:
+            new_settings = subscription.settings.reload()
+        except Exception as ex:
+            logger.error(
+                f"Keeping previous '{subscription.settings.section}' settings, reload failed. Original: {ex}"
+            )
+            return 0
+
+        if dict(new_settings) == subscription.last:
+            return 0
+        subscription.last = dict(new_settings)
+
+        try:
+            callback(new_settings)
+        except Exception as ex:
+            logger.exception(
+                f"Subscriber of '{subscription.settings.section}' settings failed. Original: {ex}"
+            )
+        return 1
+
+    def _drop_dead_subscriptions(self) -> None:
+        with self._lock:
+            snapshot = [subscription for subscriptions in self._subscriptions.values() for subscription in subscriptions]
+        dead = [subscription for subscription in snapshot if subscription.callback is None]
+        for subscription in dead:
+            self.unsubscribe(subscription)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as ex:
+                logger.exception(f"Settings watcher check failed. Original: {ex}")
+
+    def _stamp(self, path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+
+settings_watcher = SettingsWatcher()
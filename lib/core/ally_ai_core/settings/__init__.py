@@ -1,3 +1,15 @@
 from .Settings import Settings
+from .SettingsCache import SettingsCache, settings_cache
+from .EnvironmentOverlay import EnvironmentOverlay, environment_overlay
+from .SettingsWatcher import SettingsWatcher, Subscription, settings_watcher
 
-__all__ = ["Settings"]
+__all__ = [
+    "Settings",
+    "SettingsCache",
+    "settings_cache",
+    "EnvironmentOverlay",
+    "environment_overlay",
+    "SettingsWatcher",
+    "Subscription",
+    "settings_watcher",
+]
@@ -0,0 +1,367 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from array import array
+from collections import deque
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+route = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/(?P<operation>chat/completions|embeddings)$")
+
+words = (
+    "an ally is a friend who helps when it matters and stays when it is hard "
+    "trust grows with every honest answer shared between people working together"
+).split()
+
+
+class AzureOpenAIServer:
+    """
+    Local stand-in for the Azure OpenAI chat completions and embeddings routes, for offline load tests
+    - Latency is drawn from `latency` (constant, uniform, normal or lognormal), completions
+      are paced at `tokens_per_second`, streamed as server-sent events when asked
+    - Requests over `requests_per_minute`, and `throttle_rate` of the others, get a 429 with Retry-After
+    - Embeddings are deterministic unit vectors derived from a hash of each input,
+      base64 encoded float32 when the request asks for `encoding_format: base64` as openai does
+    - Only the standard library is used, point the `endpoint` of a settings section at `url`
+
+    ```python
+    server = AzureOpenAIServer(latency={"distribution": "lognormal", "mean": 0.3, "stddev": 0.1})
+    url = server.start_in_thread()
+    llm = LLM(settings=Settings(section='llm', endpoint=url, streaming=False))
+    ```
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[dict] = None,
+        tokens_per_second: Optional[float] = None,
+        completion_tokens: int = 16,
+        dimensions: int = 1536,
+        throttle_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        retry_after: float = 1.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency or {"distribution": "constant", "mean": 0.0}
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = int(completion_tokens)
+        self.dimensions = int(dimensions)
+        self.throttle_rate = float(throttle_rate)
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = float(retry_after)
+        self.random = random.Random(seed)
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._window = deque()
+        self._connections = set()
+
+        self.requests = 0
+        self.throttled = 0
+        self.chat_completions = 0
+        self.streams = 0
+        self.embeddings = 0
+        self.errors = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        """
+        Starts listening in the running event loop, returns the endpoint url
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Azure OpenAI stand-in is listening on {self.url}")
+        return self.url
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # keep-alive connections are idle in their handlers until cancelled
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self) -> str:
+        """
+        Runs the server on its own event loop in a daemon thread, returns the endpoint url
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="azure-openai-stand-in", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop_thread(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "chat_completions": self.chat_completions,
+            "streams": self.streams,
+            "embeddings": self.embeddings,
+            "errors": self.errors,
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                await self._respond(writer, method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, method: str, path: str, body: bytes) -> None:
+        self.requests += 1
+        match = route.match(urlsplit(path).path)
+        if method != "POST" or match is None:
+            self.errors += 1
+            await _write_json(writer, 404, {"error": {"code": "404", "message": "Resource not found"}})
+            return
+
+        if self._throttle():
+            self.throttled += 1
+            await _write_json(
+                writer,
+                429,
+                {"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}},
+                {"retry-after": str(math.ceil(self.retry_after)), "retry-after-ms": str(int(self.retry_after * 1000))},
+            )
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            self.errors += 1
+            await _write_json(writer, 400, {"error": {"code": "400", "message": "Invalid json"}})
+            return
+
+        deployment = match.group("deployment")
+        await asyncio.sleep(self._latency())
+        if match.group("operation") == "embeddings":
+            self.embeddings += 1
+            # vectors of large batches are built off the event loop, other requests keep being served
+            body = await asyncio.get_running_loop().run_in_executor(None, self._embeddings, deployment, payload)
+            await _write_json(writer, 200, body)
+        elif payload.get("stream"):
+            self.streams += 1
+            await self._stream(writer, deployment, payload)
+        else:
+            self.chat_completions += 1
+            tokens = self._completion(payload)
+            await asyncio.sleep(self._generation_time(len(tokens)))
+            await _write_json(writer, 200, self._chat_completion(deployment, payload, tokens))
+
+    def _throttle(self) -> bool:
+        if self.requests_per_minute:
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= self.requests_per_minute:
+                return True
+            self._window.append(now)
+        return self.throttle_rate > 0 and self.random.random() < self.throttle_rate
+
+    def _latency(self) -> float:
+        options = self.latency
+        distribution = options.get("distribution", "constant")
+        mean = float(options.get("mean", 0.0))
+        stddev = float(options.get("stddev", 0.0))
+        if distribution == "uniform":
+            value = self.random.uniform(float(options.get("min", 0.0)), float(options.get("max", 2 * mean)))
+        elif distribution == "normal":
+            value = self.random.gauss(mean, stddev)
+        elif distribution == "lognormal" and mean > 0:
+            sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+            value = self.random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+        else:
+            value = mean
+        return max(0.0, value)
+
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _completion(self, payload: dict) -> list:
+        count = min(self.completion_tokens, payload.get("max_tokens") or self.completion_tokens)
+        prompt = json.dumps(payload.get("messages", []), sort_keys=True)
+        offset = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % len(words)
+        return [words[(offset + index) % len(words)] + " " for index in range(count)]
+
+    def _chat_completion(self, deployment: str, payload: dict, tokens: list) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "finish_reason": "stop" if len(tokens) == self.completion_tokens else "length",
+                }
+            ],
+            "usage": _usage(_prompt_tokens(payload), len(tokens)),
+        }
+
+    async def _stream(self, writer: asyncio.StreamWriter, deployment: str, payload: dict) -> None:
+        tokens = self._completion(payload)
+        id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> dict:
+            return {
+                "id": id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+            b"transfer-encoding: chunked\r\nconnection: keep-alive\r\n\r\n"
+        )
+        await _write_event(writer, chunk({"role": "assistant", "content": ""}))
+        pause = self._generation_time(1)
+        for token in tokens:
+            if pause:
+                await asyncio.sleep(pause)
+            await _write_event(writer, chunk({"content": token}))
+        await _write_event(writer, chunk({}, "stop"))
+        await _write_chunk(writer, b"data: [DONE]\n\n")
+        await _write_chunk(writer, b"")
+
+    def _embeddings(self, deployment: str, payload: dict) -> dict:
+        inputs = payload.get("input", [])
+        # a single text, a list of texts, a list of token ids or a list of token id lists
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = payload.get("dimensions") or self.dimensions
+        encode = _base64 if payload.get("encoding_format") == "base64" else list
+        data = [
+            {"object": "embedding", "index": index, "embedding": encode(_unit_vector(json.dumps(item), dimensions))}
+            for index, item in enumerate(inputs)
+        ]
+        tokens = sum(len(item) if isinstance(item, list) else len(item.split()) for item in inputs)
+        return {
+            "object": "list",
+            "model": deployment,
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def fake_embedding(item, dimensions: int) -> list:
+    """
+    Deterministic unit vector of a text or token ids
+    """
+    return list(_unit_vector(json.dumps(item), dimensions))
+
+
+@lru_cache(maxsize=4096)
+def _unit_vector(item: str, dimensions: int) -> array:
+    # float32 components drawn from the hash bytes, the same for every request of an input
+    values = array("i", hashlib.shake_256(item.encode("utf-8")).digest(4 * dimensions))
+    scale = 1.0 / (math.hypot(*values) or 1.0)
+    return array("f", [value * scale for value in values])
+
+
+def _base64(vector: array) -> str:
+    if sys.byteorder == "big":
+        vector = array("f", vector)
+        vector.byteswap()
+    return base64.b64encode(vector.tobytes()).decode("ascii")
+
+
+def _prompt_tokens(payload: dict) -> int:
+    return sum(len(str(message.get("content", "")).split()) + 4 for message in payload.get("messages", []))
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: int, body: dict, headers: Optional[dict] = None) -> None:
+    content = json.dumps(body).encode("utf-8")
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests"}[status]
+    lines = [f"HTTP/1.1 {status} {reason}", "content-type: application/json", f"content-length: {len(content)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + content)
+    await writer.drain()
+
+
+async def _write_event(writer: asyncio.StreamWriter, data: dict) -> None:
+    await _write_chunk(writer, f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+
+async def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+    await writer.drain()
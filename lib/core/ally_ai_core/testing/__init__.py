@@ -0,0 +1,3 @@
+from .AzureOpenAIServer import AzureOpenAIServer, fake_embedding
+
+__all__ = ["AzureOpenAIServer", "fake_embedding"]
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import logging
+
+from .AzureOpenAIServer import AzureOpenAIServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for Azure OpenAI, for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="constant", choices=["constant", "uniform", "normal", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--latency-stddev", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--completion-tokens", type=int, default=16)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    server = AzureOpenAIServer(
+        host=args.host,
+        port=args.port,
+        latency={"distribution": args.latency, "mean": args.latency_mean, "stddev": args.latency_stddev},
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        dimensions=args.dimensions,
+        throttle_rate=args.throttle_rate,
+        requests_per_minute=args.requests_per_minute,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+    async def serve():
+        await server.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
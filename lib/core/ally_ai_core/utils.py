@@ -1,6 +1,12 @@
 import logging
 import os
 import sys
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # windows, file locks then guard nothing across processes
+    fcntl = None
 
 def get_loglevel() -> int:
     """
@@ -34,4 +40,20 @@ def load_test_logger(level = logging.INFO):
   console_handler = logging.StreamHandler(stream=sys.stdout)
   console_handler.formatter = logging.Formatter('::> %(name)s - %(levelname)s - %(message)s')
   test_logger.handlers.clear()
-  test_logger.addHandler(console_handler)
\ No newline at end of file
+  test_logger.addHandler(console_handler)
+
+
+@contextmanager
+def file_lock(file, shared: bool = False):
+    """
+    Holds an advisory lock on an open `file`, exclusive unless `shared`
+    - No-op where fcntl is not available, the lock then only holds within one process
+    """
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,324 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from time import perf_counter, sleep
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional
+
+from langchain_core.load import dumps, loads
+from langchain_core.load.serializable import Serializable
+from langchain_core.runnables import Runnable, RunnableConfig
+from ally_ai_core.checkpoints import MISSING, Checkpoint
+from ally_ai_core.limits import AdaptiveConcurrency
+from ally_ai_core.routing.DeploymentRouter import is_connection_error, retry_after, status_code
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BulkRunner:
+    """
+    Runs a runnable over a stream of inputs with adaptive concurrency
+    - Inputs are read lazily, at most `max_pending` are in flight or waiting to be yielded
+    - Outputs are yielded in input order, `for` runs on threads and `async for` on asyncio
+    - Throttled (429), 5xx and connection errors are retried `retries` times
+    - With `checkpoint`, finished outputs are appended to a file and not run again on resume
+    - `codec` turns outputs into JSON values for the checkpoint and back, with `encode` and `decode`,
+      the default one handles LangChain messages, pydantic models and plain JSON values
+
+    ```python
+    runner = llm.run_bulk(prompts, checkpoint='./nightly.jsonl')
+    for output in runner:
+        ...
+    print(runner.stats())
+    ```
+    """
+
+    def __init__(
+        self,
+        runnable: Runnable,
+        inputs: Iterable,
+        config: Optional[RunnableConfig] = None,
+        checkpoint: Optional[str] = None,
+        codec: Optional[Any] = None,
+        return_exceptions: bool = False,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        max_pending: Optional[int] = None,
+        retries: int = 3,
+        report_interval: float = 30.0,
+    ) -> None:
+        self.runnable = runnable
+        self.inputs = inputs
+        self.config = config
+        self.return_exceptions = return_exceptions
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_pending = max_pending or 4 * self.concurrency.maximum
+        self.retries = int(retries)
+        self.report_interval = report_interval
+        self.checkpoint = _Checkpoint(checkpoint, codec or _JsonCodec()) if checkpoint else None
+
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._reported = 0.0
+        self.latencies = deque(maxlen=10000)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+        self.retried = 0
+        self.resumed = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        self._start()
+        pending: Dict[Any, tuple] = {}
+        results: Dict[int, tuple] = {}
+        inputs = enumerate(self.inputs)
+        next_index = 0
+        exhausted = False
+        pool = ThreadPoolExecutor(max_workers=self.concurrency.maximum, thread_name_prefix="ally-bulk")
+        submit = lambda index, input: pending.update({pool.submit(self._run, input): (index, input)})
+        with self.checkpoint or nullcontext():
+            try:
+                while True:
+                    exhausted = self._fill(inputs, exhausted, pending, results, submit)
+                    while next_index in results:
+                        yield self._output(results.pop(next_index))
+                        next_index += 1
+                    if not pending:
+                        if exhausted:
+                            return
+                        continue
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, input = pending.pop(future)
+                        results[index] = self._finish(index, input, future.result())
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+                self._report(force=True)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        self._start()
+        pending: Dict[Any, tuple] = {}
+        results: Dict[int, tuple] = {}
+        inputs = enumerate(self.inputs)
+        next_index = 0
+        exhausted = False
+        submit = lambda index, input: pending.update({asyncio.ensure_future(self._arun(input)): (index, input)})
+        with self.checkpoint or nullcontext():
+            try:
+                while True:
+                    exhausted = self._fill(inputs, exhausted, pending, results, submit)
+                    while next_index in results:
+                        yield self._output(results.pop(next_index))
+                        next_index += 1
+                    if not pending:
+                        if exhausted:
+                            return
+                        continue
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index, input = pending.pop(task)
+                        results[index] = self._finish(index, input, task.result())
+            finally:
+                for task in pending:
+                    task.cancel()
+                self._report(force=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = perf_counter() - self._started if self._started else 0.0
+            latencies = sorted(self.latencies)
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "throttled": self.throttled,
+                "retried": self.retried,
+                "resumed": self.resumed,
+                "elapsed": elapsed,
+                "throughput": self.completed / elapsed if elapsed else 0.0,
+                "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+                "latency_p90": latencies[int(len(latencies) * 0.9)] if latencies else None,
+                "concurrency": self.concurrency.stats(),
+            }
+
+    def _fill(self, inputs, exhausted, pending, results, submit) -> bool:
+        """
+        Submits inputs up to the concurrency limit, returns whether the inputs are exhausted
+        """
+        while not exhausted and len(pending) < self.concurrency.limit:
+            if len(pending) + len(results) >= self.max_pending:
+                break
+            try:
+                index, input = next(inputs)
+            except StopIteration:
+                return True
+
+            restored = self.checkpoint.get(index, input) if self.checkpoint else MISSING
+            if restored is not MISSING:
+                with self._lock:
+                    self.resumed += 1
+                results[index] = (True, restored)
+                continue
+
+            with self._lock:
+                self.submitted += 1
+            submit(index, input)
+        return exhausted
+
+    def _run(self, input) -> tuple:
+        for attempt in range(self.retries + 1):
+            start = perf_counter()
+            try:
+                output = self.runnable.invoke(input, self.config)
+            except Exception as ex:
+                delay = self._failed(ex, attempt)
+                if delay is None:
+                    return False, ex
+                sleep(delay)
+                continue
+            self._succeeded(perf_counter() - start)
+            return True, output
+
+    async def _arun(self, input) -> tuple:
+        for attempt in range(self.retries + 1):
+            start = perf_counter()
+            try:
+                output = await self.runnable.ainvoke(input, self.config)
+            except Exception as ex:
+                delay = self._failed(ex, attempt)
+                if delay is None:
+                    return False, ex
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded(perf_counter() - start)
+            return True, output
+
+    def _succeeded(self, latency: float) -> None:
+        self.concurrency.succeeded(latency)
+        with self._lock:
+            self.latencies.append(latency)
+
+    def _failed(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Records the failure, returns seconds to wait before retrying or None to give up
+        """
+        status = status_code(error)
+        if status == 429:
+            self.concurrency.throttled()
+            with self._lock:
+                self.throttled += 1
+
+        retriable = status == 429 or (status is not None and status >= 500) or is_connection_error(error)
+        if not retriable or attempt >= self.retries:
+            return None
+
+        with self._lock:
+            self.retried += 1
+        return retry_after(error) or min(2.0 ** attempt, 60.0)
+
+    def _finish(self, index: int, input, result: tuple) -> tuple:
+        """
+        Counts and checkpoints a result, `result` is (succeeded, output or error)
+        """
+        succeeded, value = result
+        with self._lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if succeeded and self.checkpoint:
+            self.checkpoint.add(index, input, value)
+        self._report()
+        return result
+
+    def _output(self, result: tuple) -> Any:
+        succeeded, value = result
+        if succeeded or self.return_exceptions:
+            return value
+        raise value
+
+    def _start(self) -> None:
+        self._started = perf_counter()
+        self._reported = self._started
+
+    def _report(self, force: bool = False) -> None:
+        now = perf_counter()
+        if not force and now - self._reported < self.report_interval:
+            return
+        self._reported = now
+        stats = self.stats()
+        logger.info(
+            f"Bulk run: {stats['completed']} completed, {stats['failed']} failed, "
+            f"{stats['resumed']} resumed, {stats['throughput']:.2f}/s, "
+            f"concurrency {stats['concurrency']['limit']}"
+        )
+
+
+
+class _JsonCodec:
+    """
+    Turns bulk outputs into JSON values for the checkpoint file and back
+    - LangChain objects such as messages go through `langchain_core.load`
+    - pydantic models, e.g. structured outputs, are stored with their class and validated again on resume
+    - Anything else must be a JSON value already
+    """
+
+    def encode(self, output: Any) -> Any:
+        if isinstance(output, Serializable) and output.is_lc_serializable():
+            return {"langchain": dumps(output)}
+        if hasattr(output, "model_dump"):
+            return {"pydantic": _class_path(output), "value": output.model_dump(mode="json")}
+        if hasattr(output, "json") and hasattr(type(output), "parse_obj"):
+            return {"pydantic": _class_path(output), "value": json.loads(output.json())}
+        return {"json": output}
+
+    def decode(self, value: Any) -> Any:
+        if "langchain" in value:
+            return loads(value["langchain"])
+        if "pydantic" in value:
+            module, name = value["pydantic"].split(":")
+            cls = importlib.import_module(module)
+            for part in name.split("."):
+                cls = getattr(cls, part)
+            return cls.model_validate(value["value"]) if hasattr(cls, "model_validate") else cls.parse_obj(value["value"])
+        return value["json"]
+
+
+class _Checkpoint(Checkpoint):
+    """
+    Finished outputs, keyed by input position and a hash of the input
+    """
+
+    def __init__(self, path: str, codec: Any) -> None:
+        super().__init__(path, key="index", name="bulk run")
+        self.codec = codec
+
+    def get(self, index: int, input) -> Any:
+        entry = self.entry(index)
+        if entry is None or entry["input"] != _fingerprint(input):
+            return MISSING
+        try:
+            return self.codec.decode(entry["output"])
+        except Exception as ex:
+            # e.g. the class of a stored model is gone, the input is run again
+            logger.warning(f"Bulk output {index} of '{self.path}' cannot be restored, running it again. Reason: {ex}")
+            return MISSING
+
+    def add(self, index: int, input, output) -> None:
+        try:
+            self.append({"index": index, "input": _fingerprint(input), "output": self.codec.encode(output)})
+        except (TypeError, ValueError) as ex:
+            logger.warning(f"Bulk output {index} is not checkpointed. Reason: {ex}")
+
+
+def _class_path(output: Any) -> str:
+    return f"{type(output).__module__}:{type(output).__qualname__}"
+
+
+def _fingerprint(input) -> str:
+    return hashlib.sha256(dumps(input).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from ally_ai_core.utils import file_lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+# sha256 of the key, offset and length of the vector in float32 items
+_record = struct.Struct("<32sQI")
+
+
+class EmbeddingCache:
+    """
+    Persistent cache for embeddings, shared by the processes using the same `path`
+    - Keyed by a hash of the text, model, deployment and dimensions
+    - Vectors are appended as float32 to `vectors.f32` and read through a memory map,
+      `index.bin` holds a fixed size record per key
+    - Appends and compactions take a file lock, readers pick up the records of other processes on a miss
+    - Above `max_size` keys the least recently used ones are evicted by rewriting both files
+
+    Settings in the `embeddings` section:
+    ```yaml
+    embeddings:
+      cache:
+        path: './.cache/embeddings'
+        max_size: 100000
+    ```
+    """
+
+    def __init__(self, path: str = "./.cache/embeddings", max_size: int = 100_000) -> None:
+        self.path = path
+        self.max_size = int(max_size)
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._index_path = os.path.join(path, "index.bin")
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(path, "lock"), "a+b")
+
+        self._entries: "OrderedDict[bytes, Tuple[int, int]]" = OrderedDict()
+        self._index = None
+        self._vectors = None
+        self._map: Optional[mmap.mmap] = None
+        self._position = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._shared():
+            self._open()
+        logger.info(f"Embedding cache is stored in '{path}', keys: {len(self._entries)}")
+
+    @staticmethod
+    def key(text: str, model: Optional[str], deployment: Optional[str], dimensions: Optional[int]) -> bytes:
+        return hashlib.sha256(json.dumps([model, deployment, dimensions, text]).encode("utf-8")).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Cached vectors of `keys`, None for the missing ones
+        """
+        with self._lock:
+            vectors = [self._read(key) for key in keys]
+            if any(vector is None for vector in vectors):
+                # other processes may have added them since the last look
+                with self._shared():
+                    self._refresh()
+                vectors = [self._read(key) if vector is None else vector for key, vector in zip(keys, vectors)]
+
+            found = sum(vector is not None for vector in vectors)
+            self.hits += found
+            self.misses += len(vectors) - found
+            return vectors
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]) -> None:
+        with self._lock, self._exclusive():
+            self._refresh()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._entries:
+                    new[key] = np.asarray(vector, dtype=np.float32)
+            if not new:
+                return
+
+            self._vectors.seek(0, os.SEEK_END)
+            offset = self._vectors.tell() // 4
+            records = []
+            for key, vector in new.items():
+                self._vectors.write(vector.tobytes())
+                records.append((key, offset, len(vector)))
+                offset += len(vector)
+            # vectors land before the records pointing at them, readers never see a dangling record
+            self._vectors.flush()
+
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(b"".join(_record.pack(*record) for record in records))
+            self._index.flush()
+            self._position = self._index.tell()
+            for key, offset, length in records:
+                self._entries[key] = (offset, length)
+
+            if len(self._entries) > self.max_size:
+                # evicting a tenth at once keeps compactions rare
+                self._compact(keep=int(self.max_size * 0.9))
+
+    def clear(self) -> None:
+        with self._lock, self._exclusive():
+            self._compact(keep=0)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "size": len(self._entries),
+                "bytes": os.fstat(self._vectors.fileno()).st_size,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+            self._lock_file.close()
+
+    def _read(self, key: bytes) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        offset, length = entry
+        end = (offset + length) * 4
+        if self._map is None or len(self._map) < end:
+            self._remap()
+        # a copy, the map is replaced when the file grows
+        return np.frombuffer(self._map, dtype=np.float32, count=length, offset=offset * 4).copy()
+
+    def _open(self) -> None:
+        self._index = open(self._index_path, "a+b")
+        self._vectors = open(self._vectors_path, "a+b")
+        self._map = None
+        self._position = 0
+        self._entries.clear()
+        self._refresh()
+
+    def _close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._index.close()
+        self._vectors.close()
+
+    def _refresh(self) -> None:
+        """
+        Loads the records appended since the last look, or everything again after another process compacted
+        """
+        if _replaced(self._index_path, self._index) or _replaced(self._vectors_path, self._vectors):
+            self._close()
+            self._open()
+            return
+
+        self._index.seek(self._position)
+        data = self._index.read()
+        # a record being written by another process is picked up next time
+        complete = len(data) - len(data) % _record.size
+        for key, offset, length in _record.iter_unpack(data[:complete]):
+            self._entries[key] = (offset, length)
+        self._position += complete
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        # mapping the open file keeps reads on the same file as the loaded records
+        self._map = mmap.mmap(self._vectors.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _compact(self, keep: int) -> None:
+        """
+        Rewrites both files with the `keep` most recently used keys
+        """
+        kept: Dict[bytes, np.ndarray] = {}
+        for key in list(self._entries)[len(self._entries) - keep :] if keep else []:
+            kept[key] = self._read(key)
+
+        vectors_path, index_path = self._vectors_path + ".tmp", self._index_path + ".tmp"
+        with open(vectors_path, "wb") as vectors, open(index_path, "wb") as index:
+            offset = 0
+            for key, vector in kept.items():
+                vectors.write(vector.tobytes())
+                index.write(_record.pack(key, offset, len(vector)))
+                offset += len(vector)
+
+        self.evictions += len(self._entries) - len(kept)
+        self._close()
+        os.replace(vectors_path, self._vectors_path)
+        os.replace(index_path, self._index_path)
+        self._open()
+        logger.info(f"Embedding cache is compacted, keys: {len(self._entries)}")
+
+    @contextmanager
+    def _shared(self):
+        with file_lock(self._lock_file, shared=True):
+            yield
+
+    @contextmanager
+    def _exclusive(self):
+        with file_lock(self._lock_file):
+            yield
+
+    def __repr__(self) -> str:
+        return f"EmbeddingCache(path={self.path!r}, max_size={self.max_size})"
+
+
+def _replaced(path: str, file) -> bool:
+    try:
+        return os.stat(path).st_ino != os.fstat(file.fileno()).st_ino
+    except FileNotFoundError:
+        return True
@@ -1,6 +1,18 @@
-from typing import Optional
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+from typing import Any, ClassVar, Dict, List, Optional
 from langchain_openai import AzureOpenAIEmbeddings
+from langchain_core.pydantic_v1 import Field
 from ally_ai_core import Settings
+from ally_ai_core.settings import Subscription
+from ally_ai_core.routing import DeploymentRouter
+from ally_ai_core.limits import Deduplicator, MicroBatcher, SingleFlight, estimate_tokens, rate_limiters
+from ally_ai_langchain.EmbeddingCache import EmbeddingCache
+from ally_ai_langchain.TokenPacker import TokenPacker
 import logging
 
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
@@ -9,15 +21,254 @@ logger = logging.getLogger(__name__)
 class EmbeddingModel(AzureOpenAIEmbeddings):
 
     ally_settings: Settings = None
+    ally_kwargs: Optional[dict] = Field(default=None, exclude=True)
+    ally_router: Optional[Any] = Field(default=None, exclude=True)
+    # pooled clients are shared, they are not part of the model's identity
+    http_client: Optional[Any] = Field(default=None, exclude=True)
+    http_async_client: Optional[Any] = Field(default=None, exclude=True)
+    ally_single_flight: bool = Field(default=False, exclude=True)
+    ally_cache: Optional[Any] = Field(default=None, exclude=True)
+    ally_batcher: Optional[Any] = Field(default=None, exclude=True)
+    ally_packer: Optional[Any] = Field(default=None, exclude=True)
+    ally_dedup: Optional[Any] = Field(default=None, exclude=True)
+
+    # identical requests in flight across every EmbeddingModel, followers get a copy of the vectors
+    flights: ClassVar[SingleFlight] = SingleFlight(copy=lambda vectors: [list(vector) for vector in vectors])
 
     def __init__(self, settings: Optional[Settings] = None, **kwargs) -> None:
         if settings is None:
             settings = Settings(section='embeddings')
 
-        settings['azure_endpoint'] = settings.pop('endpoint')
-        settings['azure_deployment'] = settings.pop('deployment_name')
+        single_flight = settings.pop('single_flight', False)
+        micro_batch = settings.pop('micro_batch', None)
+        packing = settings.pop('packing', None)
+        dedup = settings.pop('dedup', False)
+        # popped either way, a cache left in settings would end up in every request body
+        configured_cache = settings.pop('cache', None)
+        cache = kwargs.get('cache') or _create_cache(configured_cache)
+        options = {key: value for key, value in kwargs.items() if key != 'cache'}
+        router, clients = DeploymentRouter.for_model(settings, options, lambda options: AzureOpenAIEmbeddings(**options))
 
-        super().__init__(**settings, **kwargs)
+        super().__init__(**settings, **options, **clients)
 
         self.ally_settings = settings
+        self.ally_kwargs = kwargs
+        self.ally_router = router
+        self.ally_single_flight = bool(single_flight)
+        self.ally_cache = cache
+        if dedup:
+            self.ally_dedup = Deduplicator(copy=list)
+        if packing:
+            self.ally_packer = TokenPacker(**(packing if isinstance(packing, dict) else {}))
+        if micro_batch:
+            batching = micro_batch if isinstance(micro_batch, dict) else {}
+            self.ally_batcher = MicroBatcher(func=self.embed_documents, afunc=self.aembed_documents, **batching)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds `text` together with the queries of other callers arriving meanwhile when `micro_batch` is on
+        """
+        if self.ally_batcher is None:
+            return super().embed_query(text)
+        return self.ally_batcher.submit(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.ally_batcher is None:
+            return await super().aembed_query(text)
+        return await self.ally_batcher.asubmit(text)
+
+    def embed_documents(self, texts: List[str], chunk_size: Optional[int] = 0) -> List[List[float]]:
+        if self.ally_dedup is None:
+            return self._cached(texts, chunk_size)
+        unique, inverse = self.ally_dedup.unique(texts)
+        return self.ally_dedup.scatter(self._cached(unique, chunk_size), inverse)
+
+    async def aembed_documents(self, texts: List[str], chunk_size: Optional[int] = 0) -> List[List[float]]:
+        if self.ally_dedup is None:
+            return await self._acached(texts, chunk_size)
+        unique, inverse = self.ally_dedup.unique(texts)
+        return self.ally_dedup.scatter(await self._acached(unique, chunk_size), inverse)
+
+    def _cached(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_cache is None:
+            return self._coalesce(texts, chunk_size)
+
+        keys = self._cache_keys(texts)
+        vectors = self.ally_cache.get_many(keys)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self._coalesce([texts[index] for index in missing], chunk_size)
+            self.ally_cache.put_many([keys[index] for index in missing], embedded)
+            for index, vector in zip(missing, embedded):
+                vectors[index] = vector
+        return [vector if isinstance(vector, list) else vector.tolist() for vector in vectors]
+
+    async def _acached(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_cache is None:
+            return await self._acoalesce(texts, chunk_size)
+
+        keys = self._cache_keys(texts)
+        vectors = self.ally_cache.get_many(keys)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = await self._acoalesce([texts[index] for index in missing], chunk_size)
+            # appending waits for the file lock, off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.ally_cache.put_many, [keys[index] for index in missing], embedded
+            )
+            for index, vector in zip(missing, embedded):
+                vectors[index] = vector
+        return [vector if isinstance(vector, list) else vector.tolist() for vector in vectors]
+
+    def _cache_keys(self, texts: List[str]) -> List[bytes]:
+        return [EmbeddingCache.key(text, self.model, self.deployment, self.dimensions) for text in texts]
+
+    def _coalesce(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if not self.ally_single_flight:
+            return self._send(texts, chunk_size)
+        return self.flights.do(self._flight_key(texts), lambda: self._send(texts, chunk_size))
+
+    async def _acoalesce(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if not self.ally_single_flight:
+            return await self._asend(texts, chunk_size)
+        return await self.flights.ado(self._flight_key(texts), lambda: self._asend(texts, chunk_size))
+
+    def _send(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_packer is not None:
+            return self.ally_packer.run(texts, self._send_packed, self._tokenizer_model(), chunk_size)
+        return self._send_unpacked(texts, chunk_size)
+
+    def _send_unpacked(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_router is None:
+            _acquire(self, *_usage(self, texts, chunk_size))
+            return super().embed_documents(texts, chunk_size)
+
+        def call(model):
+            _acquire(model, *_usage(model, texts, chunk_size))
+            return model.embed_documents(texts, chunk_size)
+
+        return self.ally_router.call(call)
+
+    async def _asend(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_packer is not None:
+            return await self.ally_packer.arun(texts, self._asend_packed, self._tokenizer_model(), chunk_size)
+        return await self._asend_unpacked(texts, chunk_size)
+
+    async def _asend_unpacked(self, texts: List[str], chunk_size: Optional[int]) -> List[List[float]]:
+        if self.ally_router is None:
+            await _aacquire(self, *_usage(self, texts, chunk_size))
+            return await super().aembed_documents(texts, chunk_size)
+
+        async def call(model):
+            await _aacquire(model, *_usage(model, texts, chunk_size))
+            return await model.aembed_documents(texts, chunk_size)
+
+        return await self.ally_router.acall(call)
+
+    def _send_packed(self, texts: List[str], tokens: int) -> List[List[float]]:
+        """
+        Sends one packed request as is, a text over the input limit is split and averaged by langchain
+        """
+        if len(texts) == 1 and tokens > self.ally_packer.max_input_tokens:
+            return self._send_unpacked(texts, None)
+        if self.ally_router is None:
+            _acquire(self, tokens)
+            return _create(self, texts)
+
+        def call(model):
+            _acquire(model, tokens)
+            return _create(model, texts)
+
+        return self.ally_router.call(call)
+
+    async def _asend_packed(self, texts: List[str], tokens: int) -> List[List[float]]:
+        if len(texts) == 1 and tokens > self.ally_packer.max_input_tokens:
+            return await self._asend_unpacked(texts, None)
+        if self.ally_router is None:
+            await _aacquire(self, tokens)
+            return await _acreate(self, texts)
+
+        async def call(model):
+            await _aacquire(model, tokens)
+            return await _acreate(model, texts)
+
+        return await self.ally_router.acall(call)
+
+    def _tokenizer_model(self) -> Optional[str]:
+        return self.tiktoken_model_name or self.model
+
+    def _flight_key(self, texts: List[str]) -> str:
+        request = json.dumps([self.azure_endpoint, self.deployment, self.model, self.dimensions, texts])
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def reload(self, settings: Settings) -> None:
+        """
+        Swaps clients and parameters with the ones built from new settings
+        - In-flight requests finish on the clients they started with
+        """
+        fresh = type(self)(settings=settings, **self.ally_kwargs)
+        self.__dict__.update(fresh.__dict__)
+        logger.info(f"EmbeddingModel is reloaded. Deployment: '{self.deployment}'")
+
+    def watch(self) -> Subscription:
+        """
+        Reloads the model whenever its section changes in the settings file
+        """
+        return self.ally_settings.subscribe(self.reload)
+
+
+# one cache per path in the process, models built from the same section share it
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _create_cache(cache) -> Optional[EmbeddingCache]:
+    """
+    Builds the embedding cache from the `cache` key of the embeddings section
+    """
+    if not cache:
+        return None
+    options = cache if isinstance(cache, dict) else {}
+    path = os.path.abspath(options.get('path', './.cache/embeddings'))
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(**{**options, 'path': path})
+        return _caches[path]
+
+
+def _usage(model: AzureOpenAIEmbeddings, texts: List[str], chunk_size: Optional[int]) -> tuple:
+    """
+    Estimated tokens and number of requests `embed_documents` sends for `texts`
+    """
+    tokens = sum(estimate_tokens(text) for text in texts)
+    requests = max(1, math.ceil(len(texts) / (chunk_size or model.chunk_size)))
+    return tokens, requests
+
+
+def _acquire(model: AzureOpenAIEmbeddings, tokens: int, requests: int = 1) -> None:
+    limiter = rate_limiters.for_deployment(model.azure_endpoint, model.deployment)
+    if limiter is not None:
+        limiter.acquire(tokens, requests)
+
+
+async def _aacquire(model: AzureOpenAIEmbeddings, tokens: int, requests: int = 1) -> None:
+    limiter = rate_limiters.for_deployment(model.azure_endpoint, model.deployment)
+    if limiter is not None:
+        await limiter.aacquire(tokens, requests)
+
+
+def _create(model: AzureOpenAIEmbeddings, texts: List[str]) -> List[List[float]]:
+    """
+    One embeddings request with the texts as inputs
+    """
+    return _vectors(model.client.create(input=texts, **model._invocation_params))
+
+
+async def _acreate(model: AzureOpenAIEmbeddings, texts: List[str]) -> List[List[float]]:
+    return _vectors(await model.async_client.create(input=texts, **model._invocation_params))
+
 
+def _vectors(response) -> List[List[float]]:
+    if not isinstance(response, dict):
+        response = response.model_dump()
+    return [item['embedding'] for item in sorted(response['data'], key=lambda item: item['index'])]
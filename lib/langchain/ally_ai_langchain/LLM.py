@@ -1,37 +1,321 @@
+import copy
+import hashlib
+import json
 import os
+import threading
+from collections import OrderedDict
 from langchain_openai import AzureChatOpenAI
-from typing import Literal, Optional, Union
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps
+from langchain_core.messages import BaseMessageChunk
+from langchain_core.pydantic_v1 import Field
+from typing import Any, AsyncIterator, ClassVar, Dict, Iterable, Iterator, List, Literal, Optional, Union
 from pydantic import BaseModel
 from ally_ai_core import Settings
+from ally_ai_core.settings import Subscription
+from ally_ai_core.routing import DeploymentRouter
+from ally_ai_core.limits import RateLimiter, SingleFlight, estimate_tokens, rate_limiters
+from .ResponseCache import ResponseCache
+from .SemanticCache import SemanticCache
+from .EmbeddingModel import EmbeddingModel
+from .BulkRunner import BulkRunner
 import logging
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# guards the structured output runnables of every LLM, lookups are short
+_structured_lock = threading.Lock()
+
 class LLM(AzureChatOpenAI):
     """
     Interited from AzureChatOpenAI Model
     """
     ally_settings: Settings = None
+    ally_kwargs: Optional[dict] = Field(default=None, exclude=True)
+    ally_router: Optional[Any] = Field(default=None, exclude=True)
+    # pooled clients are shared, they are not part of the model's identity
+    http_client: Optional[Any] = Field(default=None, exclude=True)
+    http_async_client: Optional[Any] = Field(default=None, exclude=True)
+    ally_structured: Optional[Any] = Field(default=None, exclude=True)
+    ally_structured_size: int = Field(default=128, exclude=True)
+    ally_single_flight: bool = Field(default=False, exclude=True)
+
+    # identical requests in flight across every LLM, followers get a copy of the result
+    flights: ClassVar[SingleFlight] = SingleFlight(copy=copy.deepcopy)
 
     def __init__(self, settings: Optional[Settings] = None, **kwargs) -> None:
 
         if settings is None:
             settings = Settings(section='llm')
 
-        settings['azure_endpoint'] = settings.pop('endpoint')
-        settings['azure_deployment'] = settings.pop('deployment_name')
+        cache = _create_cache(settings.pop('cache', None), settings.pop('semantic_cache', None), settings.path)
 
-        super().__init__(**settings, **kwargs)
+        single_flight = settings.pop('single_flight', False)
+        # routed deployments get no response cache, the LLM in front of them has it
+        options = {key: value for key, value in kwargs.items() if key != 'cache'}
+        router, clients = DeploymentRouter.for_model(settings, options, lambda options: AzureChatOpenAI(**options))
+
+        # the built cache stays out of ally_kwargs, a reload builds it from the new settings
+        model_kwargs = {'cache': cache, **kwargs} if cache is not None else kwargs
+        super().__init__(**settings, **model_kwargs, **clients)
 
         self.ally_settings = settings
+        self.ally_kwargs = kwargs
+        self.ally_router = router
+        self.ally_structured = OrderedDict()
+        self.ally_single_flight = bool(single_flight)
+
+    def reload(self, settings: Settings) -> None:
+        """
+        Swaps clients and parameters with the ones built from new settings
+        - In-flight requests finish on the clients they started with
+        """
+        fresh = type(self)(settings=settings, **self.ally_kwargs)
+        self.__dict__.update(fresh.__dict__)
+        logger.info(f"LLM is reloaded. Deployment: '{self.deployment_name}'")
+
+    def watch(self) -> Subscription:
+        """
+        Reloads the model whenever its section changes in the settings file
+        """
+        return self.ally_settings.subscribe(self.reload)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if not self.ally_single_flight:
+            return self._send(messages, stop, run_manager, kwargs)
+        return self.flights.do(
+            self._flight_key(messages, stop, kwargs), lambda: self._send(messages, stop, run_manager, kwargs)
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if not self.ally_single_flight:
+            return await self._asend(messages, stop, run_manager, kwargs)
+        return await self.flights.ado(
+            self._flight_key(messages, stop, kwargs), lambda: self._asend(messages, stop, run_manager, kwargs)
+        )
+
+    def _send(self, messages, stop, run_manager, kwargs):
+        if self.ally_router is None:
+            if self.streaming:
+                # streams through self._stream, which is rate limited already
+                return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return _limited_generate(self, super()._generate, messages, stop, run_manager, kwargs)
+        return self.ally_router.call(
+            lambda model: _limited_generate(model, model._generate, messages, stop, run_manager, kwargs)
+        )
 
+    async def _asend(self, messages, stop, run_manager, kwargs):
+        if self.ally_router is None:
+            if self.streaming:
+                return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return await _alimited_generate(self, super()._agenerate, messages, stop, run_manager, kwargs)
+        return await self.ally_router.acall(
+            lambda model: _alimited_generate(model, model._agenerate, messages, stop, run_manager, kwargs)
+        )
+
+    def _flight_key(self, messages, stop, kwargs) -> str:
+        request = f"{self._get_llm_string(stop=stop, **kwargs)}\x00{dumps(messages)}"
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.ally_router is None:
+            yield from _limited_stream(self, super()._stream, messages, stop, run_manager, kwargs)
+            return
+        yield from self.ally_router.stream(
+            lambda model: _limited_stream(model, model._stream, messages, stop, run_manager, kwargs)
+        )
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.ally_router is None:
+            stream = _alimited_stream(self, super()._astream, messages, stop, run_manager, kwargs)
+        else:
+            stream = self.ally_router.astream(
+                lambda model: _alimited_stream(model, model._astream, messages, stop, run_manager, kwargs)
+            )
+        async for chunk in stream:
+            yield chunk
+
+    def stream(self, input, config=None, *, stop: Optional[List[str]] = None, **kwargs: Any) -> Iterator[BaseMessageChunk]:
+        """
+        Streams from the response cache when enabled, replaying the cached chunks on a hit
+        """
+        if not isinstance(self.cache, BaseCache):
+            yield from super().stream(input, config, stop=stop, **kwargs)
+            return
+
+        prompt = dumps(self._convert_input(input).to_messages())
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        cached = self.cache.lookup(prompt, llm_string)
+        if cached:
+            yield from ResponseCache.to_chunks(cached)
+            return
+
+        chunks = []
+        for chunk in super().stream(input, config, stop=stop, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.cache.update(prompt, llm_string, ResponseCache.from_chunks(chunks))
+
+    async def astream(self, input, config=None, *, stop: Optional[List[str]] = None, **kwargs: Any) -> AsyncIterator[BaseMessageChunk]:
+        """
+        Async version of `stream`
+        """
+        if not isinstance(self.cache, BaseCache):
+            async for chunk in super().astream(input, config, stop=stop, **kwargs):
+                yield chunk
+            return
+
+        prompt = dumps(self._convert_input(input).to_messages())
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        cached = await self.cache.alookup(prompt, llm_string)
+        if cached:
+            for chunk in ResponseCache.to_chunks(cached):
+                yield chunk
+            return
+
+        chunks = []
+        async for chunk in super().astream(input, config, stop=stop, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            await self.cache.aupdate(prompt, llm_string, ResponseCache.from_chunks(chunks))
+
+    def run_bulk(self, inputs: Iterable, config=None, checkpoint: Optional[str] = None, **options: Any) -> BulkRunner:
+        """
+        Invokes the model for every input with adaptive concurrency, outputs come in input order
+        - Iterate with `for` or `async for`, `stats()` reports throughput
+        - options: codec, return_exceptions, concurrency, max_pending, retries, report_interval
+        """
+        return BulkRunner(self, inputs, config=config, checkpoint=checkpoint, **options)
 
     def __call__(self, schema: Union[dict, BaseModel, None] = None) -> AzureChatOpenAI:
         """ 
         Returns llm model
+        - Structured output runnables are built once per schema and reused,
+          keyed by the pydantic class or a hash of the dict schema
         """
-        if schema:
-            return self.with_structured_output(schema=schema)
+        if not schema:
+            return self
+
+        key = _schema_key(schema)
+        with _structured_lock:
+            runnable = self.ally_structured.get(key)
+            if runnable is not None:
+                self.ally_structured.move_to_end(key)
+                return runnable
+
+        runnable = self.with_structured_output(schema=schema)
+        with _structured_lock:
+            self.ally_structured[key] = runnable
+            while len(self.ally_structured) > self.ally_structured_size:
+                self.ally_structured.popitem(last=False)
+        return runnable
+
 
-        return self
+# one response cache per configuration in the process, models built from the same settings share it
+_caches: Dict[str, BaseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _create_cache(cache, semantic_cache, path: str) -> Optional[BaseCache]:
+    """
+    Builds the response cache from the `cache` and `semantic_cache` keys of the llm section
+    - The semantic cache embeds with the `embeddings` section of the same settings file
+    - Models of the same configuration get the same cache object
+    """
+    exact = None
+    if cache:
+        options = dict(cache) if isinstance(cache, dict) else {}
+        if options.get('path'):
+            options['path'] = os.path.abspath(options['path'])
+        exact = _shared(('exact', options), lambda: ResponseCache(**options))
+
+    if semantic_cache:
+        options = semantic_cache if isinstance(semantic_cache, dict) else {}
+        settings = Settings(section='embeddings', path=path)
+        return _shared(
+            ('semantic', options, dict(settings), id(exact)),
+            lambda: SemanticCache(embeddings=EmbeddingModel(settings=settings), exact=exact, **options),
+        )
+
+    return exact
+
+
+def _shared(config: tuple, create) -> BaseCache:
+    key = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = create()
+        return _caches[key]
+
+
+def _rate_limiter(model: AzureChatOpenAI) -> Optional[RateLimiter]:
+    return rate_limiters.for_deployment(model.azure_endpoint, model.deployment_name)
+
+
+def _estimate_tokens(model: AzureChatOpenAI, messages: list, kwargs: dict) -> int:
+    """
+    Prompt tokens plus the completion budget, the way Azure OpenAI counts a request against the quota
+    """
+    prompt = sum(estimate_tokens(str(message.content)) + 4 for message in messages) + 3
+    return prompt + (kwargs.get('max_tokens') or model.max_tokens or 0)
+
+
+def _used_tokens(result) -> Optional[int]:
+    usage = (result.llm_output or {}).get('token_usage') or {}
+    return usage.get('total_tokens')
+
+
+def _limited_generate(model, generate, messages, stop, run_manager, kwargs):
+    limiter = _rate_limiter(model)
+    if limiter is None:
+        return generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    tokens = _estimate_tokens(model, messages, kwargs)
+    limiter.acquire(tokens)
+    result = generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+    used = _used_tokens(result)
+    if used is not None:
+        limiter.adjust(tokens=used - tokens)
+    return result
+
+
+async def _alimited_generate(model, agenerate, messages, stop, run_manager, kwargs):
+    limiter = _rate_limiter(model)
+    if limiter is None:
+        return await agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    tokens = _estimate_tokens(model, messages, kwargs)
+    await limiter.aacquire(tokens)
+    result = await agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+    used = _used_tokens(result)
+    if used is not None:
+        limiter.adjust(tokens=used - tokens)
+    return result
+
+
+def _limited_stream(model, stream, messages, stop, run_manager, kwargs):
+    limiter = _rate_limiter(model)
+    if limiter is not None:
+        limiter.acquire(_estimate_tokens(model, messages, kwargs))
+    yield from stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+async def _alimited_stream(model, astream, messages, stop, run_manager, kwargs):
+    limiter = _rate_limiter(model)
+    if limiter is not None:
+        await limiter.aacquire(_estimate_tokens(model, messages, kwargs))
+    async for chunk in astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+        yield chunk
+
+
+def _schema_key(schema) -> Any:
+    """
+    Pydantic classes by identity, dict schemas by a hash of their canonical json
+    """
+    if isinstance(schema, dict):
+        canonical = json.dumps(schema, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return schema
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from time import time
+from functools import reduce
+from operator import add
+from typing import Any, Iterator, List, Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(BaseCache):
+    """
+    Exact-match cache for LLM responses
+    - In-memory LRU with size and ttl eviction
+    - Optional SQLite file behind it, shared across processes and restarts,
+      each write deletes its expired rows and keeps the newest `max_size`
+    - Keyed by a hash of the prompt messages and the llm string
+      (model, deployment, temperature, bound tools and response format)
+
+    Settings in the `llm` section:
+    ```yaml
+    llm:
+      cache:
+        max_size: 1024
+        ttl: 3600
+        path: './.cache/llm-responses.sqlite'
+    ```
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_size = int(max_size)
+        self.ttl = float(ttl) if ttl else None
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._connection = self._connect(path) if path else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self.key(prompt, llm_string)
+        now = time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT created, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    generations = loads(row[1])
+                    self._remember(key, row[0], generations)
+                    self.disk_hits += 1
+                    return generations
+
+            self.misses += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.key(prompt, llm_string)
+        created = time()
+
+        with self._lock:
+            self._remember(key, created, return_val)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)",
+                    (key, created, dumps(list(return_val))),
+                )
+                self._evict(created)
+                self._connection.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM responses")
+                self._connection.commit()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "size": len(self._memory),
+            }
+
+    @staticmethod
+    def from_chunks(chunks: List[AIMessageChunk]) -> List[ChatGeneration]:
+        """
+        Aggregates streamed chunks into a cache entry that remembers the chunk boundaries
+        """
+        message = message_chunk_to_message(reduce(add, chunks))
+        contents = [chunk.content for chunk in chunks]
+        generation_info = (
+            {"chunks": contents} if all(isinstance(c, str) for c in contents) else None
+        )
+        return [ChatGeneration(message=message, generation_info=generation_info)]
+
+    @staticmethod
+    def to_chunks(generations: RETURN_VAL_TYPE) -> Iterator[AIMessageChunk]:
+        """
+        Replays a cache entry as message chunks, chunk by chunk if it was streamed
+        """
+        generation = generations[0]
+        message: AIMessage = generation.message
+        contents = (generation.generation_info or {}).get("chunks")
+
+        if contents and not message.tool_calls:
+            for index, content in enumerate(contents):
+                last = index == len(contents) - 1
+                yield AIMessageChunk(
+                    content=content,
+                    id=message.id,
+                    response_metadata=message.response_metadata if last else {},
+                )
+            return
+
+        yield AIMessageChunk(
+            content=message.content,
+            id=message.id,
+            additional_kwargs=message.additional_kwargs,
+            response_metadata=message.response_metadata,
+            tool_call_chunks=[
+                {
+                    "name": tool_call["name"],
+                    "args": json.dumps(tool_call["args"]),
+                    "id": tool_call["id"],
+                    "index": index,
+                }
+                for index, tool_call in enumerate(message.tool_calls)
+            ],
+        )
+
+    def _remember(self, key: str, created: float, generations: Sequence) -> None:
+        self._memory[key] = (created, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            self._connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._connection.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, value TEXT)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        connection.commit()
+        logger.info(f"LLM response cache is stored in '{path}'")
+        return connection
+
+    def __repr__(self) -> str:
+        return f"ResponseCache(max_size={self.max_size}, ttl={self.ttl}, path={self.path!r})"
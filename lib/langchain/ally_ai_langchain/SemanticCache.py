@@ -0,0 +1,232 @@
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict, deque
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache(BaseCache):
+    """
+    Similarity cache for LLM responses
+    - Embeds the prompt and returns the answer of the nearest prior prompt
+      when cosine similarity is at least `threshold`
+    - Only prompts with the same llm string (model, deployment, temperature, schema) are compared
+    - Vectors live in an in-process index, or in a Chroma vector store when `vectorstore` is given
+    - `exact` cache, if given, is checked first and updated alongside
+
+    Settings in the `llm` section:
+    ```yaml
+    llm:
+      semantic_cache:
+        threshold: 0.95
+        max_size: 10000
+    ```
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        max_size: int = 10000,
+        vectorstore: Optional[Any] = None,
+        exact: Optional[BaseCache] = None,
+        samples: int = 10000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.threshold = float(threshold)
+        self.max_size = int(max_size)
+        self.vectorstore = vectorstore
+        self.exact = exact
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, "_LocalIndex"] = {}
+        # embedding of the last looked up prompts, reused by update after a miss
+        self._pending: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.exact_hits = 0
+        self.latencies = deque(maxlen=samples)
+        self.distances = deque(maxlen=samples)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.exact is not None:
+            cached = self.exact.lookup(prompt, llm_string)
+            if cached:
+                with self._lock:
+                    self.exact_hits += 1
+                return cached
+
+        start = perf_counter()
+        vector = self._embed(prompt)
+        distance, generations = self._nearest(self._partition(llm_string), vector)
+        elapsed = perf_counter() - start
+
+        with self._lock:
+            self.latencies.append(elapsed)
+            if distance is not None:
+                self.distances.append(distance)
+            if generations is not None and 1 - distance >= self.threshold:
+                self.hits += 1
+                return generations
+            self.misses += 1
+            self._pending[prompt] = vector
+            while len(self._pending) > 128:
+                self._pending.popitem(last=False)
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.exact is not None:
+            self.exact.update(prompt, llm_string, return_val)
+
+        with self._lock:
+            vector = self._pending.pop(prompt, None)
+        if vector is None:
+            vector = self._embed(prompt)
+
+        partition = self._partition(llm_string)
+        if self.vectorstore is not None:
+            self.vectorstore._collection.upsert(
+                ids=[str(uuid.uuid4())],
+                embeddings=[vector.tolist()],
+                documents=[self._text(prompt)],
+                metadatas=[{"llm": partition, "generations": dumps(list(return_val))}],
+            )
+            return
+
+        with self._lock:
+            index = self._indexes.setdefault(partition, _LocalIndex(self.max_size))
+            index.add(vector, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._pending.clear()
+        if self.exact is not None:
+            self.exact.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.exact_hits + self.misses
+        return (self.hits + self.exact_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        """
+        Hit rate, lookup latency (seconds) and nearest-distance percentiles to tune `threshold`
+        """
+        with self._lock:
+            latencies = np.array(self.latencies)
+            distances = np.array(self.distances)
+            return {
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "threshold": self.threshold,
+                "lookup_latency": _percentiles(latencies),
+                "distance": _percentiles(distances),
+                "distance_histogram": (
+                    np.histogram(distances, bins=10, range=(0.0, 1.0))[0].tolist()
+                    if len(distances)
+                    else []
+                ),
+            }
+
+    def __repr__(self) -> str:
+        return f"SemanticCache(threshold={self.threshold}, max_size={self.max_size}, exact={self.exact!r})"
+
+    def _nearest(self, partition: str, vector: np.ndarray):
+        if self.vectorstore is not None:
+            return self._nearest_in_vectorstore(partition, vector)
+
+        with self._lock:
+            index = self._indexes.get(partition)
+            return index.nearest(vector) if index is not None else (None, None)
+
+    def _nearest_in_vectorstore(self, partition: str, vector: np.ndarray):
+        collection = self.vectorstore._collection
+        results = collection.query(
+            query_embeddings=[vector.tolist()],
+            n_results=1,
+            where={"llm": partition},
+            include=["metadatas", "distances"],
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return None, None
+
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        distance = results["distances"][0][0]
+        # chroma returns squared l2, which is 2 * cosine distance for unit vectors
+        distance = distance / 2 if space == "l2" else distance
+        return distance, loads(results["metadatas"][0][0]["generations"])
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(self._text(prompt)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _text(self, prompt: str) -> str:
+        # prompt is the serialized message list, only the contents are embedded
+        try:
+            messages = loads(prompt)
+            return "\n".join(f"{m.type}: {m.content}" for m in messages)
+        except Exception:
+            return prompt
+
+    def _partition(self, llm_string: str) -> str:
+        return hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+
+
+class _LocalIndex:
+    """
+    Ring buffer of unit vectors and their responses for one llm string, oldest overwritten first
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.vectors: Optional[np.ndarray] = None
+        self.values: List[RETURN_VAL_TYPE] = []
+        self._next = 0
+
+    def add(self, vector: np.ndarray, value: RETURN_VAL_TYPE) -> None:
+        if self.vectors is None:
+            self.vectors = np.empty((min(64, self.max_size), len(vector)), dtype=np.float32)
+        elif self._next == len(self.vectors) < self.max_size:
+            # grow by doubling until max_size, then overwrite the oldest
+            grown = np.empty((min(2 * len(self.vectors), self.max_size), len(vector)), dtype=np.float32)
+            grown[: len(self.vectors)] = self.vectors
+            self.vectors = grown
+
+        self.vectors[self._next] = vector
+        if len(self.values) < self.max_size:
+            self.values.append(value)
+        else:
+            self.values[self._next] = value
+        self._next = (self._next + 1) % self.max_size if len(self.values) == self.max_size else len(self.values)
+
+    def nearest(self, vector: np.ndarray):
+        if not self.values:
+            return None, None
+        similarities = self.vectors[: len(self.values)] @ vector
+        best = int(np.argmax(similarities))
+        return float(1 - similarities[best]), self.values[best]
+
+
+def _percentiles(values: np.ndarray) -> dict:
+    if not len(values):
+        return {}
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+    }
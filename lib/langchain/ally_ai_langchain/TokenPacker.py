@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from ally_ai_core.limits import estimate_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[List[str], int], List[List[float]]]
+ASend = Callable[[List[str], int], Awaitable[List[List[float]]]]
+
+
+class TokenPacker:
+    """
+    Groups texts into embedding requests by their token counts instead of a fixed number of texts
+    - Requests are filled in input order until the next text would exceed `max_tokens` or `max_inputs`
+    - A text over `max_input_tokens` goes in a request of its own, to be split by the sender
+    - Packed requests are sent `concurrency` at a time, vectors come back in input order
+    - Tokens are counted with the tiktoken encoding of the model, estimated when it is not available
+
+    Settings in the `embeddings` section:
+    ```yaml
+    embeddings:
+      packing:
+        max_tokens: 300000  # summed over the inputs of one request
+        max_inputs: 2048
+        concurrency: 4
+    ```
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 300_000,
+        max_inputs: int = 2048,
+        max_input_tokens: int = 8191,
+        concurrency: int = 4,
+    ) -> None:
+        self.max_tokens = int(max_tokens)
+        self.max_inputs = int(max_inputs)
+        self.max_input_tokens = int(max_input_tokens)
+        self.concurrency = max(1, int(concurrency))
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.tokens = 0
+
+    def count(self, texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+        encoding = _encoding(model)
+        if encoding is None:
+            return [estimate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+    def pack(self, counts: Sequence[int], max_inputs: Optional[int] = None) -> List[List[int]]:
+        """
+        Indexes of the texts of each request
+        """
+        max_inputs = min(max_inputs or self.max_inputs, self.max_inputs)
+        requests, current, tokens = [], [], 0
+        for index, count in enumerate(counts):
+            if count > self.max_input_tokens:
+                requests.append([index])
+                continue
+            if current and (len(current) >= max_inputs or tokens + count > self.max_tokens):
+                requests.append(current)
+                current, tokens = [], 0
+            current.append(index)
+            tokens += count
+        if current:
+            requests.append(current)
+        return requests
+
+    def run(
+        self, texts: Sequence[str], send: Send, model: Optional[str] = None, max_inputs: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Embeds `texts` with `send(texts, tokens)` per packed request
+        """
+        requests = self._requests(texts, model, max_inputs)
+        if not requests:
+            return []
+        if len(requests) == 1:
+            return send(*requests[0][1:])
+        with ThreadPoolExecutor(min(self.concurrency, len(requests))) as pool:
+            results = list(pool.map(lambda request: send(*request[1:]), requests))
+        return _reassemble(len(texts), requests, results)
+
+    async def arun(
+        self, texts: Sequence[str], send: ASend, model: Optional[str] = None, max_inputs: Optional[int] = None
+    ) -> List[List[float]]:
+        requests = self._requests(texts, model, max_inputs)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(request):
+            async with semaphore:
+                return await send(*request[1:])
+
+        results = await asyncio.gather(*[limited(request) for request in requests])
+        return _reassemble(len(texts), requests, results)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "texts_per_request": self.texts / self.requests if self.requests else 0.0,
+                "tokens_per_request": self.tokens / self.requests if self.requests else 0.0,
+            }
+
+    def _requests(
+        self, texts: Sequence[str], model: Optional[str], max_inputs: Optional[int]
+    ) -> List[Tuple[List[int], List[str], int]]:
+        counts = self.count(texts, model)
+        requests = [
+            (indexes, [texts[index] for index in indexes], sum(counts[index] for index in indexes))
+            for indexes in self.pack(counts, max_inputs)
+        ]
+        with self._lock:
+            self.requests += len(requests)
+            self.texts += len(texts)
+            self.tokens += sum(counts)
+        return requests
+
+    def __repr__(self) -> str:
+        return (
+            f"TokenPacker(max_tokens={self.max_tokens}, max_inputs={self.max_inputs}, "
+            f"max_input_tokens={self.max_input_tokens}, concurrency={self.concurrency})"
+        )
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: Optional[str]):
+    """
+    The tiktoken encoding of `model`, loaded once per process
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        if model:
+            return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as ex:
+        logger.warning(f"tiktoken encoding of '{model}' is not available, tokens are estimated. {ex}")
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as ex:
+        logger.warning(f"tiktoken encoding 'cl100k_base' is not available, tokens are estimated. {ex}")
+        return None
+
+
+def _reassemble(size: int, requests: list, results: list) -> List[List[float]]:
+    vectors: List[Optional[List[float]]] = [None] * size
+    for (indexes, _, _), result in zip(requests, results):
+        for index, vector in zip(indexes, result):
+            vectors[index] = vector
+    return vectors
@@ -1,9 +1,19 @@
 from ally_ai_langchain.LLM import LLM
 from ally_ai_langchain.EmbeddingModel import EmbeddingModel
+from ally_ai_langchain.EmbeddingCache import EmbeddingCache
+from ally_ai_langchain.TokenPacker import TokenPacker
+from ally_ai_langchain.ResponseCache import ResponseCache
+from ally_ai_langchain.SemanticCache import SemanticCache
+from ally_ai_langchain.BulkRunner import BulkRunner
 from ally_ai_core import Settings
 
 __all__ = [
     'LLM',
     'EmbeddingModel',
+    'EmbeddingCache',
+    'TokenPacker',
+    'ResponseCache',
+    'SemanticCache',
+    'BulkRunner',
     'Settings'
 ]
@@ -2,6 +2,7 @@ from typing import Optional
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from llama_index.core import Settings as LlamaSettings
 from ally_ai.core import Settings
+from ally_ai_core.connections import http_clients
 import logging
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -16,8 +17,9 @@ class EmbeddingModel(AzureOpenAIEmbedding):
 
         settings['azure_endpoint'] = settings.pop('endpoint')
         settings['azure_deployment'] = settings.pop('deployment_name')
+        clients = http_clients.for_settings(settings, kwargs, async_name='async_http_client')
 
-        super().__init__(**settings, **kwargs)
+        super().__init__(**settings, **kwargs, **clients)
 
         self.ally_settings = settings
 
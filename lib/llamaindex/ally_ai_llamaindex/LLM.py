@@ -3,6 +3,7 @@ from llama_index.core.base.llms.types import ChatResponse, ChatMessage
 from llama_index.core import Settings as LlamaSettings
 from typing import Optional, Sequence, Any
 from ally_ai_core import Settings
+from ally_ai_core.connections import http_clients
 import logging
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -20,8 +21,9 @@ class LLM(AzureOpenAI):
 
         settings['azure_endpoint'] = settings.pop('endpoint')
         settings['azure_deployment'] = settings.pop('deployment_name')
+        clients = http_clients.for_settings(settings, kwargs, async_name='async_http_client')
 
-        super().__init__(**settings, **kwargs)
+        super().__init__(**settings, **kwargs, **clients)
 
         self.settings = settings
 
@@ -29,4 +31,4 @@ class LLM(AzureOpenAI):
 
 
     def invoke(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
-        return self.chat(messages=messages, **kwargs)
\ No newline at end of file
+        return self.chat(messages=messages, **kwargs)
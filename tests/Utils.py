@@ -1,5 +1,8 @@
 from contextlib import contextmanager
+import asyncio
 import os
+import re
+import time
 
 @contextmanager
 def env_var_on_off(key, value):
@@ -13,4 +16,97 @@ def env_var_on_off(key, value):
         del os.environ[key]
     else:
         os.environ[key] = backup
-    
\ No newline at end of file
+    
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeCompletions:
+    """
+    Stands in for `openai` chat completions, answers every prompt with `answer`
+    """
+
+    def __init__(self, answer="an ally is a friend", error=None):
+        self.answer = answer
+        self.error = error
+        self.calls = []
+
+    def create(self, **payload):
+        self.calls.append(payload)
+        if self.error is not None:
+            raise self.error
+        if payload.get("stream"):
+            return FakeStream(
+                [
+                    {"choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]}
+                    for word in re.findall(r"\S+\s*", self.answer)
+                ]
+                + [{"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+            )
+        return {
+            "id": "fake",
+            "model": payload.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.answer},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **payload):
+        return FakeCompletions.create(self, **payload)
+
+
+class FakeEmbeddings:
+    """
+    Stands in for `openai` embeddings, the vector of a text is [length, words]
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def create(self, input, **payload):
+        self.calls.append(input)
+        time.sleep(self.delay)
+        input = [input] if isinstance(input, str) else input
+        return {
+            "data": [
+                {"index": index, "embedding": [float(len(text)), float(len(text.split()))]}
+                for index, text in enumerate(input)
+            ],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }
+
+
+class FakeAsyncEmbeddings(FakeEmbeddings):
+    async def create(self, input, **payload):
+        self.calls.append(input)
+        await asyncio.sleep(self.delay)
+        return FakeEmbeddings(0).create(input)
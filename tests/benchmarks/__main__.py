@@ -0,0 +1,39 @@
+"""
+Runs the benchmark suite and compares it with the stored baseline
+
+    python -m tests.benchmarks --vectors 10000,100000 --threshold 0.25
+    python -m tests.benchmarks --update-baseline
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ally benchmark suite")
+    parser.add_argument("--results", default="./.benchmarks/results.json", help="json file to write the results to")
+    parser.add_argument("--baseline", default="./.benchmarks/baseline.json", help="local baseline, not committed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--vectors", default="10000", help="collection sizes for Chroma.query, e.g. 10000,1000000")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("-k", default=None, help="only run benchmarks matching the expression")
+    args = parser.parse_args()
+
+    os.environ["ALLY_BENCHMARK_RESULTS"] = args.results
+    os.environ["ALLY_BENCHMARK_BASELINE"] = args.baseline
+    os.environ["ALLY_BENCHMARK_THRESHOLD"] = str(args.threshold)
+    os.environ["ALLY_BENCHMARK_UPDATE_BASELINE"] = "1" if args.update_baseline else "0"
+    os.environ["ALLY_BENCHMARK_VECTORS"] = args.vectors
+    os.environ["ALLY_BENCHMARK_DIMENSIONS"] = str(args.dimensions)
+
+    options = ["-m", "benchmark", os.path.dirname(__file__)]
+    if args.k:
+        options += ["-k", args.k]
+    return pytest.main(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import platform
+from statistics import median
+from time import perf_counter
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+# set by `python -m tests.benchmarks`, or directly in the environment
+RESULTS = os.environ.get("ALLY_BENCHMARK_RESULTS", "./.benchmarks/results.json")
+BASELINE = os.environ.get("ALLY_BENCHMARK_BASELINE", "./.benchmarks/baseline.json")
+THRESHOLD = float(os.environ.get("ALLY_BENCHMARK_THRESHOLD", "0.25"))
+UPDATE_BASELINE = os.environ.get("ALLY_BENCHMARK_UPDATE_BASELINE") == "1"
+VECTORS = [int(count) for count in os.environ.get("ALLY_BENCHMARK_VECTORS", "10000").split(",")]
+DIMENSIONS = int(os.environ.get("ALLY_BENCHMARK_DIMENSIONS", "1536"))
+
+results = {}
+
+
+class Recorder:
+    """
+    Collects the measurements of a benchmark run, written as json at the end of the session
+    """
+
+    def measure(self, name, func, repeat=100, warmup=1):
+        """
+        Records the median seconds per call of `func`
+        """
+        for _ in range(warmup):
+            func()
+        samples = []
+        for _ in range(repeat):
+            start = perf_counter()
+            func()
+            samples.append(perf_counter() - start)
+        self.record(name, median(samples), unit="s")
+        return samples
+
+    def record(self, name, value, unit="s", higher_is_better=False):
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        logger.info(f"{name}: {value:.6g} {unit}")
+
+
+@pytest.fixture(scope="session")
+def recorder():
+    return Recorder()
+
+
+def compare(current, baseline, threshold):
+    """
+    Returns the measurements that are worse than the baseline by more than `threshold`
+    """
+    regressions = {}
+    for name, result in current.items():
+        reference = baseline.get(name)
+        if not reference or not reference["value"]:
+            continue
+        change = (result["value"] - reference["value"]) / reference["value"]
+        if result["higher_is_better"]:
+            change = -change
+        if change > threshold:
+            regressions[name] = {"baseline": reference["value"], "current": result["value"], "change": change}
+    return regressions
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not results:
+        return
+
+    report = {"machine": platform.platform(), "python": platform.python_version(), "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(RESULTS)), exist_ok=True)
+    with open(RESULTS, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    logger.info(f"benchmark results are written to '{RESULTS}'")
+
+    if UPDATE_BASELINE:
+        os.makedirs(os.path.dirname(os.path.abspath(BASELINE)), exist_ok=True)
+        with open(BASELINE, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        logger.info(f"benchmark baseline is updated: '{BASELINE}'")
+        return
+
+    if not os.path.exists(BASELINE):
+        logger.warning(f"no benchmark baseline in '{BASELINE}', store one with `--update-baseline`")
+        return
+    with open(BASELINE, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    # timings of another machine say nothing about this one
+    if baseline.get("machine") != report["machine"]:
+        logger.warning(
+            f"benchmark baseline was recorded on '{baseline.get('machine')}', not compared on '{report['machine']}'"
+        )
+        return
+
+    regressions = compare(results, baseline["results"], THRESHOLD)
+    for name, regression in regressions.items():
+        logger.error(
+            f"regression in {name}: {regression['baseline']:.6g} -> {regression['current']:.6g} "
+            f"({regression['change']:+.0%}, threshold {THRESHOLD:.0%})"
+        )
+    if regressions and session.exitstatus == 0:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
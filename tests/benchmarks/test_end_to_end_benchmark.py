@@ -0,0 +1,189 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+from ally_ai_core import Settings
+from ally_ai_core.testing import AzureOpenAIServer
+from ally_ai_langchain import LLM, EmbeddingModel
+
+from .conftest import DIMENSIONS, VECTORS
+
+STORE = "./.benchmarks/chroma"
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = AzureOpenAIServer(dimensions=DIMENSIONS)
+    server.start_in_thread()
+    yield server
+    server.stop_thread()
+
+
+def llm_settings(server):
+    return Settings(section="llm", endpoint=server.url, api_version="2024-02-01", streaming=False)
+
+
+def embedding_settings(server, **settings):
+    return Settings(
+        section="embeddings",
+        endpoint=server.url,
+        api_version="2024-02-01",
+        check_embedding_ctx_length=False,
+        single_flight=False,
+        **settings,
+    )
+
+
+def collection_path(count):
+    """
+    Builds a persisted collection of `count` random unit vectors once, later runs reuse it
+    """
+    import chromadb
+
+    path = os.path.join(STORE, f"{count}x{DIMENSIONS}")
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection("benchmark")
+    if collection.count() == count:
+        return path
+
+    shutil.rmtree(path, ignore_errors=True)
+    client.clear_system_cache()
+    client = chromadb.PersistentClient(path=path)
+    collection = client.get_or_create_collection("benchmark")
+    generator = np.random.default_rng(0)
+    batch = client.get_max_batch_size()
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        vectors = generator.standard_normal((size, DIMENSIONS), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        collection.add(
+            ids=[str(start + index) for index in range(size)],
+            embeddings=vectors.tolist(),
+            documents=[f"document {start + index}" for index in range(size)],
+        )
+    return path
+
+
+@pytest.mark.benchmark
+def test_construction(recorder, server):
+    recorder.measure("construct.settings", lambda: Settings(section="llm"), repeat=200)
+    recorder.measure("construct.llm", lambda: LLM(settings=llm_settings(server)), repeat=50)
+    recorder.measure("construct.embedding_model", lambda: EmbeddingModel(settings=embedding_settings(server)), repeat=50)
+
+
+@pytest.mark.benchmark
+def test_chroma_construction(recorder, server):
+    from ally_ai_chroma import Chroma
+
+    path = collection_path(1000)
+    embeddings = EmbeddingModel(settings=embedding_settings(server))
+
+    recorder.measure(
+        "construct.chroma",
+        lambda: Chroma(
+            settings=Settings(section="chromadb", persist_directory=path),
+            embeddingModel=embeddings,
+            collection_name="benchmark",
+        ),
+        repeat=20,
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("batch", [1, 16])
+def test_embedding_throughput(recorder, server, batch):
+    embeddings = EmbeddingModel(settings=embedding_settings(server))
+    texts = [f"what is an ally number {index}?" for index in range(256)]
+
+    samples = recorder.measure(
+        f"embeddings.embed_documents.batch_{batch}",
+        lambda: [embeddings.embed_documents(texts[i : i + batch]) for i in range(0, len(texts), batch)],
+        repeat=3,
+    )
+    recorder.record(
+        f"embeddings.throughput.batch_{batch}", len(texts) / min(samples), unit="texts/s", higher_is_better=True
+    )
+
+
+@pytest.mark.benchmark
+def test_packed_embedding_throughput(recorder):
+    server = AzureOpenAIServer(dimensions=DIMENSIONS, latency={"mean": 0.02})
+    server.start_in_thread()
+    try:
+        embeddings = EmbeddingModel(settings=embedding_settings(server, packing={"concurrency": 4}))
+        texts = [f"chunk {index} of a long document about allies " * (index % 20 + 1) for index in range(200)]
+
+        samples = recorder.measure(
+            "embeddings.packed.embed_documents", lambda: embeddings.embed_documents(texts), repeat=3
+        )
+        recorder.record(
+            "embeddings.packed.throughput", len(texts) / min(samples), unit="texts/s", higher_is_better=True
+        )
+        recorder.record(
+            "embeddings.packed.texts_per_request",
+            embeddings.ally_packer.stats()["texts_per_request"],
+            unit="texts",
+            higher_is_better=True,
+        )
+    finally:
+        server.stop_thread()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", VECTORS)
+def test_chroma_query_latency(recorder, server, count):
+    from ally_ai_chroma import Chroma
+
+    path = collection_path(count)
+    chroma = Chroma(
+        settings=Settings(section="chromadb", persist_directory=path),
+        embeddingModel=EmbeddingModel(settings=embedding_settings(server)),
+        collection_name="benchmark",
+    )
+
+    samples = recorder.measure(
+        f"chroma.query.{count}", lambda: chroma.query(query_texts=["what is an ally?"], n_results=10), repeat=50
+    )
+    recorder.record(f"chroma.query.{count}.p95", float(np.percentile(samples, 95)))
+
+
+@pytest.mark.benchmark
+def test_visualiser_projection(recorder):
+    pytest.importorskip("umap")
+    from time import perf_counter
+    from ally_ai_chroma_visualise import EmbeddingsVisualisor
+
+    generator = np.random.default_rng(0)
+    embeddings = generator.standard_normal((2000, DIMENSIONS), dtype=np.float32).tolist()
+
+    start = perf_counter()
+    visualisor = EmbeddingsVisualisor(embeddings)
+    recorder.record("visualiser.fit.2000", perf_counter() - start)
+
+    recorder.measure("visualiser.project.10", lambda: visualisor.convert_embeddings_to_2D(embeddings[:10]), repeat=5)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("fetch_k", [20, 200, 2000])
+def test_mmr_rerank(recorder, fetch_k):
+    from langchain_chroma.vectorstores import maximal_marginal_relevance
+    from ally_ai_chroma import MMRReranker
+
+    generator = np.random.default_rng(0)
+    queries = generator.standard_normal((16, DIMENSIONS), dtype=np.float32)
+    candidates = generator.standard_normal((16, fetch_k, DIMENSIONS), dtype=np.float32)
+    # chroma returns the embeddings of a query as lists, which is what LangChain's MMR gets
+    embedding_list = candidates[0].tolist()
+    reranker = MMRReranker(lambda_mult=0.5)
+    repeat = 3 if fetch_k >= 2000 else 10
+
+    recorder.measure(
+        f"mmr.langchain.{fetch_k}",
+        lambda: maximal_marginal_relevance(queries[0], embedding_list, k=10),
+        repeat=repeat,
+    )
+    recorder.measure(f"mmr.numpy.{fetch_k}", lambda: reranker.select(queries[0], candidates[0], k=10), repeat=repeat)
+    recorder.measure(
+        f"mmr.numpy.batch_16.{fetch_k}", lambda: reranker.select_batch(queries, candidates, k=10), repeat=repeat
+    )
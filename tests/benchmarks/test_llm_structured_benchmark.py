@@ -0,0 +1,37 @@
+import logging
+from time import perf_counter
+import pytest
+from pydantic import BaseModel
+from ally_ai_langchain import LLM, Settings
+
+logger = logging.getLogger(__name__)
+
+
+class Answer(BaseModel):
+    text: str
+    confidence: float
+    sources: list[str]
+
+
+def measure(func, repeat=200):
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("schema", [Answer, {**Answer.model_json_schema(), "description": "An answer"}], ids=["pydantic", "dict"])
+def test_structured_output_construction(recorder, schema):
+    llm = LLM(settings=Settings(section="llm"))
+
+    uncached = measure(lambda: llm.with_structured_output(schema=schema))
+    cached = measure(lambda: llm(schema))
+
+    name = "pydantic" if isinstance(schema, type) else "dict"
+    recorder.record(f"llm.structured_output.{name}", cached)
+    logger.info(
+        f"with_structured_output: {uncached * 1e6:.1f}us, memoized llm(schema): {cached * 1e6:.1f}us, "
+        f"speedup: {uncached / cached:.0f}x"
+    )
+    assert cached < uncached
@@ -0,0 +1,45 @@
+import logging
+import os
+import re
+from time import perf_counter
+import pytest
+from ally_ai_core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def full_scan_overlay(yaml_content):
+    """the overlay before indexing: scans every environment variable on every call"""
+    pattern = re.compile(r"(?i)^[a-z][a-z0-9_]*(?:__[a-z][a-z0-9_]*)+$")
+    for key, value in os.environ.items():
+        if pattern.match(key):
+            keys = key.lower().split("__")
+            data = yaml_content
+            for k in keys[:-1]:
+                data = data.setdefault(k, {})
+            if value:
+                data[keys[-1]] = value
+
+
+def measure(func, repeat=200):
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", [10, 100, 1000])
+def test_environment_overlay(monkeypatch, recorder, count):
+    for i in range(count):
+        monkeypatch.setenv(f"BENCH_{i}__KEY_{i}", str(i))
+
+    Settings(section="llm")
+    indexed = measure(lambda: Settings(section="llm"))
+    full_scan = measure(lambda: full_scan_overlay({"llm": {"api_key": "key"}}))
+
+    recorder.record(f"settings.overlay.env_{count}", indexed)
+    logger.info(
+        f"env vars: {count}, indexed settings: {indexed * 1e6:.1f}us, full scan overlay only: {full_scan * 1e6:.1f}us"
+    )
+    assert Settings.overlay.index().get(f"bench_{count - 1}")
@@ -0,0 +1,31 @@
+import chromadb
+import pytest
+from ally_ai_chroma import Chroma
+from ally_ai_core import Settings
+from ally_ai_langchain import EmbeddingModel
+from ..Utils import FakeEmbeddings, FakeAsyncEmbeddings
+
+
+@pytest.fixture
+def create_chroma(tmp_path):
+    """
+    Builds a Chroma on the `langchain` collection in `tmp_path / 'db'` with fake embedding clients
+    - `embeddings` are settings of the embeddings section, `settings` of the chromadb section
+    """
+    path = str(tmp_path / "db")
+    chromadb.PersistentClient(path=path).get_or_create_collection("langchain")
+
+    def create(embeddings=None, **settings):
+        model = EmbeddingModel(
+            settings=Settings(section="embeddings", check_embedding_ctx_length=False, **(embeddings or {}))
+        )
+        model.client = FakeEmbeddings()
+        model.async_client = FakeAsyncEmbeddings()
+        return Chroma(settings=Settings(section="chromadb", persist_directory=path, **settings), embeddingModel=model)
+
+    return create
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    return create_chroma()
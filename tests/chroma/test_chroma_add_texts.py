@@ -0,0 +1,29 @@
+def test_duplicate_texts_are_embedded_once(chroma):
+    texts = ["disclaimer", "an ally", "disclaimer", "a friend", "disclaimer"]
+
+    ids = chroma.add_texts(texts)
+
+    assert sorted(chroma._embedding_function.client.calls) == ["a friend", "an ally", "disclaimer"]
+    stored = chroma._collection.get(ids=ids, include=["documents", "embeddings"])
+    vectors = {id: list(vector) for id, vector in zip(stored["ids"], stored["embeddings"])}
+    assert vectors[ids[0]] == vectors[ids[2]] == vectors[ids[4]] == [10.0, 1.0]
+    assert chroma.ally_dedup.stats()["duplicates"] == 2
+
+
+def test_texts_with_and_without_metadata_are_added(chroma):
+    ids = chroma.add_texts(["a", "b", "a"], metadatas=[{"source": "x"}], ids=["1", "2", "3"])
+
+    stored = chroma._collection.get(ids=ids, include=["documents", "metadatas"])
+    metadatas = dict(zip(stored["ids"], stored["metadatas"]))
+    assert ids == ["1", "2", "3"]
+    assert metadatas["1"] == {"source": "x"}
+    assert not metadatas["2"]
+    assert chroma._collection.count() == 3
+
+
+def test_large_batches_are_split(chroma, monkeypatch):
+    monkeypatch.setattr(chroma._client, "get_max_batch_size", lambda: 2)
+
+    chroma.add_texts([f"text {index}" for index in range(5)])
+
+    assert chroma._collection.count() == 5
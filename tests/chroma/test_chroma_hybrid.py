@@ -0,0 +1,143 @@
+import pytest
+from ally_ai_chroma import BM25Index
+from ally_ai_core import Settings
+
+texts = [
+    "Replacement filter for the AB-1234 pump",
+    "How to clean a pump filter",
+    "Warranty terms for pumps and valves",
+    "Valve XY-9 fits every pump of the AB series",
+    "Shipping and returns",
+]
+
+
+def test_codes_are_single_tokens():
+    assert BM25Index.tokenize("Order AB-1234, v2.1 or x/y!") == ["order", "ab-1234", "v2.1", "or", "x/y"]
+
+
+def test_search_ranks_by_bm25():
+    index = BM25Index()
+    index.add([str(number) for number in range(len(texts))], texts)
+
+    results = index.search("ab-1234 filter", k=3)
+
+    assert [id for id, _ in results] == ["0", "1"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_add_replaces_and_delete_removes():
+    index = BM25Index()
+    index.add(["a", "b"], ["red pump", "blue valve"])
+    index.add(["a"], ["green pump"])
+    index.delete(["b"])
+
+    assert index.search("red") == []
+    assert [id for id, _ in index.search("green pump")] == ["a"]
+    assert index.stats() == {"documents": 1, "terms": 2, "average_length": 2.0}
+
+
+def test_index_is_kept_on_disk(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    BM25Index(path=path).add(["a", "b"], ["red pump", "blue valve"])
+
+    index = BM25Index(path=path)
+
+    assert len(index) == 2
+    assert [id for id, _ in index.search("valve")] == ["b"]
+
+
+@pytest.fixture
+def chroma(create_chroma, tmp_path):
+    return create_chroma(bm25={"path": str(tmp_path / "bm25.sqlite")})
+
+
+def test_hybrid_search_finds_exact_codes(chroma):
+    chroma.add_texts(texts, metadatas=[{"kind": "part" if "-" in text else "faq"} for text in texts])
+
+    vector = [document.page_content for document in chroma.similarity_search("AB-1234", k=1)]
+    hybrid = chroma.hybrid_search("AB-1234", k=1, fetch_k=5)
+
+    assert vector != [texts[0]]
+    assert hybrid[0][0].page_content == texts[0]
+    assert hybrid[0][0].metadata == {"kind": "part"}
+    assert hybrid[0][1] >= 1 / 61
+
+
+def test_hybrid_search_applies_the_filter_to_both_rankings(chroma):
+    chroma.add_texts(texts, metadatas=[{"kind": "part" if "-" in text else "faq"} for text in texts])
+
+    results = chroma.hybrid_search("pump filter", k=5, filter={"kind": "faq"})
+
+    assert results
+    assert all(document.metadata["kind"] == "faq" for document, _ in results)
+
+
+def test_index_follows_ingestion_and_deletes(chroma):
+    chroma.ingest(texts, batch_size=2)
+    ids = [id for id, _ in chroma.ally_bm25.search("warranty")]
+    chroma.delete(ids=ids)
+
+    assert len(chroma.ally_bm25) == len(texts) - 1
+    assert chroma.hybrid_search("warranty", k=5, fetch_k=1)[0][0].page_content != texts[2]
+
+
+def test_delete_by_filter_removes_postings(chroma):
+    chroma.add_texts(texts, metadatas=[{"kind": "part" if "-" in text else "faq"} for text in texts])
+
+    chroma.delete(where={"kind": "part"})
+
+    assert chroma._collection.count() == len(texts) - 2
+    assert len(chroma.ally_bm25) == len(texts) - 2
+    assert all(id in chroma._collection.get()["ids"] for id, _ in chroma.ally_bm25.search("pump filter ab-1234"))
+
+
+def test_corpus_stats_are_shared_by_instances(tmp_path):
+    path = str(tmp_path / "bm25.sqlite")
+    first, second = BM25Index(path=path), BM25Index(path=path)
+
+    first.add(["a", "b"], ["red pump", "blue valve"])
+    second.delete(["a"])
+
+    assert len(first) == len(second) == 1
+    assert first.stats() == second.stats() == {"documents": 1, "terms": 2, "average_length": 2.0}
+
+
+def test_existing_collection_can_be_indexed(chroma):
+    chroma.add_texts(texts)
+    chroma.ally_bm25.clear()
+
+    chroma.build_bm25_index(batch_size=2)
+
+    assert len(chroma.ally_bm25) == len(texts)
+
+
+def test_hybrid_stats_have_stage_latencies(chroma):
+    chroma.add_texts(texts)
+
+    for _ in range(3):
+        chroma.hybrid_search("pump")
+
+    stats = chroma.hybrid_stats()
+    assert set(stats) == {"lexical", "vector", "fusion", "total"}
+    assert all(stage["count"] == 3 for stage in stats.values())
+    assert stats["total"]["max"] >= stats["lexical"]["p50"]
+
+
+def test_hybrid_search_needs_the_index(create_chroma):
+    chroma = create_chroma()
+
+    with pytest.raises(ValueError):
+        chroma.hybrid_search("pump")
+
+
+def test_reload_keeps_an_in_memory_index(create_chroma, tmp_path):
+    chroma = create_chroma(bm25=True)
+    chroma.add_texts(texts)
+    index = chroma.ally_bm25
+
+    chroma.reload(Settings(section="chromadb", persist_directory=str(tmp_path / "db"), bm25=True))
+    assert chroma.ally_bm25 is index
+    assert len(chroma.ally_bm25) == len(texts)
+
+    chroma.reload(Settings(section="chromadb", persist_directory=str(tmp_path / "db"), bm25={"k1": 1.2}))
+    assert chroma.ally_bm25 is not index
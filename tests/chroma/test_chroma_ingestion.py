@@ -0,0 +1,159 @@
+import sys
+
+import pytest
+from langchain_core.documents import Document
+from ally_ai_chroma import IngestionPipeline
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    return create_chroma(embeddings={"packing": True})
+
+
+def documents(count):
+    return (Document(page_content=f"document {index}", metadata={"index": index}) for index in range(count))
+
+
+def test_every_document_is_ingested(chroma):
+    stats = chroma.ingest(documents(1000), batch_size=64, embed_workers=3)
+
+    assert stats["documents"] == 1000
+    assert chroma._collection.count() == 1000
+    stored = chroma._collection.get(where={"index": 999}, include=["documents", "embeddings"])
+    assert stored["documents"] == ["document 999"]
+    assert list(stored["embeddings"][0]) == [12.0, 2.0]
+
+
+def test_texts_are_ingested_with_stable_ids(chroma):
+    chroma.ingest(["an ally", "a friend", "an ally"], batch_size=2)
+    chroma.ingest(["an ally", "a friend", "an ally"], batch_size=2)
+
+    assert chroma._collection.count() == 3
+
+
+def test_upserts_are_limited_by_the_client_batch_size(chroma, monkeypatch):
+    sizes = []
+    upsert = chroma._collection.upsert
+    monkeypatch.setattr(chroma._client, "get_max_batch_size", lambda: 10)
+    monkeypatch.setattr(
+        chroma._collection, "upsert", lambda **kwargs: sizes.append(len(kwargs["ids"])) or upsert(**kwargs)
+    )
+
+    chroma.ingest(documents(100), batch_size=8)
+
+    assert chroma._collection.count() == 100
+    assert max(sizes) <= 10
+
+
+def test_failed_batches_are_retried(chroma, monkeypatch):
+    calls = []
+    embed_documents = type(chroma._embedding_function).embed_documents
+
+    def flaky(self, texts, **kwargs):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise ConnectionError("reset")
+        return embed_documents(self, texts, **kwargs)
+
+    monkeypatch.setattr(type(chroma._embedding_function), "embed_documents", flaky)
+    monkeypatch.setattr(sys.modules[IngestionPipeline.__module__], "retry_after", lambda ex: 0.01)
+
+    stats = chroma.ingest(documents(40), batch_size=10, embed_workers=1)
+
+    assert stats["retried"] == 1
+    assert chroma._collection.count() == 40
+
+
+def test_errors_stop_the_pipeline(chroma, monkeypatch):
+    def failing(self, texts, **kwargs):
+        raise ValueError("bad input")
+
+    monkeypatch.setattr(type(chroma._embedding_function), "embed_documents", failing)
+
+    with pytest.raises(ValueError, match="bad input"):
+        chroma.ingest(documents(100), batch_size=10, retries=0)
+    assert chroma._collection.count() == 0
+
+
+def test_interrupted_ingest_resumes_from_the_checkpoint(chroma, monkeypatch, tmp_path):
+    checkpoint = str(tmp_path / "ingest.jsonl")
+    upsert = type(chroma)._upsert_texts
+    upserts = []
+
+    def interrupted(self, texts, ids, embeddings, metadatas):
+        if len(upserts) == 3:
+            raise KeyboardInterrupt
+        upserts.append(len(ids))
+        upsert(self, texts, ids, embeddings, metadatas)
+
+    monkeypatch.setattr(type(chroma), "_upsert_texts", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        chroma.ingest(documents(100), batch_size=10, upsert_workers=1, queue_size=1, checkpoint=checkpoint)
+    monkeypatch.setattr(type(chroma), "_upsert_texts", upsert)
+
+    done = chroma._collection.count()
+    stats = chroma.ingest(documents(100), batch_size=10, checkpoint=checkpoint)
+
+    assert 0 < done < 100
+    assert stats["skipped"] == done
+    assert stats["documents"] == 100 - done
+    assert chroma._collection.count() == 100
+
+
+def test_checkpoint_file_is_closed_after_the_run(chroma, tmp_path):
+    pipeline = IngestionPipeline(chroma, documents(20), batch_size=10, checkpoint=str(tmp_path / "ingest.jsonl"))
+
+    pipeline.run()
+
+    assert pipeline.checkpoint._file is None
+    assert pipeline.checkpoint.entry(1) is not None
+
+
+def test_stats_are_reported_per_stage(chroma):
+    pipeline = IngestionPipeline(chroma, documents(50), batch_size=10, report_interval=0.01)
+
+    stats = pipeline.run()
+
+    assert set(stats["stages"]) == {"read", "embed", "upsert"}
+    assert all(stage["docs"] == 50 for stage in stats["stages"].values())
+    assert stats["stages"]["embed"]["docs_per_second"] > 0
+    assert stats["bottleneck"] in stats["stages"]
+
+
+def corpus(changed=(), removed=()):
+    return [
+        Document(
+            page_content=f"chunk {index}" + (" v2" if index in changed else ""),
+            metadata={"source": f"doc{index // 5}"},
+        )
+        for index in range(50)
+        if index not in removed
+    ]
+
+
+def embedded(chroma):
+    calls = chroma._embedding_function.client.calls
+    return [text for call in calls for text in ([call] if isinstance(call, str) else call)]
+
+
+def test_incremental_ingest_only_embeds_changes(chroma):
+    first = chroma.ingest(corpus(), batch_size=8, incremental=True)
+    calls = len(embedded(chroma))
+
+    second = chroma.ingest(corpus(changed={3, 17}), batch_size=8, incremental=True, page_size=7)
+
+    assert first["added"] == 50
+    assert (second["added"], second["updated"], second["skipped"], second["deleted"]) == (0, 2, 48, 0)
+    assert sorted(embedded(chroma)[calls:]) == ["chunk 17 v2", "chunk 3 v2"]
+    assert chroma._collection.count() == 50
+    assert chroma._collection.get(where={"source": "doc0"}, include=["documents"])["documents"].count("chunk 3 v2") == 1
+
+
+def test_incremental_ingest_deletes_removed_documents(chroma):
+    chroma.ingest(corpus(), incremental=True)
+
+    stats = chroma.ingest(corpus(removed={45, 46, 47, 48, 49}), incremental=True, page_size=10)
+
+    assert stats["deleted"] == 5
+    assert stats["documents"] == 0
+    assert chroma._collection.count() == 45
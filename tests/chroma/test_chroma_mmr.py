@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from langchain_chroma.vectorstores import maximal_marginal_relevance
+from ally_ai_chroma import MMRReranker
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.5, 1.0])
+@pytest.mark.parametrize("count", [3, 50])
+def test_same_picks_as_langchain(lambda_mult, count):
+    generator = np.random.default_rng(count)
+    query = generator.standard_normal(8).astype(np.float32)
+    candidates = generator.standard_normal((count, 8)).astype(np.float32)
+
+    picked = MMRReranker(lambda_mult).select(query, candidates, k=5)
+
+    assert picked == maximal_marginal_relevance(query, candidates.tolist(), lambda_mult=lambda_mult, k=5)
+
+
+def test_near_duplicates_are_not_picked_together():
+    candidates = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+
+    assert MMRReranker(lambda_mult=0.5).select([1.0, 0.1], candidates, k=2) == [1, 2]
+    assert MMRReranker(lambda_mult=1.0).select([1.0, 0.1], candidates, k=2) == [1, 0]
+
+
+def test_queries_are_reranked_in_one_batch():
+    generator = np.random.default_rng(0)
+    queries = generator.standard_normal((3, 8))
+    candidates = [generator.standard_normal((count, 8)) for count in (10, 2, 0)]
+    reranker = MMRReranker()
+
+    picked = reranker.select_batch(queries, candidates, k=4)
+
+    assert picked[0] == reranker.select(queries[0], candidates[0], k=4)
+    assert sorted(picked[1]) == [0, 1]
+    assert picked[2] == []
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    chroma = create_chroma()
+    chroma.add_texts(["x" * length for length in range(1, 31)] + ["x x", "x x x", "xx xx xx xx"])
+    chroma._embedding_function.client.calls.clear()
+    return chroma
+
+
+def test_mmr_query_returns_the_picked_rows(chroma):
+    results = chroma.mmr_query(["xxxx", "x x"], k=3, fetch_k=10, include=["documents", "embeddings"], arrays=True)
+
+    assert chroma._embedding_function.client.calls == ["xxxx", "x x"]
+    assert [len(row) for row in results["documents"]] == [3, 3]
+    assert results["documents"][0][0] == "xxxx"
+    assert results["embeddings"][0].shape == (3, 2)
+    assert results["query_embeddings"].tolist() == [[4.0, 1.0], [3.0, 2.0]]
+
+
+def test_max_marginal_relevance_search_embeds_only_the_query(chroma):
+    documents = chroma.max_marginal_relevance_search("x x x", k=3, fetch_k=10)
+
+    assert len(documents) == 3
+    assert documents[0].page_content == "x x x"
+    assert chroma._embedding_function.client.calls == ["x x x"]
+
+
+def test_max_marginal_relevance_search_keeps_langchain_order(chroma):
+    from langchain_chroma import Chroma as LangChainChroma
+
+    embedding = [5.0, 2.0]
+
+    documents = chroma.max_marginal_relevance_search_by_vector(embedding, k=4, fetch_k=12, lambda_mult=0.3)
+    expected = LangChainChroma.max_marginal_relevance_search_by_vector(
+        chroma, embedding, k=4, fetch_k=12, lambda_mult=0.3
+    )
+
+    assert [document.page_content for document in documents] == [document.page_content for document in expected]
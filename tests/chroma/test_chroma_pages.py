@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    chroma = create_chroma()
+    chroma.add_texts(
+        [f"text {index}" for index in range(25)],
+        metadatas=[{"even": index % 2 == 0} for index in range(25)],
+        ids=[f"{index:02}" for index in range(25)],
+    )
+    return chroma
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_pages_cover_the_collection(chroma, prefetch):
+    pages = list(chroma.iter_pages(batch_size=10, prefetch=prefetch))
+
+    assert [len(page["ids"]) for page in pages] == [10, 10, 5]
+    assert sorted(id for page in pages for id in page["ids"]) == [f"{index:02}" for index in range(25)]
+
+
+def test_embeddings_are_float32_arrays(chroma):
+    page = next(chroma.iter_pages(batch_size=10, include=["embeddings", "documents"]))
+
+    assert isinstance(page["embeddings"], np.ndarray)
+    assert page["embeddings"].dtype == np.float32
+    assert page["embeddings"].shape == (10, 2)
+    assert page["embeddings"].flags["C_CONTIGUOUS"]
+    for document, vector in zip(page["documents"], page["embeddings"]):
+        assert vector.tolist() == [len(document), 2.0]
+
+
+def test_pages_are_filtered(chroma):
+    pages = list(chroma.iter_pages(batch_size=5, include=["metadatas"], where={"even": True}))
+
+    assert sum(len(page["ids"]) for page in pages) == 13
+    assert all(metadata["even"] for page in pages for metadata in page["metadatas"])
+
+
+def test_collection_size_multiple_of_the_page_size(chroma):
+    pages = list(chroma.iter_pages(batch_size=5))
+
+    assert [len(page["ids"]) for page in pages] == [5] * 5
+
+
+def test_get_returns_one_array(chroma):
+    result = chroma.get(include=["embeddings", "documents"], arrays=True)
+
+    assert isinstance(result["embeddings"], np.ndarray)
+    assert result["embeddings"].dtype == np.float32
+    assert result["embeddings"].shape == (25, 2)
+    assert isinstance(chroma.get(include=["embeddings"])["embeddings"], list)
+
+
+def test_arrays_can_be_the_default(create_chroma):
+    chroma = create_chroma(arrays=True)
+    chroma.add_texts(["an ally", "a friend"])
+
+    assert chroma.get(include=["embeddings"])["embeddings"].shape == (2, 2)
+    assert isinstance(chroma.query("an ally", n_results=1, include=["distances"])["distances"][0], np.ndarray)
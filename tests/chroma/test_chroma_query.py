@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+# the fake vector of a text is [length, words], so every text is nearest to itself
+texts = ["x" * length for length in range(1, 31)]
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    chroma = create_chroma(embeddings={"packing": True})
+    chroma.add_texts(texts)
+    chroma._embedding_function.client.calls.clear()
+    return chroma
+
+
+def test_single_query_text_is_not_split_into_characters(chroma):
+    results = chroma.query("xxx", n_results=1, include=["documents"])
+
+    assert results["documents"] == [["xxx"]]
+
+
+def test_query_texts_are_embedded_in_one_request(chroma):
+    results = chroma.query(["x", "xx", "xxxxx"], n_results=1, include=["documents"])
+
+    assert results["documents"] == [["x"], ["xx"], ["xxxxx"]]
+    assert chroma._embedding_function.client.calls == [["x", "xx", "xxxxx"]]
+
+
+@pytest.mark.asyncio
+async def test_aquery_uses_the_async_client(chroma):
+    results = await chroma.aquery(["xx", "xxxx"], n_results=1, include=["documents"])
+
+    assert results["documents"] == [["xx"], ["xxxx"]]
+    assert chroma._embedding_function.async_client.calls == [["xx", "xxxx"]]
+    assert chroma._embedding_function.client.calls == []
+
+
+def test_bulk_results_are_aligned_to_the_queries(chroma):
+    queries = list(reversed(texts))
+
+    results = chroma.query_bulk(queries, n_results=1, include=["documents", "distances"], batch_size=7)
+
+    assert [documents[0] for documents in results["documents"]] == queries
+    assert len(results["ids"]) == len(results["distances"]) == 30
+    assert len(chroma._embedding_function.client.calls) == 5
+
+
+@pytest.mark.asyncio
+async def test_async_bulk_results_are_aligned_to_the_queries(chroma):
+    queries = texts[::2]
+
+    results = await chroma.aquery_bulk(queries, n_results=1, include=["documents"], batch_size=4, concurrency=2)
+
+    assert [documents[0] for documents in results["documents"]] == queries
+
+
+def test_query_returns_arrays(chroma):
+    results = chroma.query(["x", "xxxx"], n_results=3, include=["distances", "embeddings"], arrays=True)
+
+    assert all(isinstance(row, np.ndarray) and row.dtype == np.float32 for row in results["distances"])
+    assert results["embeddings"][1].shape == (3, 2)
+    assert results["embeddings"][1][0].tolist() == [4.0, 1.0]
+    assert results["distances"][0][0] == 0.0
+
+
+def test_query_bulk_keeps_arrays(chroma):
+    results = chroma.query_bulk(texts, n_results=2, include=["distances"], batch_size=7, arrays=True)
+
+    assert len(results["distances"]) == len(texts)
+    assert all(row.shape == (2,) for row in results["distances"])
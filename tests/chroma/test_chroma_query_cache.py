@@ -0,0 +1,133 @@
+import sys
+
+import numpy as np
+import pytest
+from ally_ai_chroma import QueryCache
+
+texts = ["x" * length for length in range(1, 21)]
+
+
+@pytest.fixture
+def chroma(create_chroma):
+    chroma = create_chroma(query_cache=True)
+    chroma.add_texts(texts, ids=[f"{index:02}" for index in range(len(texts))])
+    chroma._embedding_function.client.calls.clear()
+    return chroma
+
+
+def embedded(chroma):
+    calls = chroma._embedding_function.client.calls
+    return [text for call in calls for text in ([call] if isinstance(call, str) else call)]
+
+
+def test_repeated_queries_are_served_from_the_cache(chroma):
+    first = chroma.query(["xx", "xxxx"], n_results=2)
+    second = chroma.query(["xx", "xxxx"], n_results=2)
+
+    assert second == first
+    assert embedded(chroma) == ["xx", "xxxx"]
+    assert chroma.ally_query_cache.stats()["hits"] == 2
+
+
+def test_only_uncached_texts_are_embedded(chroma):
+    chroma.query("xx", n_results=1, include=["documents"])
+    results = chroma.query(["xxx", "xx"], n_results=1, include=["documents"])
+
+    assert results["documents"] == [["xxx"], ["xx"]]
+    assert embedded(chroma) == ["xx", "xxx"]
+
+
+def test_options_are_part_of_the_key(chroma):
+    chroma.query("xx", n_results=1)
+    chroma.query("xx", n_results=2)
+    chroma.query("xx", n_results=1, where={"source": "faq"})
+
+    assert chroma.ally_query_cache.stats()["hits"] == 0
+
+
+def test_writes_invalidate_the_cache(chroma):
+    invalidations = chroma.ally_query_cache.stats()["invalidations"]
+    before = chroma.query("x x", n_results=1, include=["documents"])
+    chroma.add_texts(["x x"], ids=["x x"])
+    after = chroma.query("x x", n_results=1, include=["documents"])
+    chroma.delete(ids=["x x"])
+
+    assert before["documents"] == [["xxx"]]
+    assert after["documents"] == [["x x"]]
+    assert chroma.query("x x", n_results=1, include=["documents"])["documents"] == [["xxx"]]
+    assert chroma.ally_query_cache.stats()["invalidations"] == invalidations + 2
+
+
+def test_writes_of_another_instance_invalidate_the_cache(chroma, create_chroma):
+    other = create_chroma(query_cache=True)
+    chroma.query("x x", n_results=1, include=["documents"])
+
+    other.add_texts(["x x"], ids=["x x"])
+
+    assert chroma.query("x x", n_results=1, include=["documents"])["documents"] == [["x x"]]
+
+
+def test_similarity_search_is_cached(chroma):
+    first = chroma.similarity_search_with_score("xxx", k=2)
+    second = chroma.similarity_search_with_score("xxx", k=2)
+    chroma.similarity_search_by_vector([3.0, 1.0], k=2)
+    documents = chroma.similarity_search_by_vector([3.0, 1.0], k=2)
+
+    assert first == second
+    assert first[0][0].page_content == "xxx"
+    assert [document.page_content for document in documents] == [document.page_content for document, _ in first]
+    assert embedded(chroma) == ["xxx"]
+    assert chroma.ally_query_cache.stats()["hits"] == 2
+
+
+def test_cached_results_are_copies(chroma):
+    chroma.query("xx", n_results=1, include=["documents"])["documents"][0].append("changed")
+
+    assert chroma.query("xx", n_results=1, include=["documents"])["documents"] == [["xx"]]
+
+
+def test_entries_expire(monkeypatch):
+    cache = QueryCache(ttl=10)
+    now = [1000.0]
+
+    monkeypatch.setattr(sys.modules[QueryCache.__module__], "time", lambda: now[0])
+    key = cache.key("docs", "an ally", n_results=1)
+    cache.put(key, {"ids": ["1"]}, cache.version("docs"))
+
+    assert cache.get(key) == {"ids": ["1"]}
+    now[0] += 11
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = QueryCache(max_size=2)
+    keys = [cache.key("docs", text) for text in ["a", "b", "c"]]
+    cache.put(keys[0], 0, cache.version("docs"))
+    cache.put(keys[1], 1, cache.version("docs"))
+    cache.get(keys[0])
+    cache.put(keys[2], 2, cache.version("docs"))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0
+
+
+def test_result_of_a_query_racing_a_write_is_not_cached():
+    cache = QueryCache()
+    key = cache.key("docs", np.array([1.0, 2.0]))
+    version = cache.version("docs")
+    cache.invalidate("docs")
+    cache.put(key, "stale", version)
+
+    assert cache.get(key) is None
+
+
+def test_generation_invalidates_across_processes(tmp_path):
+    generation = str(tmp_path / "generation")
+    reader, writer = QueryCache(generation=generation), QueryCache(generation=generation)
+    key = reader.key("docs", "an ally")
+    reader.put(key, "result", reader.version("docs"))
+
+    assert reader.get(key) == "result"
+    writer.invalidate("docs")
+    assert reader.get(key) is None
+    assert reader.stats()["generation"] == 1
@@ -1,3 +1,4 @@
+import numpy as np
 from ally_ai_chroma import Chroma
 from ally_ai_chroma_visualise import ChromaEmbeddingsVisualisor
 import pytest
@@ -23,3 +24,29 @@ def instance():
 def test_visualise(instance):
     figure = instance.visualise("what is an ally?", search_type="similarity")
     assert figure is not None
+
+
+class ShrinkingChroma:
+    """
+    Counts 5 documents, then pages only 3 as if 2 were deleted meanwhile
+    """
+
+    class _collection:
+        @staticmethod
+        def count():
+            return 5
+
+    def iter_pages(self, batch_size, include):
+        yield {"ids": ["a", "b"], "documents": ["a", "b"], "embeddings": np.ones((2, 4), dtype=np.float32)}
+        yield {"ids": ["c"], "documents": ["c"], "embeddings": np.ones((1, 4), dtype=np.float32)}
+
+
+def test_embeddings_have_a_row_per_read_document():
+    visualisor = object.__new__(ChromaEmbeddingsVisualisor)
+    visualisor.chroma_client = ShrinkingChroma()
+
+    embeddings, documents = visualisor.get_documents_and_embeddings(batch_size=2)
+
+    assert documents == ["a", "b", "c"]
+    assert embeddings.shape == (3, 4)
+    assert (embeddings == 1).all()
@@ -0,0 +1,30 @@
+from ally_ai_core.limits import AdaptiveConcurrency
+
+
+def test_limit_grows_while_latency_holds():
+    concurrency = AdaptiveConcurrency(initial=2, maximum=4)
+
+    for _ in range(20):
+        concurrency.succeeded(0.1)
+
+    assert concurrency.limit == 4
+
+
+def test_throttling_halves_the_limit():
+    concurrency = AdaptiveConcurrency(initial=4, maximum=4)
+
+    concurrency.throttled()
+
+    assert concurrency.limit == 2
+
+
+def test_rising_latency_shrinks_the_limit():
+    concurrency = AdaptiveConcurrency(initial=2, maximum=4)
+    for _ in range(20):
+        concurrency.succeeded(0.1)
+    concurrency.throttled()
+
+    for _ in range(10):
+        concurrency.succeeded(1.0)
+
+    assert concurrency.limit == 1
@@ -0,0 +1,34 @@
+import pytest
+from ally_ai_core.checkpoints import Checkpoint
+
+
+def test_entries_are_read_back_by_key(tmp_path):
+    path = str(tmp_path / "runs" / "checkpoint.jsonl")
+    with Checkpoint(path, key="batch") as checkpoint:
+        checkpoint.append({"batch": 0, "ids": "a"})
+        checkpoint.append({"batch": 1, "ids": "b"})
+        checkpoint.append({"batch": 0, "ids": "c"})
+
+    resumed = Checkpoint(path, key="batch")
+
+    assert resumed.entry(0) == {"batch": 0, "ids": "c"}
+    assert resumed.entry(1) == {"batch": 1, "ids": "b"}
+    assert resumed.entry(2) is None
+
+
+def test_cut_off_last_line_is_skipped(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text('{"batch": 0}\n{"batch": 1, "id')
+
+    assert Checkpoint(str(path), key="batch").entry(0) == {"batch": 0}
+
+
+def test_file_is_open_only_inside_with(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"), key="batch")
+
+    with checkpoint:
+        checkpoint.append({"batch": 0})
+
+    assert checkpoint._file is None
+    with pytest.raises(ValueError):
+        checkpoint.append({"batch": 1})
@@ -0,0 +1,31 @@
+from ally_ai_core.limits import Deduplicator
+
+
+def test_distinct_items_keep_first_seen_order():
+    dedup = Deduplicator()
+
+    unique, inverse = dedup.unique(["b", "a", "b", "c", "a"])
+
+    assert unique == ["b", "a", "c"]
+    assert inverse == [0, 1, 0, 2, 1]
+
+
+def test_results_are_scattered_back_to_every_position():
+    dedup = Deduplicator(copy=list)
+    unique, inverse = dedup.unique(["x", "y", "x"])
+    results = [[1.0], [2.0]]
+
+    scattered = dedup.scatter(results, inverse)
+
+    assert scattered == [[1.0], [2.0], [1.0]]
+    assert scattered[0] is results[0]
+    assert scattered[2] is not results[0]
+
+
+def test_dedup_ratio_is_reported():
+    dedup = Deduplicator()
+
+    dedup.unique(["a", "a", "a", "b"])
+    dedup.unique(["c"])
+
+    assert dedup.stats() == {"items": 5, "duplicates": 2, "dedup_ratio": 0.4}
@@ -0,0 +1,147 @@
+import random
+
+import pytest
+from ally_ai_core.routing import Deployment, DeploymentRouter
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}, "status_code": status_code})()
+
+
+def create_router(**options):
+    return DeploymentRouter(
+        [Deployment(name="a", target="a"), Deployment(name="b", target="b")], **options
+    )
+
+
+def test_from_settings_merges_section():
+    settings = {
+        "api_key": "key",
+        "deployments": [
+            {"deployment_name": "a", "weight": 3},
+            {"deployment_name": "b", "api_key": "other"},
+        ],
+        "routing": {"eject_seconds": 5},
+    }
+
+    router = DeploymentRouter.from_settings(settings, create=lambda s: s["api_key"])
+
+    assert settings == {"api_key": "key"}
+    assert [d.target for d in router.deployments] == ["key", "other"]
+    assert router.deployments[0].weight == 3
+    assert router.eject_seconds == 5
+
+
+def test_from_settings_without_deployments():
+    assert DeploymentRouter.from_settings({"api_key": "key"}, create=dict) is None
+
+
+def test_for_model_builds_deployments_and_registers_their_limiters():
+    from ally_ai_core.limits import rate_limiters
+
+    settings = {
+        "endpoint": "https://section/",
+        "api_key": "key",
+        "http": False,
+        "rate_limit": {"requests_per_minute": 60},
+        "deployments": [
+            {"endpoint": "https://a/", "deployment_name": "a"},
+            {"endpoint": "https://b/", "deployment_name": "b", "rate_limit": {"requests_per_minute": 120}},
+        ],
+    }
+
+    router, clients = DeploymentRouter.for_model(settings, {"temperature": 0}, create=dict)
+
+    assert clients == {}
+    assert settings == {"api_key": "key", "azure_endpoint": "https://section/", "azure_deployment": "a"}
+    assert router.deployments[1].target == {
+        "max_retries": 0, "api_key": "key", "azure_endpoint": "https://b/", "azure_deployment": "b", "temperature": 0
+    }
+    assert rate_limiters.for_deployment("https://a/", "a").stats()["requests_per_minute"] == 60
+    assert rate_limiters.for_deployment("https://b/", "b").stats()["requests_per_minute"] == 120
+    assert rate_limiters.for_deployment("https://section/", "a") is None
+    rate_limiters.clear()
+
+
+def test_throttled_deployment_fails_over_and_is_ejected(monkeypatch):
+    # the first healthy deployment is chosen, so 'a' is always tried first
+    monkeypatch.setattr(random, "choices", lambda population, weights: population[:1])
+    router = create_router()
+    calls = []
+
+    def call(target):
+        calls.append(target)
+        if target == "a":
+            raise StatusError(429, {"retry-after": "60"})
+        return target
+
+    results = [router.call(call) for _ in range(5)]
+
+    assert results == ["b"] * 5
+    assert calls.count("a") == 1
+    assert router.stats()["a"]["healthy"] is False
+    assert router.stats()["a"]["throttled"] == 1
+
+
+def test_client_error_is_not_retried():
+    router = create_router()
+
+    def call(target):
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        router.call(call)
+
+
+def test_all_deployments_failing_raises():
+    router = create_router()
+
+    def call(target):
+        raise StatusError(503)
+
+    with pytest.raises(StatusError):
+        router.call(call)
+
+
+def test_consecutive_server_errors_eject():
+    router = DeploymentRouter([Deployment(name="a", target="a")], max_failures=2)
+
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            router.call(lambda target: (_ for _ in ()).throw(StatusError(500)))
+
+    assert router.stats()["a"]["healthy"] is False
+
+
+def test_weights_are_respected():
+    router = DeploymentRouter(
+        [Deployment(name="a", target="a", weight=1), Deployment(name="b", target="b", weight=0)]
+    )
+
+    assert {router.call(lambda target: target) for _ in range(20)} == {"a"}
+
+
+def test_stream_fails_over_before_first_item():
+    router = create_router()
+
+    def stream(target):
+        if target == "a":
+            raise StatusError(429)
+        yield from [target, target]
+
+    assert list(router.stream(stream)) == ["b", "b"]
+
+
+@pytest.mark.asyncio
+async def test_acall_fails_over():
+    router = create_router()
+
+    async def call(target):
+        if target == "a":
+            raise ConnectionError()
+        return target
+
+    assert [await router.acall(call) for _ in range(3)] == ["b"] * 3
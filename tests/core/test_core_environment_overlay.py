@@ -0,0 +1,82 @@
+import pytest
+from ally_ai_core.settings import EnvironmentOverlay
+from ..Utils import env_var_on_off
+
+
+@pytest.fixture
+def overlay():
+    return EnvironmentOverlay()
+
+
+def test_applies_only_requested_section(overlay):
+    with env_var_on_off("LLM__API_KEY", "llm-key"):
+        with env_var_on_off("EMBEDDINGS__API_KEY", "embeddings-key"):
+            section = overlay.apply("llm", {"api_key": "yaml-key"})
+
+    assert section == {"api_key": "llm-key"}
+
+
+def test_nested_keys(overlay):
+    with env_var_on_off("LLM__CACHE__MAX_SIZE", "10"):
+        section = overlay.apply("llm", {"cache": {"ttl": 1}})
+
+    assert section == {"cache": {"ttl": 1, "max_size": "10"}}
+
+
+def test_empty_value_is_ignored(overlay):
+    with env_var_on_off("LLM__API_KEY", ""):
+        section = overlay.apply("llm", {"api_key": "yaml-key"})
+
+    assert section == {"api_key": "yaml-key"}
+
+
+def test_section_only_in_environment(overlay):
+    with env_var_on_off("ONLY_ENV__KEY", "value"):
+        assert overlay.apply("only_env", None) == {"key": "value"}
+
+
+def test_missing_section_raises(overlay):
+    with pytest.raises(KeyError):
+        overlay.apply("no_such_section", None)
+
+
+def test_index_is_built_once_per_environment(overlay):
+    overlay.index()
+    overlay.index()
+    assert overlay.builds == 1
+
+    with env_var_on_off("LLM__TEMPERATURE", "0.1"):
+        overlay.index()
+    assert overlay.builds == 2
+
+
+def test_other_variables_do_not_rebuild(overlay):
+    overlay.index()
+
+    with env_var_on_off("ALLY_UNRELATED", "1"):
+        overlay.index()
+
+    assert overlay.builds == 1
+
+
+def test_unchanged_environment_is_not_scanned(overlay, monkeypatch):
+    with env_var_on_off("LLM__TEMPERATURE", "0.1"):
+        overlay.index()
+        scans = []
+        scan = overlay._overlay_variables
+        monkeypatch.setattr(overlay, "_overlay_variables", lambda: scans.append(1) or scan())
+
+        overlay.index()
+        assert scans == []
+
+        with env_var_on_off("LLM__TEMPERATURE", "0.2"):
+            assert overlay.apply("llm", {}) == {"temperature": "0.2"}
+    assert scans == [1]
+
+
+def test_refresh(overlay):
+    overlay.index()
+    overlay.refresh()
+    overlay.index()
+
+    assert overlay.builds == 2
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from ally_ai_core.connections import HttpClientPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ally"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+
+def test_clients_are_shared_per_endpoint_and_options():
+    pool = HttpClientPool()
+
+    client, async_client = pool.clients("https://one/")
+
+    assert pool.clients("https://one") == (client, async_client)
+    assert pool.clients("https://two")[0] is not client
+    assert pool.clients("https://one", max_connections=5)[0] is not client
+    assert client is not async_client
+
+
+def test_connections_are_reused(endpoint):
+    pool = HttpClientPool()
+    client, _ = pool.clients(endpoint)
+
+    for _ in range(3):
+        assert client.get(endpoint).text == "ally"
+
+    stats = pool.stats()[endpoint]["sync"]
+    assert stats["requests"] == 3
+    assert stats["active"] == 0
+    assert stats["connections"] == 1
+    assert stats["idle_connections"] == 1
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_async_client_is_metered(endpoint):
+    pool = HttpClientPool()
+    _, async_client = pool.clients(endpoint, max_connections=2)
+
+    response = await async_client.get(endpoint)
+
+    assert response.text == "ally"
+    stats = pool.stats()[endpoint]
+    assert stats["max_connections"] == 2
+    assert stats["async"]["requests"] == 1
+    assert stats["async"]["active"] == 0
+    await pool.aclose()
+
+
+def test_streamed_response_is_active_until_closed(endpoint):
+    pool = HttpClientPool()
+    client, _ = pool.clients(endpoint)
+
+    with client.stream("GET", endpoint) as response:
+        assert pool.stats()[endpoint]["sync"]["active"] == 1
+        response.read()
+
+    assert pool.stats()[endpoint]["sync"]["active"] == 0
+    pool.close()
+
+
+def test_clients_for_settings():
+    pool = HttpClientPool()
+    settings = {"azure_endpoint": "https://one/", "http": {"max_connections": 5}}
+
+    clients = pool.for_settings(settings, {})
+
+    assert "http" not in settings
+    assert (clients["http_client"], clients["http_async_client"]) == pool.clients("https://one", max_connections=5)
+    assert "async_http_client" in pool.for_settings({"azure_endpoint": "https://one/"}, {}, async_name="async_http_client")
+    assert pool.for_settings({"azure_endpoint": "https://one/", "http": False}, {}) == {}
+    assert pool.for_settings({"azure_endpoint": "https://one/"}, {"http_client": None}) == {}
+
+
+def test_async_client_works_across_event_loops(endpoint):
+    pool = HttpClientPool()
+    _, async_client = pool.clients(endpoint)
+
+    async def get():
+        return (await async_client.get(endpoint)).text
+
+    assert asyncio.run(get()) == "ally"
+    assert asyncio.run(get()) == "ally"
+    assert pool.stats()[endpoint]["async"]["requests"] == 2
+    pool.close()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from ally_ai_core.limits import MicroBatcher
+
+
+def test_concurrent_calls_are_sent_as_one_batch():
+    batches = []
+
+    def func(items):
+        batches.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(func=func, max_wait=0.2, max_batch_size=100)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(batcher.submit, [f"q{index}" for index in range(8)]))
+
+    assert results == [f"Q{index}" for index in range(8)]
+    assert len(batches) == 1
+    assert sorted(batches[0]) == [f"q{index}" for index in range(8)]
+
+
+def test_full_batch_is_sent_without_waiting():
+    batcher = MicroBatcher(func=lambda items: items, max_wait=10, max_batch_size=4)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(batcher.submit, range(8)))
+
+    assert results == list(range(8))
+    assert time.monotonic() - start < 5
+    assert batcher.stats()["batch_size"]["histogram"] == {4: 2}
+
+
+def test_token_budget_splits_batches():
+    batcher = MicroBatcher(func=lambda items: items, max_wait=0.1, max_tokens=4, tokens=len)
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(batcher.submit, ["aa", "bb", "cc", "dd"]))
+
+    assert batcher.stats()["batch_size"]["histogram"] == {2: 2}
+
+
+def test_single_call_waits_at_most_max_wait():
+    batcher = MicroBatcher(func=lambda items: items, max_wait=0.05)
+
+    start = time.monotonic()
+    assert batcher.submit("ally") == "ally"
+
+    assert time.monotonic() - start < 1
+    assert batcher.stats()["latency"]["max"] >= 0.05
+
+
+def test_errors_are_raised_to_every_caller():
+    def func(items):
+        time.sleep(0.05)
+        raise ValueError("quota")
+
+    batcher = MicroBatcher(func=func, max_wait=0.1)
+    errors = []
+
+    def call(item):
+        try:
+            batcher.submit(item)
+        except ValueError as ex:
+            errors.append(ex)
+
+    with ThreadPoolExecutor(3) as pool:
+        list(pool.map(call, range(3)))
+
+    assert len(errors) == 3
+    assert batcher.stats()["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_calls_are_batched():
+    batches = []
+
+    async def afunc(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(afunc=afunc, max_wait=0.05)
+
+    results = await asyncio.gather(*[batcher.asubmit(index) for index in range(5)])
+
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_async_falls_back_to_func():
+    batcher = MicroBatcher(func=lambda items: [item + 1 for item in items], max_wait=0.01, max_batch_size=2)
+
+    results = await asyncio.gather(*[batcher.asubmit(index) for index in range(3)])
+
+    assert results == [1, 2, 3]
+    assert batcher.stats()["batches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_batch():
+    async def afunc(items):
+        await asyncio.sleep(0.05)
+        return items
+
+    batcher = MicroBatcher(afunc=afunc, max_wait=0.01)
+
+    cancelled = asyncio.ensure_future(batcher.asubmit("a"))
+    other = asyncio.ensure_future(batcher.asubmit("b"))
+    await asyncio.sleep(0.02)
+    cancelled.cancel()
+
+    assert await other == "b"
+
+
+def test_stats_have_latency_histogram():
+    batcher = MicroBatcher(func=lambda items: items, max_wait=0.0)
+
+    for index in range(3):
+        batcher.submit(index)
+
+    stats = batcher.stats()
+    assert stats["items"] == 3
+    assert stats["batch_size"]["mean"] == 1.0
+    assert sum(stats["latency"]["histogram"].values()) == 3
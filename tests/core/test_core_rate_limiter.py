@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+from ally_ai_core.limits import RateLimiter, RateLimiterRegistry, estimate_tokens
+
+
+def test_within_budget_does_not_wait():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=60000)
+
+    waits = [limiter.acquire(tokens=100) for _ in range(10)]
+
+    assert waits == [0] * 10
+    assert limiter.stats()["delayed"] == 0
+
+
+def test_requests_per_minute_is_enforced():
+    # 10 seconds of burst at 60 rpm is 10 requests, then one every second
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(10):
+        limiter._reserve(0, 1)
+
+    assert limiter._reserve(0, 1) == pytest.approx(1.0, abs=0.05)
+    assert limiter._reserve(0, 1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_tokens_per_minute_is_enforced():
+    limiter = RateLimiter(tokens_per_minute=6000)
+
+    assert limiter._reserve(1000, 1) == 0
+    assert limiter._reserve(600, 1) == pytest.approx(6.0, abs=0.05)
+
+
+def test_adjust_gives_back_unused_tokens():
+    limiter = RateLimiter(tokens_per_minute=6000)
+    limiter._reserve(1000, 1)
+
+    limiter.adjust(tokens=-1000)
+
+    assert limiter._reserve(1000, 1) == 0
+
+
+def test_callers_are_served_in_arrival_order():
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=0.1)
+    served = []
+
+    def call(index):
+        limiter.acquire()
+        served.append(index)
+
+    threads = []
+    for index in range(5):
+        thread = threading.Thread(target=call, args=(index,))
+        thread.start()
+        threads.append(thread)
+        # let the thread reserve before the next one arrives
+        threading.Event().wait(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert served == list(range(5))
+    stats = limiter.stats()
+    assert stats["max_queue_depth"] >= 1
+    assert stats["queue_depth"] == 0
+    assert stats["wait"]["max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_aacquire_waits():
+    limiter = RateLimiter(requests_per_minute=1200, burst_seconds=0.05)
+
+    waits = await asyncio.gather(*[limiter.aacquire() for _ in range(4)])
+
+    assert waits[0] == 0
+    assert max(waits) == pytest.approx(0.15, abs=0.02)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_gives_reservation_back():
+    limiter = RateLimiter(requests_per_minute=60, burst_seconds=1)
+    await limiter.aacquire()
+
+    task = asyncio.ensure_future(limiter.aacquire())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert limiter._reserve(0, 1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_registry_shares_and_reconfigures():
+    registry = RateLimiterRegistry()
+    key = registry.key("https://endpoint", "gpt")
+
+    first = registry.register(key, requests_per_minute=60)
+    second = registry.register(key, requests_per_minute=120)
+
+    assert first is second
+    assert first.requests_per_minute == 120
+    assert registry.get(registry.key("https://endpoint", "other")) is None
+    assert key in registry.stats()
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("what is an ally?") == 4
@@ -0,0 +1,78 @@
+import os
+import pytest
+from ally_ai_core.settings import Settings, SettingsCache, settings_cache
+from ..Utils import env_var_on_off
+
+
+@pytest.fixture
+def yaml_path(tmp_path):
+    path = tmp_path / "app-settings.yaml"
+    path.write_text("llm:\n  api_key: 'first'\n  nested:\n    value: 1\n")
+    return str(path)
+
+
+@pytest.fixture
+def cache():
+    cache = SettingsCache()
+    backup = Settings.cache
+    Settings.cache = cache
+    yield cache
+    Settings.cache = backup
+
+
+def test_default_cache_is_shared():
+    assert Settings.cache is settings_cache
+
+
+def test_second_read_is_a_hit(cache, yaml_path):
+    Settings(section="llm", path=yaml_path)
+    Settings(section="llm", path=yaml_path)
+
+    assert cache.stats() == {"hits": 1, "misses": 1, "documents": 1}
+
+
+def test_sections_are_copies(cache, yaml_path):
+    first = Settings(section="llm", path=yaml_path)
+    first.pop("api_key")
+    first["nested"]["value"] = 2
+
+    second = Settings(section="llm", path=yaml_path)
+
+    assert second["api_key"] == "first"
+    assert second["nested"]["value"] == 1
+
+
+def test_file_change_is_a_miss(cache, yaml_path):
+    Settings(section="llm", path=yaml_path)
+
+    with open(yaml_path, "w") as file:
+        file.write("llm:\n  api_key: 'second-value'\n")
+
+    assert Settings(section="llm", path=yaml_path)["api_key"] == "second-value"
+    assert cache.misses == 2
+
+
+def test_environment_change_is_a_hit(cache, yaml_path):
+    Settings(section="llm", path=yaml_path)
+
+    with env_var_on_off("LLM__API_KEY", "from-env"):
+        assert Settings(section="llm", path=yaml_path)["api_key"] == "from-env"
+
+    assert Settings(section="llm", path=yaml_path)["api_key"] == "first"
+    assert cache.stats() == {"hits": 2, "misses": 1, "documents": 1}
+
+
+def test_invalidate(cache, yaml_path):
+    Settings(section="llm", path=yaml_path)
+    cache.invalidate(yaml_path)
+    Settings(section="llm", path=yaml_path)
+    cache.invalidate()
+
+    assert cache.stats() == {"hits": 0, "misses": 2, "documents": 0}
+
+
+def test_missing_file_is_not_cached(cache):
+    with pytest.raises(FileNotFoundError):
+        Settings(section="llm", path="no_such_file.yaml")
+
+    assert cache.stats()["documents"] == 0
@@ -0,0 +1,74 @@
+import pytest
+from ally_ai_core.settings import Settings, SettingsWatcher
+
+
+@pytest.fixture
+def yaml_path(tmp_path):
+    path = tmp_path / "app-settings.yaml"
+    path.write_text("llm:\n  temperature: 0.1\nembeddings:\n  model: 'a'\n")
+    return path
+
+
+@pytest.fixture
+def watcher():
+    watcher = SettingsWatcher(interval=0.01)
+    yield watcher
+    watcher.stop()
+
+
+def test_reload_keeps_overrides(yaml_path):
+    settings = Settings(section="llm", path=str(yaml_path), api_key="override")
+
+    assert settings.reload() == {"temperature": 0.1, "api_key": "override"}
+
+
+def test_subscriber_is_notified_on_change(watcher, yaml_path):
+    received = []
+    watcher.subscribe(Settings(section="llm", path=str(yaml_path)), received.append, start=False)
+
+    yaml_path.write_text("llm:\n  temperature: 0.25\nembeddings:\n  model: 'a'\n")
+
+    assert watcher.check() == 1
+    assert received == [{"temperature": 0.25}]
+    assert watcher.check() == 0
+
+
+def test_unchanged_section_is_not_notified(watcher, yaml_path):
+    received = []
+    watcher.subscribe(Settings(section="embeddings", path=str(yaml_path)), received.append, start=False)
+
+    yaml_path.write_text("llm:\n  temperature: 0.25\nembeddings:\n  model: 'a'\n")
+
+    assert watcher.check() == 0
+    assert received == []
+
+
+def test_broken_file_keeps_previous_settings(watcher, yaml_path):
+    received = []
+    watcher.subscribe(Settings(section="llm", path=str(yaml_path)), received.append, start=False)
+
+    yaml_path.write_text("llm: [unclosed\n")
+
+    assert watcher.check() == 0
+    assert received == []
+
+
+def test_unsubscribe(watcher, yaml_path):
+    received = []
+    subscription = watcher.subscribe(Settings(section="llm", path=str(yaml_path)), received.append, start=False)
+    watcher.unsubscribe(subscription)
+
+    yaml_path.write_text("llm:\n  temperature: 0.25\n")
+
+    assert watcher.check() == 0
+
+
+def test_background_thread(watcher, yaml_path):
+    import threading
+
+    event = threading.Event()
+    watcher.subscribe(Settings(section="llm", path=str(yaml_path)), lambda _: event.set())
+
+    yaml_path.write_text("llm:\n  temperature: 0.25\n")
+
+    assert event.wait(timeout=5)
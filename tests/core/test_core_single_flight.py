@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from ally_ai_core.limits import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    flights = SingleFlight(copy=list)
+    calls = []
+    results = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return [1, 2]
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", call))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [[1, 2]] * 5
+    assert len({id(result) for result in results}) == 5
+    assert flights.stats()["deduplicated"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_sequential_calls_are_not_coalesced():
+    flights = SingleFlight()
+
+    assert flights.do("key", lambda: 1) == 1
+    assert flights.do("key", lambda: 2) == 2
+    assert flights.stats()["deduplicated"] == 0
+
+
+def test_error_is_raised_to_followers():
+    flights = SingleFlight()
+    started = threading.Event()
+    errors = []
+
+    def call():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def run():
+        try:
+            flights.do("key", call)
+        except ValueError as ex:
+            errors.append(ex)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=run)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    assert flights.stats()["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_calls_are_coalesced():
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ally"
+
+    results = await asyncio.gather(*[flights.ado("key", call) for _ in range(5)])
+
+    assert results == ["ally"] * 5
+    assert len(calls) == 1
+    assert flights.dedup_ratio == pytest.approx(0.8)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "ally"
+
+    leader = asyncio.ensure_future(flights.ado("key", call))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flights.ado("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ally"
+
+
+@pytest.mark.asyncio
+async def test_async_error_is_raised_to_followers():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*[flights.ado("key", call) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.stats()["errors"] == 1
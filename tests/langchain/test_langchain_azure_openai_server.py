@@ -0,0 +1,111 @@
+import base64
+import math
+from array import array
+
+import httpx
+import pytest
+from openai import RateLimitError
+from ally_ai_core.testing import AzureOpenAIServer, fake_embedding
+from ally_ai_langchain import LLM, EmbeddingModel, Settings
+
+
+@pytest.fixture
+def server():
+    server = AzureOpenAIServer(completion_tokens=4, dimensions=8, seed=1)
+    server.start_in_thread()
+    yield server
+    server.stop_thread()
+
+
+def create_llm(server, **settings):
+    return LLM(settings=Settings(section="llm", endpoint=server.url, api_version="2024-02-01", **settings))
+
+
+def create_embeddings(server, **settings):
+    return EmbeddingModel(
+        settings=Settings(
+            section="embeddings",
+            endpoint=server.url,
+            api_version="2024-02-01",
+            check_embedding_ctx_length=False,
+            single_flight=False,
+            **settings,
+        )
+    )
+
+
+def test_chat_completion(server):
+    response = create_llm(server, streaming=False).invoke("what is an ally?")
+
+    assert len(response.content.split()) == 4
+    assert response.response_metadata["token_usage"]["completion_tokens"] == 4
+    assert server.stats()["chat_completions"] == 1
+
+
+def test_streaming(server):
+    chunks = [chunk.content for chunk in create_llm(server, streaming=True).stream("what is an ally?")]
+
+    assert len([chunk for chunk in chunks if chunk]) == 4
+    assert server.stats()["streams"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_chat_completion(server):
+    response = await create_llm(server, streaming=False).ainvoke("what is an ally?")
+
+    assert response.content
+
+
+def test_embeddings_are_deterministic(server):
+    embeddings = create_embeddings(server)
+
+    vectors = embeddings.embed_documents(["ally", "friend"])
+
+    assert vectors[0] == pytest.approx(fake_embedding("ally", 8))
+    assert vectors[0] != vectors[1]
+    assert math.isclose(sum(value * value for value in vectors[0]), 1.0, rel_tol=1e-6)
+    assert embeddings.embed_query("ally") == vectors[0]
+
+
+def test_embeddings_are_base64_when_asked(server):
+    payload = {"input": ["ally"], "encoding_format": "base64"}
+
+    response = httpx.post(f"{server.url}/openai/deployments/embed/embeddings?api-version=2024-02-01", json=payload)
+
+    vector = array("f", base64.b64decode(response.json()["data"][0]["embedding"]))
+    assert list(vector) == fake_embedding("ally", 8)
+
+
+def test_throttling_returns_retry_after():
+    server = AzureOpenAIServer(throttle_rate=1.0, retry_after=2.5)
+    server.start_in_thread()
+    try:
+        with pytest.raises(RateLimitError) as error:
+            create_llm(server, streaming=False, max_retries=0).invoke("what is an ally?")
+    finally:
+        server.stop_thread()
+
+    assert error.value.response.headers["retry-after"] == "3"
+    assert error.value.response.headers["retry-after-ms"] == "2500"
+    assert server.stats()["throttled"] == 1
+
+
+def test_requests_per_minute_is_enforced():
+    server = AzureOpenAIServer(requests_per_minute=2)
+    server.start_in_thread()
+    try:
+        llm = create_llm(server, streaming=False, max_retries=0)
+        llm.invoke("one")
+        llm.invoke("two")
+        with pytest.raises(RateLimitError):
+            llm.invoke("three")
+    finally:
+        server.stop_thread()
+
+
+def test_latency_distributions():
+    for distribution in ["constant", "uniform", "normal", "lognormal"]:
+        server = AzureOpenAIServer(latency={"distribution": distribution, "mean": 0.2, "stddev": 0.05}, seed=1)
+        samples = [server._latency() for _ in range(2000)]
+        assert sum(samples) / len(samples) == pytest.approx(0.2, abs=0.02)
+        assert min(samples) >= 0
@@ -0,0 +1,138 @@
+import random
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from ally_ai_core.limits import AdaptiveConcurrency
+from ally_ai_langchain import LLM, BulkRunner, Settings
+from ..Utils import FakeCompletions, FakeAsyncCompletions
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+def slow_echo(text):
+    time.sleep(random.uniform(0, 0.01))
+    return text.upper()
+
+
+def test_outputs_are_in_input_order():
+    runner = BulkRunner(RunnableLambda(slow_echo), (f"item {i}" for i in range(50)))
+
+    assert list(runner) == [f"ITEM {i}" for i in range(50)]
+    stats = runner.stats()
+    assert stats["completed"] == 50
+    assert stats["throughput"] > 0
+
+
+@pytest.mark.asyncio
+async def test_async_outputs_are_in_input_order():
+    runner = BulkRunner(RunnableLambda(slow_echo), (f"item {i}" for i in range(20)))
+
+    assert [output async for output in runner] == [f"ITEM {i}" for i in range(20)]
+
+
+def test_concurrency_ramps_up():
+    concurrency = AdaptiveConcurrency(initial=1, maximum=8)
+    runner = BulkRunner(RunnableLambda(slow_echo), [str(i) for i in range(100)], concurrency=concurrency)
+
+    list(runner)
+
+    assert concurrency.limit > 1
+
+
+def test_throttling_is_retried_and_lowers_concurrency():
+    calls = []
+
+    def flaky(text):
+        calls.append(text)
+        if calls.count(text) == 1 and text == "3":
+            raise Throttled()
+        return text
+
+    concurrency = AdaptiveConcurrency(initial=8)
+    runner = BulkRunner(RunnableLambda(flaky), [str(i) for i in range(6)], concurrency=concurrency)
+    runner._failed = lambda error, attempt, failed=runner._failed: failed(error, attempt) and 0.0
+
+    assert list(runner) == [str(i) for i in range(6)]
+    assert runner.stats()["throttled"] == 1
+    assert concurrency.stats()["decreases"] == 1
+
+
+def test_errors_are_returned_or_raised():
+    def fail(text):
+        raise ValueError(text)
+
+    assert isinstance(list(BulkRunner(RunnableLambda(fail), ["a"], return_exceptions=True))[0], ValueError)
+    with pytest.raises(ValueError):
+        list(BulkRunner(RunnableLambda(fail), ["a"]))
+
+
+def test_checkpoint_resumes(tmp_path):
+    checkpoint = str(tmp_path / "bulk.jsonl")
+    calls = []
+
+    def echo(text):
+        calls.append(text)
+        return text
+
+    first = BulkRunner(RunnableLambda(echo), ["a", "b", "c"], checkpoint=checkpoint)
+    outputs = iter(first)
+    assert next(outputs) == "a"
+    outputs.close()
+    done = first.stats()["completed"]
+    calls.clear()
+
+    second = BulkRunner(RunnableLambda(echo), ["a", "b", "c", "d"], checkpoint=checkpoint)
+
+    assert list(second) == ["a", "b", "c", "d"]
+    assert second.stats()["resumed"] == done
+    assert len(calls) == 4 - done
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def test_checkpoint_restores_pydantic_and_message_outputs(tmp_path):
+    from langchain_core.messages import AIMessage
+
+    checkpoint = str(tmp_path / "bulk.jsonl")
+    outputs = {"a": Answer(text="an ally"), "b": AIMessage(content="a friend"), "c": {"text": "json"}}
+    runner = BulkRunner(RunnableLambda(outputs.get), list(outputs), checkpoint=checkpoint)
+
+    assert list(runner) == list(outputs.values())
+    assert runner.checkpoint._file is None
+
+    resumed = BulkRunner(RunnableLambda(lambda text: pytest.fail("run again")), list(outputs), checkpoint=checkpoint)
+
+    assert list(resumed) == list(outputs.values())
+    assert resumed.stats()["resumed"] == 3
+
+
+def test_checkpoint_uses_the_given_codec(tmp_path):
+    class Upper:
+        def encode(self, output):
+            return output.upper()
+
+        def decode(self, value):
+            return value.lower()
+
+    checkpoint = str(tmp_path / "bulk.jsonl")
+    list(BulkRunner(RunnableLambda(lambda text: text), ["a"], checkpoint=checkpoint, codec=Upper()))
+
+    assert '"output": "A"' in open(checkpoint).read()
+    assert list(BulkRunner(RunnableLambda(str.upper), ["a"], checkpoint=checkpoint, codec=Upper())) == ["a"]
+
+
+def test_llm_run_bulk():
+    llm = LLM(settings=Settings(section="llm", streaming=False))
+    llm.client = FakeCompletions()
+    llm.async_client = FakeAsyncCompletions()
+
+    outputs = list(llm.run_bulk(["what is an ally?"] * 5))
+
+    assert [output.content for output in outputs] == ["an ally is a friend"] * 5
+    assert len(llm.client.calls) == 5
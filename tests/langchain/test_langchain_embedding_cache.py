@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+from ally_ai_langchain import EmbeddingCache, EmbeddingModel, Settings
+from ..Utils import FakeEmbeddings, FakeAsyncEmbeddings
+
+
+def key(text):
+    return EmbeddingCache.key(text, 'text-embedding-3-small', 'embeddings', None)
+
+
+def test_cached_vectors_are_returned(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path))
+
+    cache.put_many([key('a'), key('b')], [[0.1, 0.2, 0.3], [1.0, 2.0]])
+    vectors = cache.get_many([key('a'), key('c'), key('b')])
+
+    assert np.allclose(vectors[0], [0.1, 0.2, 0.3])
+    assert vectors[1] is None
+    assert vectors[2].tolist() == [1.0, 2.0]
+    assert vectors[0].dtype == np.float32
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_key_depends_on_model_deployment_and_dimensions():
+    keys = {
+        EmbeddingCache.key('a', 'model', 'deployment', None),
+        EmbeddingCache.key('a', 'other', 'deployment', None),
+        EmbeddingCache.key('a', 'model', 'other', None),
+        EmbeddingCache.key('a', 'model', 'deployment', 256),
+        EmbeddingCache.key('b', 'model', 'deployment', None),
+    }
+
+    assert len(keys) == 5
+
+
+def test_vectors_survive_reopening(tmp_path):
+    EmbeddingCache(path=str(tmp_path)).put_many([key('a')], [[1.0, 2.0]])
+
+    cache = EmbeddingCache(path=str(tmp_path))
+
+    assert cache.get_many([key('a')])[0].tolist() == [1.0, 2.0]
+    assert cache.stats()['size'] == 1
+
+
+def test_appends_of_another_writer_are_seen(tmp_path):
+    reader = EmbeddingCache(path=str(tmp_path))
+    writer = EmbeddingCache(path=str(tmp_path))
+
+    assert reader.get_many([key('a')]) == [None]
+    writer.put_many([key('a')], [[3.0]])
+
+    assert reader.get_many([key('a')])[0].tolist() == [3.0]
+
+
+def test_existing_keys_are_not_appended_twice(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path))
+
+    cache.put_many([key('a'), key('a')], [[1.0], [1.0]])
+    cache.put_many([key('a')], [[1.0]])
+
+    assert cache.stats()['bytes'] == 4
+
+
+def test_least_recently_used_keys_are_evicted(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path), max_size=10)
+    cache.put_many([key(str(index)) for index in range(10)], [[float(index)] for index in range(10)])
+    cache.get_many([key('0')])
+
+    cache.put_many([key('new')], [[10.0]])
+
+    stats = cache.stats()
+    assert stats['size'] == 9
+    assert stats['evictions'] == 2
+    assert stats['bytes'] == 9 * 4
+    assert cache.get_many([key('0'), key('new')])[0].tolist() == [0.0]
+    assert cache.get_many([key('1')]) == [None]
+
+
+def test_readers_reload_after_compaction(tmp_path):
+    reader = EmbeddingCache(path=str(tmp_path))
+    writer = EmbeddingCache(path=str(tmp_path), max_size=4)
+    writer.put_many([key(str(index)) for index in range(4)], [[float(index)] for index in range(4)])
+    assert reader.get_many([key('3')])[0].tolist() == [3.0]
+
+    writer.put_many([key('4')], [[4.0]])
+
+    assert reader.get_many([key('4')])[0].tolist() == [4.0]
+    assert reader.stats()['size'] == 3
+
+
+def test_clear_removes_every_key(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path))
+    cache.put_many([key('a')], [[1.0]])
+
+    cache.clear()
+
+    assert cache.get_many([key('a')]) == [None]
+    assert cache.stats()['bytes'] == 0
+
+
+def create_embeddings(path, **settings):
+    embeddings = EmbeddingModel(
+        settings=Settings(
+            section='embeddings', check_embedding_ctx_length=False, cache={'path': str(path)}, **settings
+        )
+    )
+    embeddings.client = FakeEmbeddings()
+    embeddings.async_client = FakeAsyncEmbeddings()
+    return embeddings
+
+
+def test_only_missing_texts_are_embedded(tmp_path):
+    embeddings = create_embeddings(tmp_path)
+    embeddings.embed_documents(['an ally', 'a friend'])
+
+    vectors = embeddings.embed_documents(['a friend', 'who helps', 'an ally'])
+
+    assert vectors == [[8.0, 2.0], [9.0, 2.0], [7.0, 2.0]]
+    assert embeddings.client.calls == ['an ally', 'a friend', 'who helps']
+    assert embeddings.ally_cache.stats()['hits'] == 2
+
+
+def test_cache_is_shared_by_models_of_the_same_path(tmp_path):
+    first = create_embeddings(tmp_path)
+    second = create_embeddings(tmp_path)
+
+    first.embed_query('ally')
+
+    assert second.ally_cache is first.ally_cache
+    assert second.embed_query('ally') == [4.0, 1.0]
+    assert second.client.calls == []
+
+
+@pytest.mark.asyncio
+async def test_async_embeddings_are_cached(tmp_path):
+    embeddings = create_embeddings(tmp_path)
+
+    await embeddings.aembed_query('ally')
+    vector = await embeddings.aembed_query('ally')
+
+    assert vector == [4.0, 1.0]
+    assert embeddings.async_client.calls == ['ally']
+
+
+def test_cache_is_not_a_model_parameter(tmp_path):
+    embeddings = create_embeddings(tmp_path)
+
+    assert 'cache' not in embeddings.ally_settings
+    assert 'ally_cache' not in embeddings.dict()
+
+
+def test_cache_setting_is_dropped_when_a_cache_is_passed(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / 'passed'))
+
+    embeddings = EmbeddingModel(
+        settings=Settings(section='embeddings', cache={'path': str(tmp_path / 'configured')}), cache=cache
+    )
+
+    assert embeddings.ally_cache is cache
+    assert 'cache' not in embeddings.ally_settings
+    assert 'cache' not in embeddings.model_kwargs
@@ -30,3 +30,84 @@ def test_settings_has_api_key():
     with env_var_on_off('EMBEDDINGS__API_KEY', ''):
         embeddings = EmbeddingModel()
         assert embeddings.ally_settings['api_key'] == '<private-key>'
+
+
+def create_embeddings(delay=0.0, **settings):
+    from ally_ai_langchain import Settings
+    from ..Utils import FakeEmbeddings, FakeAsyncEmbeddings
+
+    embeddings = EmbeddingModel(settings=Settings(section='embeddings', check_embedding_ctx_length=False, **settings))
+    embeddings.client = FakeEmbeddings(delay)
+    embeddings.async_client = FakeAsyncEmbeddings(delay)
+    return embeddings
+
+
+def test_identical_concurrent_queries_are_coalesced():
+    from concurrent.futures import ThreadPoolExecutor
+
+    embeddings = create_embeddings(delay=0.1, single_flight=True)
+    before = EmbeddingModel.flights.stats()['deduplicated']
+
+    with ThreadPoolExecutor(5) as pool:
+        vectors = list(pool.map(embeddings.embed_query, ['what is an ally?'] * 5))
+
+    assert vectors == [[16.0, 4.0]] * 5
+    assert len(embeddings.client.calls) == 1
+    assert EmbeddingModel.flights.stats()['deduplicated'] - before == 4
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_async_queries_are_coalesced():
+    import asyncio
+
+    embeddings = create_embeddings(delay=0.05, single_flight=True)
+
+    vectors = await asyncio.gather(*[embeddings.aembed_query('ally') for _ in range(3)])
+
+    assert vectors == [[4.0, 1.0]] * 3
+    assert len(embeddings.async_client.calls) == 1
+
+
+def test_single_flight_is_off_by_default():
+    from concurrent.futures import ThreadPoolExecutor
+
+    embeddings = create_embeddings(delay=0.05)
+
+    with ThreadPoolExecutor(3) as pool:
+        list(pool.map(embeddings.embed_query, ['ally'] * 3))
+
+    assert len(embeddings.client.calls) == 3
+
+
+def test_concurrent_queries_are_micro_batched():
+    from concurrent.futures import ThreadPoolExecutor
+
+    embeddings = create_embeddings(micro_batch={'max_wait': 0.2, 'max_batch_size': 4})
+
+    with ThreadPoolExecutor(4) as pool:
+        vectors = list(pool.map(embeddings.embed_query, ['a', 'an ally', 'a friend', 'who helps']))
+
+    assert vectors == [[1.0, 1.0], [7.0, 2.0], [8.0, 2.0], [9.0, 2.0]]
+    assert embeddings.ally_batcher.stats()['batch_size']['histogram'] == {4: 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_queries_are_micro_batched():
+    import asyncio
+
+    embeddings = create_embeddings(micro_batch=True)
+
+    vectors = await asyncio.gather(*[embeddings.aembed_query(text) for text in ['a', 'an ally']])
+
+    assert vectors == [[1.0, 1.0], [7.0, 2.0]]
+    assert embeddings.ally_batcher.stats()['batches'] == 1
+
+
+def test_duplicate_texts_are_embedded_once():
+    embeddings = create_embeddings(dedup=True)
+
+    vectors = embeddings.embed_documents(['header', 'an ally', 'header', 'header'])
+
+    assert vectors == [[6.0, 1.0], [7.0, 2.0], [6.0, 1.0], [6.0, 1.0]]
+    assert sorted(embeddings.client.calls) == ['an ally', 'header']
+    assert embeddings.ally_dedup.stats()['dedup_ratio'] == 0.5
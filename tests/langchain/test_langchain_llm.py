@@ -1,6 +1,19 @@
-from ally_ai_langchain import LLM
+import asyncio
+
+from ally_ai_core.limits import rate_limiters
+from ally_ai_core.settings import SettingsWatcher
+from ally_ai_langchain import LLM, EmbeddingModel, Settings
 from openai import APIConnectionError
+from pydantic import BaseModel
 import pytest
+from ..Utils import FakeCompletions, FakeAsyncCompletions
+
+
+@pytest.fixture
+def limiters():
+    # limiters are registered process-wide, a failing test must not leave its own behind
+    yield rate_limiters
+    rate_limiters.clear()
 
 
 def test_default_llm_is_not_none():
@@ -30,3 +43,141 @@ def test_settings_has_api_key():
     llm = LLM()
 
     assert llm.ally_settings['api_key']
+
+
+def test_reload_swaps_clients(tmp_path):
+    path = tmp_path / "app-settings.yaml"
+    section = "llm:\n  api_key: 'key'\n  api_version: 'v'\n  endpoint: 'https://a'\n  model: 'm'\n  deployment_name: '{}'\n"
+    path.write_text(section.format("first"))
+
+    llm = LLM(settings=Settings(section='llm', path=str(path)))
+    client = llm.client
+    watcher = SettingsWatcher()
+    watcher.subscribe(llm.ally_settings, llm.reload, start=False)
+
+    path.write_text(section.format("second-deployment"))
+    watcher.check()
+
+    assert llm.deployment_name == 'second-deployment'
+    assert llm.client is not client
+
+
+def test_reload_builds_cache_from_new_settings(tmp_path):
+    path = tmp_path / "app-settings.yaml"
+    section = "llm:\n  api_key: 'key'\n  api_version: 'v'\n  endpoint: 'https://a'\n  model: 'm'\n  deployment_name: 'd'\n"
+    path.write_text(section + "  cache:\n    max_size: 2\n")
+
+    llm = LLM(settings=Settings(section='llm', path=str(path)))
+    path.write_text(section + "  cache:\n    max_size: 5\n")
+    llm.reload(Settings(section='llm', path=str(path)))
+
+    assert llm.cache.max_size == 5
+    assert 'cache' not in llm.ally_kwargs
+
+    path.write_text(section)
+    llm.reload(Settings(section='llm', path=str(path)))
+
+    assert llm.cache is None
+
+
+def test_semantic_cache_embeds_with_the_same_settings_file(tmp_path, monkeypatch):
+    path = tmp_path / "custom-settings.yaml"
+    path.write_text(
+        "llm:\n  api_key: 'key'\n  api_version: 'v'\n  endpoint: 'https://a'\n  model: 'm'\n  deployment_name: 'd'\n"
+        "  semantic_cache: true\n"
+        "embeddings:\n  api_key: 'key'\n  api_version: 'v'\n  endpoint: 'https://e'\n  model: 'm'\n  deployment_name: 'embed'\n"
+    )
+    monkeypatch.chdir(tmp_path)
+
+    llm = LLM(settings=Settings(section='llm', path=str(path)))
+
+    assert llm.cache.embeddings.ally_settings.path == str(path)
+    assert llm.cache.embeddings.deployment == 'embed'
+
+
+def test_deployments_are_routed():
+    deployments = [
+        {'endpoint': 'https://a', 'deployment_name': 'first'},
+        {'endpoint': 'https://b', 'deployment_name': 'second'},
+    ]
+    llm = LLM(settings=Settings(section='llm', deployments=deployments, streaming=False))
+
+    assert [d.name for d in llm.ally_router.deployments] == ['first', 'second']
+    assert llm.ally_router.deployments[1].target.deployment_name == 'second'
+
+
+def test_rate_limit_from_settings(limiters):
+    llm = LLM(settings=Settings(section='llm', streaming=False, rate_limit={'tokens_per_minute': 60000}))
+    llm.client = FakeCompletions()
+    limiter = limiters.get(limiters.key(llm.azure_endpoint, llm.deployment_name))
+
+    llm.invoke('what is an ally?')
+
+    assert 'rate_limit' not in llm.ally_settings
+    assert limiter.stats()['acquired'] == 1
+    # the estimate is replaced by the reported usage of 2 tokens
+    assert limiter.tokens.level == pytest.approx(limiter.tokens.capacity - 2, abs=1)
+
+
+def test_streaming_invoke_is_rate_limited_once(limiters):
+    llm = LLM(settings=Settings(section='llm', streaming=True, rate_limit={'requests_per_minute': 600}))
+    llm.client = FakeCompletions()
+    limiter = limiters.get(limiters.key(llm.azure_endpoint, llm.deployment_name))
+
+    llm.invoke('what is an ally?')
+
+    assert limiter.stats()['acquired'] == 1
+
+
+def test_structured_output_is_memoized():
+    class Answer(BaseModel):
+        text: str
+
+    schema = {'title': 'Answer', 'description': 'An answer', 'type': 'object', 'properties': {'text': {'type': 'string'}}}
+    llm = LLM(settings=Settings(section='llm'))
+
+    assert llm(Answer) is llm(Answer)
+    assert llm(schema) is llm(dict(reversed(list(schema.items()))))
+    assert llm(Answer) is not llm(schema)
+    assert llm() is llm
+
+
+def test_structured_output_cache_is_bounded():
+    llm = LLM(settings=Settings(section='llm'))
+    llm.ally_structured_size = 2
+    schemas = [
+        {'title': f'Answer{i}', 'description': 'An answer', 'type': 'object', 'properties': {'text': {'type': 'string'}}} for i in range(3)
+    ]
+
+    first = llm(schemas[0])
+    llm(schemas[1])
+    llm(schemas[2])
+
+    assert len(llm.ally_structured) == 2
+    assert llm(schemas[0]) is not first
+
+
+def test_models_share_pooled_http_clients():
+    first = LLM(settings=Settings(section='llm'))
+    second = LLM(settings=Settings(section='llm'))
+    unpooled = LLM(settings=Settings(section='llm', http=False))
+
+    assert first.http_client is second.http_client
+    assert first.http_async_client is second.http_async_client
+    assert unpooled.http_client is None
+    assert 'httpx' not in first._get_llm_string()
+    assert EmbeddingModel().http_client is not None
+
+
+def test_identical_concurrent_prompts_are_coalesced():
+    llm = LLM(settings=Settings(section='llm', streaming=False, single_flight=True))
+    llm.async_client = FakeAsyncCompletions()
+
+    async def run():
+        return await asyncio.gather(*[llm.ainvoke('what is an ally?') for _ in range(3)])
+
+    responses = asyncio.run(run())
+
+    assert [response.content for response in responses] == ['an ally is a friend'] * 3
+    assert len(llm.async_client.calls) == 1
+    assert responses[0] is not responses[1]
@@ -0,0 +1,158 @@
+import importlib
+
+import pytest
+from ally_ai_langchain import LLM, ResponseCache, Settings
+from ..Utils import FakeCompletions, FakeAsyncCompletions
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    # every test starts without the response caches shared by earlier ones
+    caches = {}
+    monkeypatch.setattr(importlib.import_module("ally_ai_langchain.LLM"), "_caches", caches)
+    return caches
+
+
+def create_llm(streaming=False, **cache):
+    llm = LLM(settings=Settings(section="llm", streaming=streaming, cache=cache or True))
+    llm.client = FakeCompletions()
+    llm.async_client = FakeAsyncCompletions()
+    return llm
+
+
+def test_cache_from_settings():
+    llm = create_llm(max_size=2, ttl=60)
+
+    assert isinstance(llm.cache, ResponseCache)
+    assert llm.cache.max_size == 2
+    assert "cache" not in llm.ally_settings
+
+
+def test_invoke_is_cached():
+    llm = create_llm()
+
+    first = llm.invoke("what is an ally?")
+    second = llm.invoke("what is an ally?")
+
+    assert first.content == second.content
+    assert len(llm.client.calls) == 1
+    assert llm.cache.stats()["hits"] == 1
+
+
+def test_different_temperature_is_a_miss():
+    llm = create_llm()
+
+    llm.invoke("what is an ally?")
+    llm.invoke("what is an ally?", temperature=0.0)
+
+    assert len(llm.client.calls) == 2
+
+
+def test_batch_is_cached():
+    llm = create_llm()
+
+    llm.batch(["a", "b"])
+    llm.batch(["a", "b"])
+
+    assert len(llm.client.calls) == 2
+    assert llm.cache.hit_rate == 0.5
+
+
+@pytest.mark.asyncio
+async def test_ainvoke_is_cached():
+    llm = create_llm()
+
+    await llm.ainvoke("what is an ally?")
+    await llm.ainvoke("what is an ally?")
+
+    assert len(llm.async_client.calls) == 1
+
+
+def test_stream_replays_cached_chunks():
+    llm = create_llm(streaming=True)
+
+    first = [chunk.content for chunk in llm.stream("what is an ally?")]
+    second = [chunk.content for chunk in llm.stream("what is an ally?")]
+
+    assert first == second
+    assert len(second) > 1
+    assert len(llm.client.calls) == 1
+
+
+def test_invoke_hits_streamed_entry():
+    llm = create_llm(streaming=True)
+
+    list(llm.stream("what is an ally?"))
+    response = llm.invoke("what is an ally?")
+
+    assert response.content == "an ally is a friend"
+    assert len(llm.client.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_astream_is_cached():
+    llm = create_llm(streaming=True)
+
+    first = [chunk.content async for chunk in llm.astream("what is an ally?")]
+    second = [chunk.content async for chunk in llm.astream("what is an ally?")]
+
+    assert first == second
+    assert len(llm.async_client.calls) == 1
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    create_llm(path=path).invoke("what is an ally?")
+
+    llm = LLM(settings=Settings(section="llm", streaming=False), cache=ResponseCache(path=path))
+    llm.client = FakeCompletions()
+    llm.invoke("what is an ally?")
+
+    assert llm.client.calls == []
+    assert llm.cache.disk_hits == 1
+
+
+def test_cache_is_shared_by_models_of_the_same_settings(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    first = create_llm(path=path)
+    first.invoke("what is an ally?")
+
+    second = create_llm(path=path)
+    second.invoke("what is an ally?")
+
+    assert second.cache is first.cache
+    assert second.client.calls == []
+    assert second.cache.memory_hits == 1
+    assert create_llm(path=path, max_size=2).cache is not first.cache
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_size=1)
+    cache.update("a", "llm", ["first"])
+    cache.update("b", "llm", ["second"])
+
+    assert cache.lookup("a", "llm") is None
+    assert cache.lookup("b", "llm") == ["second"]
+
+
+def test_ttl_eviction():
+    cache = ResponseCache(ttl=-1)
+    cache.update("a", "llm", ["first"])
+
+    assert cache.lookup("a", "llm") is None
+
+
+def test_disk_is_trimmed_on_write(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(max_size=2, path=path)
+    for prompt in ["a", "b", "c"]:
+        cache.update(prompt, "llm", [prompt])
+
+    assert cache._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 2
+    assert ResponseCache(path=path).lookup("a", "llm") is None
+
+    expiring = ResponseCache(ttl=60, path=path)
+    expiring._connection.execute("UPDATE responses SET created = created - 120")
+    expiring.update("d", "llm", ["d"])
+
+    assert [key for key, in expiring._connection.execute("SELECT key FROM responses")] == [expiring.key("d", "llm")]
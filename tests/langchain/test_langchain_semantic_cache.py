@@ -0,0 +1,91 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+from ally_ai_langchain import LLM, ResponseCache, SemanticCache, Settings
+from ..Utils import FakeCompletions
+
+
+class KeywordEmbeddings(Embeddings):
+    """embeds texts by the presence of a few keywords, paraphrases end up close"""
+
+    words = ["ally", "friend", "weather", "rain"]
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [1.0 if word in text else 0.0 for word in self.words] + [0.1]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def create_llm(cache):
+    llm = LLM(settings=Settings(section="llm", streaming=False), cache=cache)
+    llm.client = FakeCompletions()
+    return llm
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(embeddings=KeywordEmbeddings(), threshold=0.9)
+
+
+def test_paraphrase_is_a_hit(cache):
+    llm = create_llm(cache)
+
+    llm.invoke("what is an ally?")
+    response = llm.invoke("could you tell me what an ally is")
+
+    assert response.content == "an ally is a friend"
+    assert len(llm.client.calls) == 1
+    assert cache.hits == 1
+
+
+def test_unrelated_prompt_is_a_miss(cache):
+    llm = create_llm(cache)
+
+    llm.invoke("what is an ally?")
+    llm.invoke("will it rain?")
+
+    assert len(llm.client.calls) == 2
+    assert cache.misses == 2
+
+
+def test_different_temperature_is_not_compared(cache):
+    llm = create_llm(cache)
+
+    llm.invoke("what is an ally?")
+    llm.invoke("what is an ally?", temperature=0.0)
+
+    assert len(llm.client.calls) == 2
+
+
+def test_exact_cache_is_checked_first():
+    cache = SemanticCache(embeddings=KeywordEmbeddings(), exact=ResponseCache())
+    llm = create_llm(cache)
+
+    llm.invoke("what is an ally?")
+    llm.invoke("what is an ally?")
+
+    assert cache.exact_hits == 1
+    assert cache.hits == 0
+
+
+def test_stats(cache):
+    llm = create_llm(cache)
+
+    llm.invoke("what is an ally?")
+    llm.invoke("tell me about an ally")
+    stats = cache.stats()
+
+    assert stats["hit_rate"] == 0.5
+    assert stats["lookup_latency"]["p50"] > 0
+    assert sum(stats["distance_histogram"]) == 1
+
+
+def test_local_index_evicts_oldest():
+    cache = SemanticCache(embeddings=KeywordEmbeddings(), threshold=0.99, max_size=1)
+
+    cache.update("ally", "llm", ["first"])
+    cache.update("rain", "llm", ["second"])
+
+    assert cache.lookup("ally", "llm") is None
+    assert cache.lookup("rain", "llm") == ["second"]
@@ -0,0 +1,112 @@
+import random
+import time
+
+import pytest
+from ally_ai_langchain import EmbeddingModel, Settings, TokenPacker
+from ..Utils import FakeEmbeddings, FakeAsyncEmbeddings
+
+
+def test_requests_are_filled_up_to_the_token_budget():
+    packer = TokenPacker(max_tokens=10, max_inputs=100)
+
+    assert packer.pack([4, 4, 4, 9, 1, 10]) == [[0, 1], [2], [3, 4], [5]]
+
+
+def test_requests_are_limited_by_the_number_of_inputs():
+    packer = TokenPacker(max_tokens=1000, max_inputs=3)
+
+    assert packer.pack([1] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert packer.pack([1] * 4, max_inputs=2) == [[0, 1], [2, 3]]
+
+
+def test_text_over_the_input_limit_is_sent_alone():
+    packer = TokenPacker(max_tokens=100, max_input_tokens=20)
+
+    assert packer.pack([5, 30, 5]) == [[1], [0, 2]]
+
+
+def test_vectors_are_returned_in_input_order():
+    packer = TokenPacker(max_tokens=10, concurrency=4)
+    texts = [f"text {index}" for index in range(40)]
+
+    def send(texts, tokens):
+        time.sleep(random.random() / 100)
+        return [[float(text.split()[1])] for text in texts]
+
+    vectors = packer.run(texts, send)
+
+    assert vectors == [[float(index)] for index in range(40)]
+    assert packer.stats()['requests'] > 1
+
+
+@pytest.mark.asyncio
+async def test_async_vectors_are_returned_in_input_order():
+    import asyncio
+
+    packer = TokenPacker(max_tokens=10, concurrency=2)
+    texts = [f"text {index}" for index in range(10)]
+
+    async def send(texts, tokens):
+        await asyncio.sleep(random.random() / 100)
+        return [[float(text.split()[1])] for text in texts]
+
+    assert await packer.arun(texts, send) == [[float(index)] for index in range(10)]
+
+
+def create_embeddings(**packing):
+    embeddings = EmbeddingModel(
+        settings=Settings(section='embeddings', check_embedding_ctx_length=False, packing=packing or True)
+    )
+    embeddings.client = FakeEmbeddings()
+    embeddings.async_client = FakeAsyncEmbeddings()
+    return embeddings
+
+
+def test_embed_documents_sends_packed_requests():
+    embeddings = create_embeddings(max_inputs=2)
+
+    vectors = embeddings.embed_documents(['a', 'an ally', 'a friend', 'who helps', 'ally'])
+
+    assert vectors == [[1.0, 1.0], [7.0, 2.0], [8.0, 2.0], [9.0, 2.0], [4.0, 1.0]]
+    assert sorted(embeddings.client.calls) == [['a', 'an ally'], ['a friend', 'who helps'], ['ally']]
+
+
+@pytest.mark.asyncio
+async def test_aembed_documents_sends_packed_requests():
+    embeddings = create_embeddings(max_inputs=3)
+
+    vectors = await embeddings.aembed_documents(['a', 'an ally', 'a friend', 'who helps'])
+
+    assert vectors == [[1.0, 1.0], [7.0, 2.0], [8.0, 2.0], [9.0, 2.0]]
+    assert embeddings.async_client.calls == [['a', 'an ally', 'a friend'], ['who helps']]
+
+
+def test_packing_cuts_requests_to_the_server():
+    from ally_ai_core.testing import AzureOpenAIServer
+
+    server = AzureOpenAIServer(dimensions=8)
+    url = server.start_in_thread()
+    try:
+        settings = dict(
+            section='embeddings', endpoint=url, api_version='2024-02-01', check_embedding_ctx_length=False
+        )
+        texts = [f"chunk {index} of a document about allies" for index in range(100)]
+
+        unpacked = EmbeddingModel(settings=Settings(**settings)).embed_documents(texts)
+        requests = server.requests
+        packed = EmbeddingModel(settings=Settings(**settings, packing={'max_tokens': 500})).embed_documents(texts)
+
+        assert requests == 100
+        assert server.requests - requests == 2
+        assert packed == unpacked
+    finally:
+        server.stop_thread()
+
+
+def test_only_a_single_text_over_the_input_limit_is_split():
+    embeddings = create_embeddings(max_input_tokens=2)
+
+    vectors = embeddings.embed_documents(['a', 'b', 'c', 'a long text'])
+
+    assert vectors == [[1.0, 1.0], [1.0, 1.0], [1.0, 1.0], [11.0, 3.0]]
+    assert sorted(embeddings.client.calls, key=str) == [['a', 'b', 'c'], 'a long text']